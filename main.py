@@ -2,20 +2,41 @@
 """
 主要 ETL 執行腳本
 分階段處理: raw → interim → processed
+
+用法:
+    python main.py                     # 以整年度原始資料完整重建
+    python main.py --append delta.csv  # 只處理新增的資料並附加
+    python main.py --compact           # 將附加片段合併回基礎檔
 """
+import argparse
+from pathlib import Path
+
 from src.ingest import load_raw_data
-from src.etl import clean_raw_data, process_interim_data
-from src.config import INTERIM_DATA_FILE, PROCESSED_DATA_FILE
+from src.etl import clean_raw_data, process_interim_data, extract_parties
+from src.coord_store import (
+    write_coord_store, write_coord_segment, coord_store_exists, compact_coord_store
+)
+from src.store import (
+    save_array, build_key_index, load_key_index, filter_new_records,
+    write_key_run, clear_key_runs, compact_key_index,
+    build_daily_counts, update_daily_counts, load_daily_counts,
+    new_fragment_id, write_fragment, clear_fragments
+)
+from src.config import (
+    INTERIM_DATA_FILE, PROCESSED_DATA_FILE, COORD_STORE_DIR, QUARANTINE_DATA_FILE,
+    QUARANTINE_FRAGMENTS_DIR, KEY_INDEX_FILE, DAILY_COUNTS_FILE,
+    PARTIES_DATA_FILE, PARTY_FRAGMENTS_DIR, COMPACT_MAX_SEGMENTS
+)
 
 
-def main():
+def run_full_etl():
     """
     執行完整的 ETL 流程
     
     流程:
     1. raw/: 載入原始資料
     2. interim/: 基礎清洗和轉換
-    3. processed/: 特徵工程和最終處理
+    3. processed/: 特徵工程和最終處理 (另存繪圖用座標陣列)
     """
     print("="*60)
     print("開始 ETL 流程")
@@ -27,7 +48,7 @@ def main():
     print(f"✓ 載入完成: {len(raw_df)} 筆原始資料")
     
     # ==================== 階段 2: 基礎清洗 → interim ====================
-    interim_df = clean_raw_data(raw_df)
+    interim_df = clean_raw_data(raw_df, quarantine_file=QUARANTINE_DATA_FILE)
     
     # 儲存中間資料
     INTERIM_DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -42,6 +63,26 @@ def main():
     processed_df.to_parquet(PROCESSED_DATA_FILE, index=False)
     print(f"✓ 最終資料已儲存至: {PROCESSED_DATA_FILE}")
     
+    # 當事人 (車輛) 層級資料, 以 accident_key 與事故對應
+    parties_df = extract_parties(interim_df)
+    parties_df.to_parquet(PARTIES_DATA_FILE, index=False)
+    print(f"✓ 當事人資料已儲存至: {PARTIES_DATA_FILE}")
+    
+    # 完整重建以原始檔為準, 先前附加的片段已包含在內
+    removed = clear_fragments() + clear_fragments(PARTY_FRAGMENTS_DIR)
+    if removed:
+        print(f"✓ 移除舊的增量片段: {removed} 個")
+    
+    # 繪圖用座標陣列 (地圖與動畫以 memory-map 讀取; 舊的附加片段一併移除)
+    write_coord_store(processed_df)
+    print(f"✓ 座標陣列已儲存至: {COORD_STORE_DIR}")
+    
+    # 去重用的事故鍵索引與每日彙總計數 (供附加模式增量更新)
+    save_array(KEY_INDEX_FILE, build_key_index(processed_df))
+    clear_key_runs()
+    build_daily_counts(processed_df).to_parquet(DAILY_COUNTS_FILE, index=False)
+    print(f"✓ 事故鍵索引與每日彙總已更新")
+    
     # ==================== 總結 ====================
     print("\n" + "="*60)
     print("ETL 流程完成")
@@ -49,7 +90,8 @@ def main():
     print(f"\n資料統計:")
     print(f"  原始資料 (raw):      {len(raw_df):,} 筆")
     print(f"  中間資料 (interim):  {len(interim_df):,} 筆")
-    print(f"  最終資料 (processed): {len(processed_df):,} 筆")
+    print(f"  最終資料 (processed): {len(processed_df):,} 起事故")
+    print(f"  當事人資料 (parties): {len(parties_df):,} 筆")
     print(f"\n資料流程:")
     print(f"  raw/      → {INTERIM_DATA_FILE.relative_to(INTERIM_DATA_FILE.parent.parent.parent)}")
     print(f"  interim/  → {PROCESSED_DATA_FILE.relative_to(PROCESSED_DATA_FILE.parent.parent.parent)}")
@@ -62,5 +104,107 @@ def main():
     print(processed_df['case_type'].value_counts())
 
 
+def run_append(delta_file: Path):
+    """
+    附加模式: 只處理新增的原始資料
+    
+    流程:
+    1. 載入新增資料並執行兩階段清洗
+    2. 以事故鍵索引排除已處理過的事故 (不重新載入歷史資料)
+    3. 寫入新的 Parquet、事故鍵與座標陣列片段 (不改寫歷史資料), 並合併每日彙總
+    4. 片段超過 COMPACT_MAX_SEGMENTS 個時才合併回基礎檔
+    
+    Args:
+        delta_file (Path): 新增資料的 CSV (欄位與原始檔相同)
+    """
+    print("="*60)
+    print("開始附加新資料")
+    print("="*60)
+    
+    # ==================== 階段 1: 載入新增資料 ====================
+    print(f"\n【資料載入】讀取新增資料: {delta_file}")
+    raw_df = load_raw_data(delta_file)
+    print(f"✓ 載入完成: {len(raw_df)} 筆新增資料")
+    
+    # ==================== 階段 2: 清洗與特徵工程 (只處理新增資料) ====================
+    fragment_id = new_fragment_id()
+    interim_df = clean_raw_data(
+        raw_df, quarantine_file=QUARANTINE_FRAGMENTS_DIR / f'part-{fragment_id}.parquet'
+    )
+    
+    # ==================== 階段 3: 與既有資料去重 ====================
+    key_index = load_key_index()
+    interim_df, new_keys = filter_new_records(interim_df, key_index)
+    print(f"【去重】比對 {sum(len(run) for run in key_index):,} 起既有事故, "
+          f"新事故 {len(new_keys):,} 起 ({len(interim_df):,} 筆當事人資料)")
+    
+    if len(interim_df) == 0:
+        print("\n沒有新資料需要附加")
+        return
+    
+    processed_df = process_interim_data(interim_df)
+    
+    # ==================== 階段 4: 寫入片段並更新衍生資料 ====================
+    fragment_path = write_fragment(processed_df, fragment_id=fragment_id)
+    print(f"✓ 新資料片段已儲存至: {fragment_path}")
+    
+    party_path = write_fragment(extract_parties(interim_df), PARTY_FRAGMENTS_DIR, fragment_id)
+    print(f"✓ 當事人資料片段已儲存至: {party_path}")
+    
+    # 事故鍵與座標陣列都寫成新片段, 成本只與新資料筆數成正比
+    write_key_run(new_keys, fragment_id)
+    print(f"✓ 事故鍵索引已更新 (新增 {len(new_keys):,} 個鍵)")
+    
+    update_daily_counts(load_daily_counts(), processed_df).to_parquet(DAILY_COUNTS_FILE, index=False)
+    print(f"✓ 每日彙總已更新: {DAILY_COUNTS_FILE}")
+    
+    if coord_store_exists():
+        segment = write_coord_segment(processed_df, fragment_id)
+        print(f"✓ 座標陣列片段已儲存: {COORD_STORE_DIR} (新增 {segment.size:,} 筆)")
+    
+    # 片段累積過多時才合併回基礎檔 (偶爾一次的完整改寫)
+    compact_store(COMPACT_MAX_SEGMENTS)
+    
+    print("\n" + "="*60)
+    print(f"附加完成: {len(processed_df):,} 起新事故")
+    print("="*60)
+
+
+def compact_store(max_segments: int = 0):
+    """
+    將事故鍵索引與座標陣列的附加片段合併回基礎檔
+
+    Args:
+        max_segments (int): 片段數不超過此值時不合併 (0 = 有片段就合併)
+    """
+    n_runs = compact_key_index(max_segments)
+    if n_runs:
+        print(f"✓ 事故鍵索引: 合併 {n_runs} 個片段至 {KEY_INDEX_FILE}")
+    n_segments = compact_coord_store(max_segments=max_segments)
+    if n_segments:
+        print(f"✓ 座標陣列: 合併 {n_segments} 個片段至 {COORD_STORE_DIR}")
+
+
+def main():
+    """解析命令列參數並執行完整重建、附加或合併片段"""
+    parser = argparse.ArgumentParser(description="台北市交通事故 ETL 流程")
+    parser.add_argument(
+        '--append', type=Path, metavar='DELTA_CSV',
+        help="只處理新增資料的 CSV 並附加到既有的處理後資料"
+    )
+    parser.add_argument(
+        '--compact', action='store_true',
+        help="將事故鍵索引與座標陣列的附加片段合併回基礎檔"
+    )
+    args = parser.parse_args()
+    
+    if args.compact:
+        compact_store()
+    elif args.append is not None:
+        run_append(args.append)
+    else:
+        run_full_etl()
+
+
 if __name__ == "__main__":
     main()
@@ -5,6 +5,7 @@
 """
 
 import sys
+import time
 from pathlib import Path
 
 # 確保可以找到 src 模組
@@ -12,34 +13,43 @@ if __name__ == "__main__":
     project_root = Path(__file__).parent.parent
     sys.path.insert(0, str(project_root))
 
-import pandas as pd
 import numpy as np
-import geopandas as gpd
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import cartopy.crs as ccrs
 from matplotlib.font_manager import FontProperties
-from src.config import PROCESSED_DATA_DIR, VIDEOS_DIR
+from src.config import VIDEOS_DIR
+from src.crs import load_boundary_wgs84
+from src.store import read_processed_data
+from src.coord_store import build_coord_store, load_coord_store
+from src.thinning import PixelThinner
+from src.export import MultiSinkWriter, SINK_PRESETS
+from src.pipeline import FramePrefetcher, StageMetrics, print_stage_metrics
 
 # 配置中文字型
 font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
 font_prop = FontProperties(fname=font_path)
 
+# A1/A2 散點樣式 (與 viz_map.py 一致)
+CASE_STYLES = {
+    'A1': dict(c='red', s=30, alpha=0.7, zorder=3, edgecolors='darkred', linewidths=0.5),
+    'A2': dict(c='orange', s=8, alpha=0.4, zorder=2),
+}
+
+# 像素級抽稀的標記尺寸等級數
+THIN_LEVELS = 4
+
 
 def load_taipei_boundary():
     """
-    載入台北市行政區邊界 Shapefile 並轉換為 WGS84
+    載入台北市行政區邊界 (WGS84), 重新投影的結果已快取
     (與 viz_raw_map.py 共用的函數)
     
     Returns:
         GeoDataFrame: 台北市邊界資料 (WGS84 座標系統)
     """
-    shapefile_path = 'data/taipei/G97_A_CAVLGE_P.shp'
-    
     try:
-        gdf = gpd.read_file(shapefile_path)
-        gdf_wgs84 = gdf.to_crs(epsg=4326)
-        return gdf_wgs84
+        return load_boundary_wgs84()
     except Exception as e:
         print(f"✗ 讀取 Shapefile 失敗: {e}")
         return None
@@ -47,25 +57,46 @@ def load_taipei_boundary():
 
 def load_accident_data():
     """
-    載入處理過的交通事故資料
+    載入處理過的交通事故座標陣列
+    優先以 memory-map 開啟 ETL 產生的座標陣列, 不存在時才由 Parquet (含增量片段) 建立
     
     Returns:
-        DataFrame: 包含事故經緯度和時間的資料
+        CoordStore: 依時間排序的事故座標、類別與每日偏移量
     """
-    parquet_file = PROCESSED_DATA_DIR / 'taipei_113_clean.parquet'
+    store = load_coord_store()
+    if store is not None:
+        print(f"✓ 成功讀取 {store.size} 筆事故座標 (座標陣列)")
+        return store
     
     try:
-        df = pd.read_parquet(parquet_file)
-        # 確保 date 是 datetime 類型
-        df['date'] = pd.to_datetime(df['date'])
-        print(f"✓ 成功讀取 {len(df)} 筆事故資料")
-        return df
+        df = read_processed_data(columns=['acc_dt', 'case_type', 'longitude', 'latitude'])
+        store = build_coord_store(df)
+        print(f"✓ 成功讀取 {store.size} 筆事故資料")
+        return store
     except Exception as e:
         print(f"✗ 讀取事故資料失敗: {e}")
         return None
 
 
-def create_timelapse():
+def cumulative_case_coords(store, case_type):
+    """
+    取得某事故類別依時間排序的座標, 以及每一天結束時的累積筆數
+    
+    Args:
+        store (CoordStore): 座標陣列
+        case_type (str): 'A1' 或 'A2'
+    
+    Returns:
+        tuple: ((n, 2) 座標陣列, 每日累積筆數陣列)
+    """
+    idx = store.case_index(case_type)
+    coords = np.column_stack([store.lon[idx], store.lat[idx]])
+    # 第 i 天結束時的累積筆數 = 索引小於 offsets[i+1] 的筆數
+    ends = np.searchsorted(idx, store.offsets[1:])
+    return coords, ends
+
+
+def create_timelapse(thin_points: bool = False, formats=('mp4',)):
     """
     建立台北市交通事故縮時攝影動畫
     
@@ -74,6 +105,13 @@ def create_timelapse():
     - 正方形畫布 (14x14)
     - 按日期顯示累積事故
     - A1/A2 事故分別以不同顏色顯示
+    - 可選: 像素級抽稀, 每個輸出像素每類別只畫一個標記 (大小依事故數放大)
+    - 可同時輸出多種格式 (MP4/WebM/GIF/APNG/預覽), 每幀只渲染一次
+    - 管線化: 背景執行緒預先準備影格資料, 主執行緒只繪製, 編碼器執行緒寫入 ffmpeg
+    
+    Args:
+        thin_points (bool): 是否啟用像素級抽稀
+        formats (iterable): 輸出格式, 見 export.SINK_PRESETS
     """
     print("\n" + "="*60)
     print("開始製作縮時攝影動畫")
@@ -81,15 +119,15 @@ def create_timelapse():
     
     # 載入資料
     gdf_boundary = load_taipei_boundary()
-    df_accidents = load_accident_data()
+    store = load_accident_data()
     
-    if gdf_boundary is None or df_accidents is None:
+    if gdf_boundary is None or store is None:
         print("✗ 無法創建動畫")
         return
     
-    # 取得所有日期並排序
-    dates = sorted(df_accidents['date'].dropna().unique())
-    print(f"  動畫時間範圍: {dates[0].strftime('%Y-%m-%d')} ~ {dates[-1].strftime('%Y-%m-%d')}")
+    # 取得所有日期 (座標陣列已依時間排序)
+    dates = store.dates
+    print(f"  動畫時間範圍: {dates[0]} ~ {dates[-1]}")
     print(f"  總幀數: {len(dates)} 幀")
     
     # 計算地圖範圍,確保 1:1 正方形
@@ -120,12 +158,13 @@ def create_timelapse():
     )
     
     # 設定正方形地圖範圍
-    ax.set_extent([
+    extent = [
         lon_center - square_size/2,
         lon_center + square_size/2,
         lat_center - square_size/2,
         lat_center + square_size/2
-    ], crs=ccrs.PlateCarree())
+    ]
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
     
     # 加入淺色網格線
     gl = ax.gridlines(
@@ -141,24 +180,16 @@ def create_timelapse():
     # 初始化散點物件 (累積顯示)
     scat_a1 = ax.scatter(
         [], [], 
-        c='red', 
-        s=30, 
-        alpha=0.7, 
         label='A1類事故',
         transform=ccrs.PlateCarree(),
-        zorder=3,
-        edgecolors='darkred',
-        linewidths=0.5
+        **CASE_STYLES['A1']
     )
     
     scat_a2 = ax.scatter(
         [], [], 
-        c='orange', 
-        s=8, 
-        alpha=0.4, 
         label='A2類事故',
         transform=ccrs.PlateCarree(),
-        zorder=2
+        **CASE_STYLES['A2']
     )
     
     # 標題
@@ -172,92 +203,146 @@ def create_timelapse():
     # 圖例 (暫時不使用中文字型以避免動畫渲染問題)
     ax.legend(loc='upper right', framealpha=0.9, fontsize=11, labels=['A1 Accidents', 'A2 Accidents'])
     
-    # 累積資料列表 (用於顯示從開始到當前日期的所有事故)
-    cumulative_a1_coords = []
-    cumulative_a2_coords = []
+    # 累積資料: 依時間排序的座標 + 每日累積筆數, 每幀只需取前綴切片
+    coords_a1, ends_a1 = cumulative_case_coords(store, 'A1')
+    coords_a2, ends_a2 = cumulative_case_coords(store, 'A2')
     
-    def init():
-        """初始化動畫"""
-        scat_a1.set_offsets(np.empty((0, 2)))
-        scat_a2.set_offsets(np.empty((0, 2)))
-        title_text.set_text('')
-        return scat_a1, scat_a2, title_text
+    # 像素級抽稀: 依輸出解析度建立地圖區域的像素格,
+    # 每類別以 THIN_LEVELS 個固定大小的圖層繪製 (第 0 級沿用原本的散點物件)
+    video_dpi = 100
+    thinners = None
+    layers = {'A1': [scat_a1], 'A2': [scat_a2]}
+    if thin_points:
+        ax.apply_aspect()
+        bbox = ax.get_position()
+        fig_w, fig_h = fig.get_size_inches()
+        width_px = round(bbox.width * fig_w * video_dpi)
+        height_px = round(bbox.height * fig_h * video_dpi)
+        thinners = {
+            case_type: PixelThinner(extent, width_px, height_px)
+            for case_type in layers
+        }
+        for case_type, style in CASE_STYLES.items():
+            for level in range(1, THIN_LEVELS):
+                level_style = dict(style, s=PixelThinner.level_size(style['s'], level))
+                layers[case_type].append(ax.scatter(
+                    [], [],
+                    label='_nolegend_',
+                    transform=ccrs.PlateCarree(),
+                    **level_style
+                ))
+        print(f"  像素級抽稀: {width_px}x{height_px} 像素格, {THIN_LEVELS} 個尺寸等級")
+    artists = (*layers['A1'], *layers['A2'])
+    cases = {'A1': (coords_a1, ends_a1), 'A2': (coords_a2, ends_a2)}
     
-    def update(frame):
+    def prepare(frame):
         """
-        更新函式 - 每幀更新
+        生產者執行緒: 準備一幀的各圖層座標與標題 (依幀序呼叫)
         
         Args:
-            frame (int): 當前幀數
+            frame (int): 幀數
             
         Returns:
-            tuple: 需要更新的藝術家物件
+            tuple: (標題字串, {事故類別: [各圖層座標]})
         """
-        nonlocal cumulative_a1_coords, cumulative_a2_coords
-        
-        # 取得當前日期
-        current_date = dates[frame]
-        
-        # 篩選到當前日期為止的所有資料 (累積顯示)
-        sub_df = df_accidents[df_accidents['date'] <= current_date]
-        
-        # 分離 A1 和 A2 事故
-        df_a1 = sub_df[sub_df['case_type'] == 'A1']
-        df_a2 = sub_df[sub_df['case_type'] == 'A2']
+        offsets = {}
+        for case_type, (coords, ends) in cases.items():
+            if thinners is not None:
+                # 只把這一幀新增的點加入像素格, 再依尺寸等級分到各圖層
+                thinner = thinners[case_type]
+                if frame == 0:
+                    thinner.reset()
+                start = ends[frame - 1] if frame > 0 else 0
+                thinner.add(coords[start:ends[frame]])
+                offsets[case_type] = thinner.offsets_by_level(THIN_LEVELS)
+            else:
+                # 到當前日期為止的所有資料 (累積顯示)
+                offsets[case_type] = [coords[:ends[frame]]]
         
-        # 更新散點位置 (累積)
-        if len(df_a1) > 0:
-            scat_a1.set_offsets(df_a1[['longitude', 'latitude']].to_numpy())
-        
-        if len(df_a2) > 0:
-            scat_a2.set_offsets(df_a2[['longitude', 'latitude']].to_numpy())
-        
-        # 更新標題
-        title_text.set_text(
+        title = (
             f'113年台北市交通事故累積分布\n'
-            f'{current_date.strftime("%Y-%m-%d")} '
-            f'(A1: {len(df_a1)}, A2: {len(df_a2)})'
+            f'{dates[frame]} '
+            f'(A1: {ends_a1[frame]}, A2: {ends_a2[frame]})'
         )
+        return title, offsets
+    
+    # 繪製階段 (主執行緒) 的統計由預取器與輸出器共用
+    draw_metrics = StageMetrics('draw')
+    frames = FramePrefetcher(prepare, len(dates), consumer_metrics=draw_metrics)
+    
+    def init():
+        """初始化動畫"""
+        for scat in artists:
+            scat.set_offsets(np.empty((0, 2)))
+        title_text.set_text('')
+        return (*artists, title_text)
+    
+    def update(frame_data):
+        """
+        更新函式 - 每幀只把預先準備好的資料套用到圖層
         
-        return scat_a1, scat_a2, title_text
+        Args:
+            frame_data (tuple): prepare() 的結果
+            
+        Returns:
+            tuple: 需要更新的藝術家物件
+        """
+        title, offsets = frame_data
+        for case_type, layer_offsets in offsets.items():
+            for scat, xy in zip(layers[case_type], layer_offsets):
+                scat.set_offsets(xy)
+        title_text.set_text(title)
+        return (*artists, title_text)
     
     print("\n開始生成動畫...")
     
-    # 建立動畫
+    # 建立動畫 (影格資料由背景執行緒預先準備)
+    # repeat=True 時 matplotlib 會以 itertools.tee 包裝 frames 並保留最初的副本,
+    # cache_frame_data=True 時則保留每一幀的資料; 兩者都會讓已繪製的影格無法釋放,
+    # 也會讓 FramePrefetcher 只被迭代一次, 因此都關閉
     ani = animation.FuncAnimation(
         fig,
         update,
-        frames=len(dates),
+        frames=frames,
         init_func=init,
         blit=True,
         interval=100,  # 每幀100ms
-        repeat=True
+        repeat=False,
+        cache_frame_data=False
     )
     
     # 確保輸出目錄存在
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
     
-    # 儲存動畫為 MP4
+    # 儲存動畫 (每幀渲染一次, 同時送往所有格式的編碼器)
     output_path = VIDEOS_DIR / 'taipei_timelapse.mp4'
+    writer = MultiSinkWriter(
+        formats=formats,
+        fps=10,
+        metadata={
+            'title': '台北市113年交通事故縮時攝影',
+            'artist': 'Taipei Traffic Analysis',
+            'comment': 'A1/A2 traffic accidents time-lapse visualization'
+        },
+        metrics=draw_metrics
+    )
     
     try:
-        print(f"  正在儲存動畫... (這可能需要幾分鐘)")
+        print(f"  正在儲存動畫 ({', '.join(formats)})... (這可能需要幾分鐘)")
+        start = time.perf_counter()
         ani.save(
             output_path,
-            writer='ffmpeg',
-            fps=10,
-            dpi=100,  # 降低 DPI 以減少記憶體使用
-            metadata={
-                'title': '台北市113年交通事故縮時攝影',
-                'artist': 'Taipei Traffic Analysis',
-                'comment': 'A1/A2 traffic accidents time-lapse visualization'
-            }
+            writer=writer,
+            dpi=video_dpi  # 降低 DPI 以減少記憶體使用
         )
-        print(f"\n✓ 動畫已成功儲存至: {output_path}")
+        print_stage_metrics([frames.metrics, *writer.stage_metrics()],
+                            wall_time=time.perf_counter() - start)
         
         # 顯示檔案資訊
-        file_size = output_path.stat().st_size / (1024 * 1024)  # MB
-        print(f"  檔案大小: {file_size:.2f} MB")
+        for fmt, path in writer.output_paths(output_path).items():
+            file_size = path.stat().st_size / (1024 * 1024)  # MB
+            print(f"\n✓ 動畫已成功儲存至: {path}")
+            print(f"  檔案大小: {file_size:.2f} MB")
         print(f"  總幀數: {len(dates)} 幀")
         print(f"  播放速度: 10 fps")
         print(f"  預計播放時間: {len(dates)/10:.1f} 秒")
@@ -279,4 +364,14 @@ def create_timelapse():
 
 
 if __name__ == "__main__":
-    create_timelapse()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="台北市交通事故縮時攝影動畫")
+    parser.add_argument(
+        '--formats', nargs='+', default=['mp4'], choices=list(SINK_PRESETS),
+        help="輸出格式 (可多選, 只渲染一次)"
+    )
+    parser.add_argument('--thin', action='store_true', help="啟用像素級抽稀")
+    args = parser.parse_args()
+    
+    create_timelapse(thin_points=args.thin, formats=args.formats)
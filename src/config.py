@@ -13,11 +13,81 @@ PROCESSED_DATA_DIR = DATA_DIR / "processed"
 OUTPUT_DIR = BASE_DIR / "outputs"
 FIGURES_DIR = OUTPUT_DIR / "figures"
 VIDEOS_DIR = OUTPUT_DIR / "videos"
+FACETS_DIR = FIGURES_DIR / "facets"  # 分面地圖的個別面板
+BATCH_MAPS_DIR = FIGURES_DIR / "batch"  # 批次輸出的篩選地圖
+REGRESSION_DIR = OUTPUT_DIR / "regression"  # 回歸測試的 golden 與工作目錄 (不納入版本控制)
 
 # --- Data Files ---
 RAW_DATA_FILE = RAW_DATA_DIR / "113年-臺北市A1及A2類交通事故明細.csv"
 INTERIM_DATA_FILE = INTERIM_DATA_DIR / "taipei_113_cleaned.parquet"  # 清洗後的中間資料
+QUARANTINE_DATA_FILE = INTERIM_DATA_DIR / "taipei_113_quarantine.parquet"  # 驗證未通過的資料 (含原因代碼)
 PROCESSED_DATA_FILE = PROCESSED_DATA_DIR / "taipei_113_clean.parquet"  # 最終處理後的資料
+PROCESSED_FRAGMENTS_DIR = PROCESSED_DATA_DIR / "fragments"  # 增量附加的 Parquet 片段
+QUARANTINE_FRAGMENTS_DIR = INTERIM_DATA_DIR / "quarantine"  # 增量附加時的隔離資料
+PARTIES_DATA_FILE = PROCESSED_DATA_DIR / "taipei_113_parties.parquet"  # 當事人 (車輛) 層級的資料
+PARTY_FRAGMENTS_DIR = PROCESSED_DATA_DIR / "party_fragments"  # 增量附加的當事人片段
+KEY_INDEX_FILE = PROCESSED_DATA_DIR / "key_index.npy"  # 已處理事故的排序事故鍵 (去重用)
+KEY_INDEX_RUNS_DIR = PROCESSED_DATA_DIR / "key_index_runs"  # 附加時寫入的排序事故鍵片段
+DAILY_COUNTS_FILE = PROCESSED_DATA_DIR / "taipei_113_daily_counts.parquet"  # 每日彙總計數
+COORD_STORE_DIR = PROCESSED_DATA_DIR / "coord_store"  # 繪圖用的座標陣列 (.npy, memory-map)
+HOTSPOTS_FILE = PROCESSED_DATA_DIR / "taipei_113_hotspots.csv"  # 事故熱點排名
+ANOMALIES_FILE = PROCESSED_DATA_DIR / "taipei_113_anomaly_days.csv"  # 各行政區的異常事故日
+VILLAGE_RATES_FILE = PROCESSED_DATA_DIR / "taipei_113_village_rates.csv"  # 各村里的事故密度 (含信賴區間)
+DISTRICT_RATES_FILE = PROCESSED_DATA_DIR / "taipei_113_district_rates.csv"  # 各行政區的事故密度 (含信賴區間)
+BOUNDARY_SHAPEFILE = DATA_DIR / "taipei" / "G97_A_CAVLGE_P.shp"  # 台北市村里界 (EPSG:3826)
+BOUNDARY_WGS84_FILE = INTERIM_DATA_DIR / "taipei_boundary_wgs84.parquet"  # 已轉為 WGS84 的村里界快取
+VILLAGE_METRICS_FILE = INTERIM_DATA_DIR / "taipei_village_metrics.parquet"  # 村里面積、村里與行政區邊界長度快取 (EPSG:3826)
+
+# --- Coordinate Reference Systems ---
+WGS84_EPSG = 4326  # 經緯度 (Cartopy PlateCarree)
+TWD97_EPSG = 3826  # TWD97 TM2 (Shapefile 原始座標系統, 單位: 公尺)
+TWD67_EPSG = 3828  # TWD67 TM2 (部分舊年度資料, 單位: 公尺)
+
+# 原始資料座標系統: None = 依數值範圍自動判斷 (經緯度 → WGS84, 公尺 → TWD97);
+# TWD97 與 TWD67 的數值範圍幾乎相同, 若某年度為 TWD67 請明確設為 TWD67_EPSG
+RAW_COORD_EPSG = None
+CRS_CHUNK_SIZE = 1_000_000  # 每批轉換的點數
+
+# --- Accident Keys ---
+ACCIDENT_KEY_DECIMALS = 6    # 事故鍵的座標量化位數 (1e-6 度約 0.1 公尺)
+
+# --- Incremental Append ---
+COMPACT_MAX_SEGMENTS = 16    # 事故鍵/座標陣列的附加片段超過此數時合併回基礎檔
+
+# --- Hotspot Detection ---
+HOTSPOT_RADIUS_M = 30.0      # 鄰近半徑 (公尺)
+HOTSPOT_MIN_SAMPLES = 10     # 半徑內 (含自身) 至少幾筆事故才視為核心點
+HOTSPOT_CHUNK_SIZE = 50_000  # 每批鄰近查詢的點數, 控制記憶體上限
+HOTSPOT_TOP_N = 20           # 地圖上標示的熱點數
+
+# --- Exposure Rates ---
+RISK_BOOTSTRAP_SAMPLES = 2000  # 自助法 (bootstrap) 重抽次數
+RISK_CI_LEVEL = 0.95           # 信賴區間水準
+RISK_SEED = 113                # 重抽的亂數種子 (結果可重現)
+RISK_TOP_N = 20                # 排名圖顯示的村里數
+
+# --- Static Map Rendering ---
+BATCH_MAP_DPI = 100          # 批次地圖的輸出解析度 (單張地圖維持 300 DPI)
+
+# --- Interactive Viewer ---
+VIEWER_GRID_SIZE = 1024        # 空間索引的格數 (每邊), 亦為密度圖的最高解析度
+VIEWER_MAX_MARKERS = 20_000    # 視窗內事故數不超過此值時改畫個別點位, 否則畫密度圖
+VIEWER_FRAME_BUDGET_MS = 50.0  # 每次重繪的目標時間 (毫秒)
+
+# --- Regression Harness ---
+REGRESSION_ROWS = 3000             # 合成資料的事故數
+REGRESSION_DAYS = 28               # 合成資料的天數 (亦為動畫幀數)
+REGRESSION_SEED = 113              # 合成資料的亂數種子
+REGRESSION_FLOAT_DECIMALS = 9      # 計算列雜湊前浮點數欄位取到的小數位數
+REGRESSION_PIXEL_THRESHOLD = 8     # 任一色版差異超過此值 (0-255) 的像素才算不同
+REGRESSION_PIXEL_TOLERANCE = 0.001 # 允許不同像素所占的比例
+REGRESSION_VIDEO_FRAMES = 5        # 動畫抽樣比對的幀數 (含第一幀與最後一幀)
+
+# --- Temporal Trends ---
+TREND_WINDOWS = (7, 28)        # 滾動視窗 (天)
+ANOMALY_BASELINE_DAYS = 28     # 異常偵測的基準期 (當日之前的天數)
+ANOMALY_Z_THRESHOLD = 3.0      # z 分數門檻
+ANOMALY_MIN_COUNT = 5          # 當日至少幾筆事故才列為異常
 
 # --- Column Mappings ---
 COLUMN_MAP = {
@@ -30,11 +100,40 @@ COLUMN_MAP = {
     "道路照明設備": "light",
     "天候": "weather",
     "車種": "vehicle_type",
+    "當事人序號": "party_seq",
     "座標-X": "longitude",
     "座標-Y": "latitude",
     "處理別-編號": "case_type_full" # A1 or A2 is inside this string
 }
 
+# 行政區 (區序) 對應: 移除編號前綴 (依 CSV 檔案中的實際值)
+DISTRICT_MAP = {
+    '01大同區': '大同區',
+    '02萬華區': '萬華區',
+    '03中山區': '中山區',
+    '04大安區': '大安區',
+    '05中正區': '中正區',
+    '06松山區': '松山區',
+    '07信義區': '信義區',
+    '08士林區': '士林區',
+    '09北投區': '北投區',
+    '10文山區': '文山區',
+    '11南港區': '南港區',
+    '12內湖區': '內湖區'
+}
+
+# 根據資料字典或推斷，建立事故類別對應
+CASE_TYPE_MAP = {
+    1: 'A1',
+    2: 'A2'
+}
+
+# 座標陣列中的事故類別代碼 (0 = 未知)
+CASE_CODES = {
+    "A1": 1,
+    "A2": 2
+}
+
 LIGHT_MAP = {
     "白天": "day",
     "日間": "day",
@@ -42,3 +141,35 @@ LIGHT_MAP = {
     "夜晚": "night",
     "昏暗": "night"
 }
+
+# 光線代碼 (道路照明設備): 5=白天, 6=夜間有照明, 7=夜間無照明
+LIGHT_CODE_MAP = {
+    5: "day",
+    6: "night",
+    7: "night"
+}
+LIGHT_BINS = ["day", "night", "unknown"]
+
+# 天候代碼 → 天候分類 (1 暴雨, 2 強風, 3 風沙, 4 霧或煙, 5 雪, 6 雨, 7 陰, 8 晴)
+WEATHER_GROUP_MAP = {
+    1: "rain",
+    2: "wind",
+    3: "wind",
+    4: "fog",
+    5: "snow",
+    6: "rain",
+    7: "cloudy",
+    8: "clear"
+}
+
+# 車種代碼字首 → 車種分類
+VEHICLE_GROUP_MAP = {
+    "A": "heavy",        # 大客車、大貨車、曳引車等
+    "B": "car",          # 小客車、小貨車
+    "C": "motorcycle",   # 機車
+    "D": "military",     # 軍車
+    "E": "special",      # 特種車
+    "F": "bicycle",      # 慢車 (自行車等)
+    "G": "other",        # 其他車
+    "H": "pedestrian"    # 行人
+}
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+繪圖用座標陣列模組
+ETL 完成後將經緯度、事故類別與時間另存為依時間排序的 .npy 檔,
+地圖與動畫以 np.load(mmap_mode='r') 開啟, 不必載入整份 DataFrame
+
+檔案內容 (COORD_STORE_DIR):
+- lon.npy / lat.npy: float32 經緯度
+- case.npy: uint8 事故類別代碼 (見 config.CASE_CODES, 0 = 未知)
+- ts.npy: int64 事故時間 (UTC epoch 奈秒)
+- dates.npy: datetime64[D] 出現過的日期 (台北時間)
+- offsets.npy: int64, 第 i 天的資料位於 [offsets[i], offsets[i+1])
+
+附加模式不改寫上述基礎檔, 而是把新資料寫成 segments/seg-<片段編號>/ 下的
+同格式陣列 (有自己的日期偏移量), 寫入成本只與新資料筆數成正比。
+讀取時若有片段則在記憶體中合併; 片段累積過多時以 compact_coord_store()
+合併回基礎檔 (成本與全部資料成正比, 但只偶爾執行一次)。
+"""
+import shutil
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from src.config import COORD_STORE_DIR, CASE_CODES
+from src.store import save_array
+
+STORE_FIELDS = ('lon', 'lat', 'case', 'ts', 'dates', 'offsets')
+
+# 附加片段所在的子目錄
+SEGMENTS_DIRNAME = 'segments'
+
+
+class CoordStore(NamedTuple):
+    """依時間排序的事故座標陣列"""
+    lon: np.ndarray
+    lat: np.ndarray
+    case: np.ndarray
+    ts: np.ndarray
+    dates: np.ndarray
+    offsets: np.ndarray
+
+    @property
+    def size(self) -> int:
+        """事故筆數"""
+        return len(self.lon)
+
+    def case_index(self, case_type: str) -> np.ndarray:
+        """取得某事故類別的列索引 (維持時間順序)"""
+        return np.flatnonzero(self.case == CASE_CODES[case_type])
+
+    def to_frame(self) -> pd.DataFrame:
+        """轉為只含 longitude/latitude/case_type 的精簡 DataFrame"""
+        categories = list(CASE_CODES)
+        codes = np.full(self.size, -1, dtype=np.int8)
+        for i, case_type in enumerate(categories):
+            codes[self.case == CASE_CODES[case_type]] = i
+        return pd.DataFrame({
+            'longitude': self.lon,
+            'latitude': self.lat,
+            'case_type': pd.Categorical.from_codes(codes, categories=categories),
+        })
+
+
+def build_coord_store(df: pd.DataFrame) -> CoordStore:
+    """
+    由處理後的資料建立座標陣列 (在記憶體中)
+
+    Args:
+        df (pd.DataFrame): 處理後的資料 (需含 acc_dt, case_type, longitude, latitude)
+
+    Returns:
+        CoordStore: 依時間排序的座標陣列
+    """
+    df = df.dropna(subset=['acc_dt']).sort_values('acc_dt', kind='mergesort')
+
+    # 日期以台北時間計算, 與 process_interim_data() 的 date 欄位一致
+    local_dt = df['acc_dt'].dt.tz_localize(None).to_numpy()
+    day = local_dt.astype('datetime64[D]')
+    dates, first_idx = np.unique(day, return_index=True)
+    offsets = np.append(first_idx, len(day)).astype(np.int64)
+
+    case = df['case_type'].map(CASE_CODES).fillna(0).to_numpy(dtype=np.uint8)
+    utc_dt = df['acc_dt'].dt.tz_convert('UTC').dt.tz_localize(None)
+    ts = utc_dt.to_numpy().astype('datetime64[ns]').view(np.int64)
+
+    return CoordStore(
+        lon=df['longitude'].to_numpy(dtype=np.float32),
+        lat=df['latitude'].to_numpy(dtype=np.float32),
+        case=case,
+        ts=ts,
+        dates=dates,
+        offsets=offsets,
+    )
+
+
+def save_coord_store(store: CoordStore, store_dir: Path = COORD_STORE_DIR) -> None:
+    """將座標陣列寫入 .npy 檔"""
+    for field in STORE_FIELDS:
+        save_array(store_dir / f'{field}.npy', getattr(store, field))
+
+
+def segment_dirs(store_dir: Path = COORD_STORE_DIR) -> list:
+    """依寫入順序列出附加片段的目錄"""
+    return sorted((store_dir / SEGMENTS_DIRNAME).glob('seg-*'))
+
+
+def clear_coord_segments(store_dir: Path = COORD_STORE_DIR) -> int:
+    """移除所有附加片段, 回傳移除數量"""
+    dirs = segment_dirs(store_dir)
+    for path in dirs:
+        shutil.rmtree(path)
+    return len(dirs)
+
+
+def write_coord_store(df: pd.DataFrame, store_dir: Path = COORD_STORE_DIR) -> CoordStore:
+    """
+    由處理後的資料建立並儲存座標陣列 (完整重建, 舊的附加片段一併移除)
+
+    Args:
+        df (pd.DataFrame): 處理後的資料
+        store_dir (Path): 輸出目錄
+
+    Returns:
+        CoordStore: 寫入的座標陣列
+    """
+    store = build_coord_store(df)
+    save_coord_store(store, store_dir)
+    clear_coord_segments(store_dir)
+    return store
+
+
+def write_coord_segment(df: pd.DataFrame, segment_id: str,
+                        store_dir: Path = COORD_STORE_DIR) -> CoordStore:
+    """
+    將新一批資料寫為附加片段 (只處理新資料, 不讀取或改寫基礎檔)
+
+    Args:
+        df (pd.DataFrame): 新一批處理後的資料
+        segment_id (str): 片段編號 (與資料片段相同, 見 store.new_fragment_id)
+        store_dir (Path): 座標陣列目錄
+
+    Returns:
+        CoordStore: 片段的座標陣列
+    """
+    segment = build_coord_store(df)
+    save_coord_store(segment, store_dir / SEGMENTS_DIRNAME / f'seg-{segment_id}')
+    return segment
+
+
+def merge_coord_stores(stores: list) -> CoordStore:
+    """
+    依時間合併多份座標陣列 (時間相同時維持傳入順序)
+
+    每日偏移量由各份的每日筆數合併而來, 不必重新換算日期。
+
+    Args:
+        stores (list): CoordStore, 各自依時間排序
+
+    Returns:
+        CoordStore: 合併後的座標陣列
+    """
+    if len(stores) == 1:
+        return stores[0]
+    ts = np.concatenate([np.asarray(store.ts) for store in stores])
+    order = np.argsort(ts, kind='stable')
+    merged = {
+        field: np.concatenate([np.asarray(getattr(store, field)) for store in stores])[order]
+        for field in ('lon', 'lat', 'case')
+    }
+
+    dates, inverse = np.unique(np.concatenate([store.dates for store in stores]),
+                               return_inverse=True)
+    counts = np.bincount(
+        inverse,
+        weights=np.concatenate([np.diff(store.offsets) for store in stores])
+    ).astype(np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    return CoordStore(ts=ts[order], dates=dates, offsets=offsets, **merged)
+
+
+def _open_store(store_dir: Path) -> Optional[CoordStore]:
+    """以 memory-map 開啟一份座標陣列; 檔案不齊全時回傳 None"""
+    if not coord_store_exists(store_dir):
+        return None
+    return CoordStore(*(
+        np.load(store_dir / f'{field}.npy', mmap_mode='r') for field in STORE_FIELDS
+    ))
+
+
+def coord_store_exists(store_dir: Path = COORD_STORE_DIR) -> bool:
+    """基礎座標陣列是否已產生 (不開啟檔案)"""
+    return all((store_dir / f'{field}.npy').exists() for field in STORE_FIELDS)
+
+
+def load_coord_store(store_dir: Path = COORD_STORE_DIR) -> Optional[CoordStore]:
+    """
+    開啟座標陣列 (基礎檔 + 附加片段)
+
+    沒有附加片段時直接以 memory-map 開啟; 有片段時在記憶體中依時間合併。
+
+    Args:
+        store_dir (Path): 座標陣列目錄
+
+    Returns:
+        CoordStore | None: 座標陣列; 尚未產生時回傳 None
+    """
+    base = _open_store(store_dir)
+    if base is None:
+        return None
+    segments = [_open_store(path) for path in segment_dirs(store_dir)]
+    return merge_coord_stores([base] + [seg for seg in segments if seg is not None])
+
+
+def compact_coord_store(store_dir: Path = COORD_STORE_DIR, max_segments: int = 0) -> int:
+    """
+    片段數超過 max_segments 時, 將所有片段合併回基礎檔
+
+    Args:
+        store_dir (Path): 座標陣列目錄
+        max_segments (int): 允許保留的片段數 (0 = 有片段就合併)
+
+    Returns:
+        int: 合併的片段數 (未合併為 0)
+    """
+    n_segments = len(segment_dirs(store_dir))
+    if n_segments <= max_segments:
+        return 0
+    store = load_coord_store(store_dir)
+    if store is None:
+        return 0
+    save_coord_store(CoordStore(*(np.array(field) for field in store)), store_dir)
+    return clear_coord_segments(store_dir)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+座標系統正規化模組
+- 依數值範圍判斷原始座標的座標系統 (WGS84 經緯度 / TWD97、TWD67 TM2 公尺)
+- 以快取的 pyproj Transformer 對 NumPy 陣列分批轉換
+- 台北市邊界轉為 WGS84 後快取為 GeoParquet, 之後不必再重新投影
+"""
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from pyproj import Transformer
+from src.config import (
+    WGS84_EPSG, TWD97_EPSG, RAW_COORD_EPSG, CRS_CHUNK_SIZE,
+    BOUNDARY_SHAPEFILE, BOUNDARY_WGS84_FILE
+)
+
+# 台灣本島附近的數值範圍 (x_min, x_max, y_min, y_max)
+WGS84_RANGE = (119.0, 123.0, 21.0, 26.5)
+TM2_RANGE = (100_000.0, 400_000.0, 2_400_000.0, 2_850_000.0)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(src_epsg: int, dst_epsg: int) -> Transformer:
+    """建立並快取座標轉換器 (always_xy: 經度/東距在前)"""
+    return Transformer.from_crs(src_epsg, dst_epsg, always_xy=True)
+
+
+def _in_range(x: float, y: float, bounds: tuple) -> bool:
+    x_min, x_max, y_min, y_max = bounds
+    return x_min <= x <= x_max and y_min <= y <= y_max
+
+
+def detect_crs(x: np.ndarray, y: np.ndarray) -> Optional[int]:
+    """
+    依整個檔案座標的中位數判斷座標系統
+
+    TWD97 與 TWD67 的 TM2 數值範圍無法區分, 公尺座標一律視為
+    TWD97; TWD67 的年度請以 config.RAW_COORD_EPSG 指定。
+
+    Args:
+        x (np.ndarray): X 座標 (經度或東距)
+        y (np.ndarray): Y 座標 (緯度或北距)
+
+    Returns:
+        int | None: EPSG 代碼; 無有效座標或無法判斷時回傳 None
+    """
+    valid = np.isfinite(x) & np.isfinite(y)
+    if not valid.any():
+        return None
+    x_med, y_med = np.median(x[valid]), np.median(y[valid])
+    if _in_range(x_med, y_med, WGS84_RANGE):
+        return WGS84_EPSG
+    if _in_range(x_med, y_med, TM2_RANGE):
+        return TWD97_EPSG
+    return None
+
+
+def transform_coords(x: np.ndarray, y: np.ndarray, src_epsg: int, dst_epsg: int,
+                     chunk_size: int = CRS_CHUNK_SIZE):
+    """
+    分批轉換座標 (輸出陣列預先配置, 記憶體用量不隨批數增加)
+
+    Args:
+        x (np.ndarray): X 座標
+        y (np.ndarray): Y 座標
+        src_epsg (int): 原始座標系統
+        dst_epsg (int): 目標座標系統
+        chunk_size (int): 每批轉換的點數
+
+    Returns:
+        tuple: (轉換後的 x, 轉換後的 y)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if src_epsg == dst_epsg:
+        return x, y
+
+    transformer = get_transformer(src_epsg, dst_epsg)
+    out_x = np.empty_like(x)
+    out_y = np.empty_like(y)
+    for start in range(0, len(x), chunk_size):
+        stop = start + chunk_size
+        out_x[start:stop], out_y[start:stop] = transformer.transform(x[start:stop], y[start:stop])
+    return out_x, out_y
+
+
+def normalize_coordinates(df: pd.DataFrame, source_epsg: Optional[int] = RAW_COORD_EPSG):
+    """
+    將 longitude/latitude 欄位正規化為 WGS84 經緯度
+
+    Args:
+        df (pd.DataFrame): 需含數值型的 longitude, latitude
+        source_epsg (int, optional): 原始座標系統; None 時自動判斷
+
+    Returns:
+        tuple: (轉換後的資料, 原始座標系統的 EPSG 代碼或 None)
+    """
+    x = df['longitude'].to_numpy(dtype=np.float64)
+    y = df['latitude'].to_numpy(dtype=np.float64)
+    if source_epsg is None:
+        source_epsg = detect_crs(x, y)
+    if source_epsg is None or source_epsg == WGS84_EPSG:
+        return df, source_epsg
+
+    lon, lat = transform_coords(x, y, source_epsg, WGS84_EPSG)
+    df = df.copy()
+    df['longitude'] = lon
+    df['latitude'] = lat
+    return df, source_epsg
+
+
+def load_boundary_wgs84() -> gpd.GeoDataFrame:
+    """
+    載入 WGS84 的台北市村里界
+
+    第一次由 Shapefile 重新投影並存成 GeoParquet; 之後直接讀取快取,
+    Shapefile 更新 (修改時間較新) 時才重新產生。
+
+    Returns:
+        GeoDataFrame: 台北市邊界資料 (WGS84 座標系統)
+    """
+    if (BOUNDARY_WGS84_FILE.exists()
+            and BOUNDARY_WGS84_FILE.stat().st_mtime >= BOUNDARY_SHAPEFILE.stat().st_mtime):
+        return gpd.read_parquet(BOUNDARY_WGS84_FILE)
+
+    gdf = gpd.read_file(BOUNDARY_SHAPEFILE).to_crs(epsg=WGS84_EPSG)
+    BOUNDARY_WGS84_FILE.parent.mkdir(parents=True, exist_ok=True)
+    gdf.to_parquet(BOUNDARY_WGS84_FILE, index=False)
+    return gdf
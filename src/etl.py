@@ -5,42 +5,96 @@ ETL 資料處理流程模組
 1. raw → interim: 基礎清洗和轉換
 2. interim → processed: 特徵工程和最終處理
 """
+import numpy as np
 import pandas as pd
+from pathlib import Path
+from typing import Optional
 from zoneinfo import ZoneInfo
-from src.config import COLUMN_MAP
-
-# 根據 CSV 檔案中的實際值更新行政區對應
-DISTRICT_MAP = {
-    '01大同區': '大同區',
-    '02萬華區': '萬華區',
-    '03中山區': '中山區',
-    '04大安區': '大安區',
-    '05中正區': '中正區',
-    '06松山區': '松山區',
-    '07信義區': '信義區',
-    '08士林區': '士林區',
-    '09北投區': '北投區',
-    '10文山區': '文山區',
-    '11南港區': '南港區',
-    '12內湖區': '內湖區'
-}
-
-# 根據資料字典或推斷，建立光線對應
-# 假設 5=白天, 6=夜間有照明, 7=夜間無照明
-LIGHT_MAP_FROM_NUMERIC = {
-    5.0: "day",
-    6.0: "night",
-    7.0: "night"
-}
-
-# 根據資料字典或推斷，建立事故類別對應
-CASE_TYPE_MAP = {
-    1: 'A1',
-    2: 'A2'
-}
-
-
-def clean_raw_data(df: pd.DataFrame) -> pd.DataFrame:
+from src.config import (
+    COLUMN_MAP, WGS84_EPSG, DISTRICT_MAP, CASE_TYPE_MAP, LIGHT_MAP, LIGHT_CODE_MAP,
+    LIGHT_BINS, WEATHER_GROUP_MAP, VEHICLE_GROUP_MAP
+)
+from src.crs import normalize_coordinates
+from src.validate import validate_records
+from src.keys import accident_keys, first_per_key
+
+# 分類欄位的類別順序 (固定順序讓增量片段與基礎檔的 dtype 一致)
+DISTRICT_CATEGORIES = list(DISTRICT_MAP.values()) + ['未知']
+WEATHER_GROUPS = list(dict.fromkeys(WEATHER_GROUP_MAP.values())) + ['unknown']
+VEHICLE_GROUPS = list(VEHICLE_GROUP_MAP.values()) + ['unknown']
+
+
+def _as_code(value) -> Optional[int]:
+    """將數值或數字字串代碼轉為 int, 無法轉換時回傳 None"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_categorical(values: pd.Series, mapper, categories: Optional[list] = None,
+                          default=None, name: Optional[str] = None) -> pd.Categorical:
+    """
+    以字典編碼正規化分類欄位: 只對不重複值做清理與對應, 再透過代碼廣播回每一列
+
+    無法對應 (mapper 回傳 None 或不在 categories 中) 的值歸為 default,
+    並列印筆數與前幾個原始值, 不會默默變成缺值。
+
+    Args:
+        values (pd.Series): 原始欄位
+        mapper (callable): 不重複值 → 正規化後的標籤, 無法對應時回傳 None
+        categories (list, optional): 固定的類別順序; 預設為對應結果排序後的集合
+        default: 缺值或無法對應時的標籤 (None 表示保留為缺值)
+        name (str, optional): 訊息中的欄位名稱, 預設為 values.name
+
+    Returns:
+        pd.Categorical: 正規化後的分類資料
+    """
+    codes, uniques = pd.factorize(values)
+    labels = [mapper(value) for value in uniques]
+    if categories is None:
+        categories = sorted({label for label in labels + [default] if label is not None})
+    index = pd.Index(categories)
+    label_codes = index.get_indexer(labels)
+    default_code = index.get_loc(default) if default is not None else -1
+
+    unmapped = label_codes < 0
+    if unmapped.any():
+        label_codes[unmapped] = default_code
+        n_rows = int(np.bincount(codes[codes >= 0], minlength=len(uniques))[unmapped].sum())
+        examples = ', '.join(repr(value) for value in list(uniques[unmapped])[:5])
+        print(f"  ! {name or values.name}: {n_rows} 筆 ({int(unmapped.sum())} 種值) 無法對應, "
+              f"歸為 {default!r} (例如 {examples})")
+
+    # 最後一格給缺值 (factorize 的代碼 -1 會索引到這裡)
+    label_codes = np.append(label_codes, default_code)
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+
+def _light_bin(value) -> Optional[str]:
+    """光線: 數值代碼 (LIGHT_CODE_MAP) 或文字 (LIGHT_MAP)"""
+    if isinstance(value, str) and _as_code(value) is None:
+        return LIGHT_MAP.get(value.strip())
+    return LIGHT_CODE_MAP.get(_as_code(value))
+
+
+def _clean_vehicle_type(value) -> Optional[str]:
+    """車種代碼: 去除空白 (保留原本的大小寫)"""
+    value = str(value).strip()
+    return value or None
+
+
+def _vehicle_group(value) -> Optional[str]:
+    """車種分類: 依車種代碼字首"""
+    return VEHICLE_GROUP_MAP.get(str(value).strip().upper()[:1])
+
+
+def classify_vehicle_groups(vehicle_type: pd.Series) -> pd.Categorical:
+    """由車種代碼推得車種分類 (VEHICLE_GROUP_MAP, 無法對應者為 'unknown')"""
+    return normalize_categorical(vehicle_type, _vehicle_group, VEHICLE_GROUPS, 'unknown')
+
+
+def clean_raw_data(df: pd.DataFrame, quarantine_file: Optional[Path] = None) -> pd.DataFrame:
     """
     階段 1: 將原始資料進行基礎清洗和轉換 (raw → interim)
     
@@ -48,12 +102,16 @@ def clean_raw_data(df: pd.DataFrame) -> pd.DataFrame:
     1. 標準化欄位名稱
     2. 轉換時間格式 (民國年 → 西元年)
     3. 建立 datetime 欄位
-    4. 轉換經緯度為數值
+    4. 轉換經緯度為數值, 並將 TWD97/TWD67 公尺座標轉為 WGS84
     5. 提取事故類別
-    6. 移除明顯無效的資料
+    6. 資料品質驗證 (缺值、範圍、座標軸、邊界、重複), 未通過者移至隔離區
+    7. 計算事故鍵 accident_key (同一事故的各當事人共用)
+    
+    輸出仍為當事人 (車輛) 層級, 一起事故可能有多列。
     
     Args:
         df (pd.DataFrame): 原始資料
+        quarantine_file (Path, optional): 未通過驗證的資料輸出路徑 (含原因代碼)
     
     Returns:
         pd.DataFrame: 清洗後的中間資料
@@ -82,21 +140,32 @@ def clean_raw_data(df: pd.DataFrame) -> pd.DataFrame:
     df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
     print(f"  ✓ 經緯度轉換為數值")
     
+    df, source_epsg = normalize_coordinates(df)
+    if source_epsg is None:
+        print(f"  ! 無法判斷座標系統, 保留原始數值")
+    elif source_epsg == WGS84_EPSG:
+        print(f"  ✓ 座標系統: WGS84 (EPSG:4326), 不需轉換")
+    else:
+        print(f"  ✓ 座標系統: EPSG:{source_epsg} → 轉換為 WGS84 (EPSG:4326)")
+    
     # 4. 提取事故類別
     df['case_type'] = df['case_type_full'].map(CASE_TYPE_MAP)
     print(f"  ✓ 事故類別提取完成")
     
-    # 5. 移除明顯無效的資料 (缺少關鍵欄位)
-    before_drop = len(df)
-    df = df.dropna(subset=["longitude", "latitude", "acc_dt", "case_type"])
-    after_drop = len(df)
-    print(f"  ✓ 移除無效資料: {before_drop - after_drop} 筆")
+    # 5. 資料品質驗證 (取代原本的 dropna + drop_duplicates)
+    df, rejects, rule_counts = validate_records(df)
+    print(f"  ✓ 資料驗證: 剔除 {len(rejects)} 筆")
+    for rule, count in rule_counts[rule_counts > 0].items():
+        print(f"    - {rule}: {count} 筆")
+    
+    if quarantine_file is not None:
+        quarantine_file.parent.mkdir(parents=True, exist_ok=True)
+        rejects.to_parquet(quarantine_file, index=False)
+        print(f"  ✓ 隔離資料已儲存至: {quarantine_file}")
     
-    # 6. 移除重複資料
-    before_dedup = len(df)
-    df = df.drop_duplicates(subset=['acc_dt', 'longitude', 'latitude'])
-    after_dedup = len(df)
-    print(f"  ✓ 移除重複資料: {before_dedup - after_dedup} 筆")
+    # 6. 事故鍵
+    df['accident_key'] = accident_keys(df)
+    print(f"  ✓ 事故鍵計算完成 ({int(first_per_key(df['accident_key'].to_numpy()).sum())} 起事故)")
     
     print(f"  清洗後資料筆數: {len(df)}\n")
     
@@ -111,8 +180,10 @@ def process_interim_data(df: pd.DataFrame) -> pd.DataFrame:
     1. 提取日期欄位
     2. 處理光線資訊
     3. 處理行政區名稱
-    4. 修整文字欄位
-    5. 選擇最終欄位
+    4. 車種代碼與車種分類、天候分類
+    5. 每起事故保留第一位當事人 (依 accident_key), 選擇最終欄位
+    
+    當事人層級的車種資料另見 extract_parties()。分類欄位以 normalize_categorical() 只處理不重複值, 輸出為 category dtype。
     
     Args:
         df (pd.DataFrame): 中間資料
@@ -123,27 +194,44 @@ def process_interim_data(df: pd.DataFrame) -> pd.DataFrame:
     print("【階段 2: 特徵工程】interim → processed")
     print(f"  中間資料筆數: {len(df)}")
     
+    # 0. 合併為事故層級 (較早產生的中間資料沒有事故鍵, 在此補算)
+    if 'accident_key' not in df.columns:
+        df['accident_key'] = accident_keys(df)
+    df = df[first_per_key(df['accident_key'].to_numpy())].copy()
+    print(f"  ✓ 合併為事故層級: {len(df)} 起事故")
+    
     # 1. 提取日期欄位
     df["date"] = df["acc_dt"].dt.date
     print(f"  ✓ 提取日期欄位")
     
     # 2. 處理光線欄位
-    df["light_bin"] = df["light"].map(LIGHT_MAP_FROM_NUMERIC).fillna("unknown")
+    df["light_bin"] = normalize_categorical(df["light"], _light_bin, LIGHT_BINS, "unknown")
     print(f"  ✓ 光線資訊分類完成")
     
     # 3. 處理行政區名稱 (移除編號前綴)
-    df['district'] = df['district'].map(DISTRICT_MAP).fillna('未知')
+    df['district'] = normalize_categorical(
+        df['district'], lambda value: DISTRICT_MAP.get(str(value).strip()),
+        DISTRICT_CATEGORIES, '未知'
+    )
     print(f"  ✓ 行政區名稱標準化")
     
-    # 4. 修整文字欄位
+    # 4. 車種與天候分類
     if 'vehicle_type' in df.columns:
-        df['vehicle_type'] = df['vehicle_type'].str.strip()
-        print(f"  ✓ 文字欄位修整完成")
+        df['vehicle_group'] = classify_vehicle_groups(df['vehicle_type'])
+        df['vehicle_type'] = normalize_categorical(df['vehicle_type'], _clean_vehicle_type)
+        print(f"  ✓ 車種代碼修整與分類完成 ({len(df['vehicle_type'].cat.categories)} 種車種)")
+    
+    if 'weather' in df.columns:
+        df['weather_group'] = normalize_categorical(
+            df['weather'], lambda value: WEATHER_GROUP_MAP.get(_as_code(value)),
+            WEATHER_GROUPS, 'unknown'
+        )
+        print(f"  ✓ 天候分類完成")
     
     # 5. 選擇並排序最終需要的欄位
     final_cols = [
-        'acc_dt', 'date', 'hour', 'district', 'case_type', 'light_bin', 
-        'vehicle_type', 'longitude', 'latitude'
+        'acc_dt', 'date', 'hour', 'district', 'case_type', 'light_bin', 'weather_group',
+        'vehicle_type', 'vehicle_group', 'longitude', 'latitude', 'accident_key'
     ]
     for col in final_cols:
         if col not in df.columns:
@@ -156,6 +244,32 @@ def process_interim_data(df: pd.DataFrame) -> pd.DataFrame:
     return df_final
 
 
+def extract_parties(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    由中間資料取出當事人 (車輛) 層級的資料
+    
+    以 accident_key 與處理後的事故資料對應 (見 keys.join_accidents)。
+    
+    Args:
+        df (pd.DataFrame): 中間資料 (含 accident_key)
+    
+    Returns:
+        pd.DataFrame: accident_key, party_seq, vehicle_type, vehicle_group
+    """
+    keys = df['accident_key'] if 'accident_key' in df.columns else accident_keys(df)
+    vehicle_type = df.get('vehicle_type', pd.Series(None, index=df.index, dtype=object))
+    party_seq = df.get('party_seq', pd.Series(1, index=df.index))
+    parties = pd.DataFrame({
+        'accident_key': np.asarray(keys, dtype=np.uint64),
+        'party_seq': pd.to_numeric(party_seq, errors='coerce').astype('Int16').array,
+        'vehicle_type': normalize_categorical(vehicle_type, _clean_vehicle_type),
+        'vehicle_group': classify_vehicle_groups(vehicle_type),
+    })
+    print(f"  ✓ 當事人資料: {len(parties)} 筆 "
+          f"({parties['accident_key'].nunique()} 起事故)")
+    return parties
+
+
 def clean_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     完整的 ETL 流程 (向後相容)
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+動畫多格式輸出模組
+每幀只渲染一次, 將畫面緩衝區同時送往多個 ffmpeg 編碼器 (MP4/WebM/GIF/APNG/預覽),
+每個編碼器是獨立的子行程, 並由各自的執行緒透過有上限的佇列餵入影格
+"""
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import matplotlib.animation as animation
+from src.pipeline import StageMetrics
+
+# 各輸出格式的副檔名與 ffmpeg 編碼參數
+SINK_PRESETS = {
+    'mp4': {
+        'suffix': '.mp4',
+        'args': ['-vcodec', 'libx264', '-pix_fmt', 'yuv420p'],
+    },
+    'webm': {
+        'suffix': '.webm',
+        'args': ['-vcodec', 'libvpx-vp9', '-b:v', '0', '-crf', '32',
+                 '-row-mt', '1', '-pix_fmt', 'yuv420p'],
+    },
+    'gif': {
+        # 逐幀產生調色盤, 不需先緩衝整段影片
+        'suffix': '.gif',
+        'args': ['-filter_complex',
+                 '[0:v]scale=iw/2:-1:flags=lanczos,split[a][b];'
+                 '[a]palettegen=stats_mode=single[p];[b][p]paletteuse=new=1'],
+    },
+    'apng': {
+        'suffix': '.apng',
+        'args': ['-f', 'apng', '-plays', '0'],
+    },
+    'preview': {
+        'suffix': '_preview.mp4',
+        'args': ['-vf', 'scale=iw/2:-2', '-vcodec', 'libx264', '-pix_fmt', 'yuv420p'],
+    },
+}
+
+# 每個編碼器佇列最多暫存的影格數 (1400x1400 RGBA 約 7.5 MB/幀)
+SINK_QUEUE_SIZE = 8
+
+# 只有這些容器會寫入 metadata
+METADATA_FORMATS = {'mp4', 'webm', 'preview'}
+
+
+class FFmpegSink:
+    """
+    單一輸出格式: 一個 ffmpeg 子行程 + 一個餵資料的執行緒
+
+    Args:
+        fmt (str): SINK_PRESETS 中的格式名稱
+        path (Path): 輸出檔案路徑
+        frame_size (tuple): 影格大小 (寬, 高) 像素
+        fps (int): 每秒影格數
+        metadata (dict): 影片 metadata
+    """
+
+    def __init__(self, fmt: str, path: Path, frame_size, fps, metadata=None):
+        self.fmt = fmt
+        self.path = Path(path)
+        self.queue = queue.Queue(maxsize=SINK_QUEUE_SIZE)
+        self.error = None
+        self.metrics = StageMetrics(f'sink-{fmt}')
+
+        width, height = frame_size
+        cmd = [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-vcodec', 'rawvideo', '-pix_fmt', 'rgba',
+            '-s', f'{width}x{height}', '-r', str(fps), '-i', 'pipe:0',
+            *SINK_PRESETS[fmt]['args'],
+        ]
+        if fmt in METADATA_FORMATS:
+            for key, value in (metadata or {}).items():
+                cmd += ['-metadata', f'{key}={value}']
+        cmd.append(str(self.path))
+
+        self.proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        )
+        self.thread = threading.Thread(target=self._feed, name=f'sink-{fmt}', daemon=True)
+        self.thread.start()
+
+    def _feed(self):
+        """從佇列取出影格寫入 ffmpeg, 收到 None 時結束"""
+        metrics = self.metrics
+        while True:
+            frame = metrics.get(self.queue)
+            if frame is None:
+                break
+            if self.error is not None:
+                continue  # 編碼器已失敗, 只清空佇列避免主執行緒卡住
+            # 寫入時間包含 ffmpeg 編碼跟不上時的管線回壓
+            start = time.perf_counter()
+            try:
+                self.proc.stdin.write(frame)
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+            metrics.busy += time.perf_counter() - start
+            metrics.items += 1
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+    def put(self, frame: bytes, metrics: StageMetrics = None):
+        """送出一幀 (佇列已滿時等待編碼器, 等待時間記入呼叫端的 metrics)"""
+        if metrics is None:
+            self.queue.put(frame)
+        else:
+            metrics.put(self.queue, frame)
+
+    def close(self):
+        """送出結束訊號並等待 ffmpeg 完成"""
+        self.queue.put(None)
+        self.thread.join()
+        stderr = self.proc.stderr.read().decode(errors='replace')
+        returncode = self.proc.wait()
+        if returncode != 0 or self.error is not None:
+            raise RuntimeError(
+                f"ffmpeg ({self.fmt}) 輸出失敗 (return code {returncode}): {stderr.strip()}"
+            )
+
+    def abort(self):
+        """中止輸出: 結束餵資料的執行緒並強制結束 ffmpeg (不檢查結果)"""
+        self.error = self.error or RuntimeError('aborted')
+        self.queue.put(None)
+        self.thread.join()
+        self.proc.kill()
+        self.proc.wait()
+        self.proc.stderr.close()
+
+
+class MultiSinkWriter(animation.AbstractMovieWriter):
+    """
+    將 Animation.save() 的每一幀同時輸出為多種格式
+
+    grab_frame() 只呼叫一次 canvas.draw(), 取得的 RGBA 緩衝區
+    以同一個 bytes 物件送往所有編碼器。
+
+    Args:
+        formats (iterable): 要輸出的格式 (SINK_PRESETS 的鍵)
+        fps (int): 每秒影格數
+        metadata (dict): 影片 metadata
+        metrics (StageMetrics, optional): 繪製階段 (主執行緒) 的統計
+    """
+
+    def __init__(self, formats=('mp4',), fps=10, metadata=None, metrics=None):
+        super().__init__(fps=fps, metadata=metadata)
+        unknown = set(formats) - set(SINK_PRESETS)
+        if unknown:
+            raise ValueError(f"Unknown export formats: {sorted(unknown)}")
+        self.formats = list(formats)
+        self.sinks = []
+        self.metrics = metrics or StageMetrics('draw')
+
+    def stage_metrics(self) -> list:
+        """繪製階段與各編碼器階段的統計"""
+        return [self.metrics, *(sink.metrics for sink in self.sinks)]
+
+    def output_paths(self, outfile) -> dict:
+        """依主輸出檔名推得各格式的輸出路徑"""
+        outfile = Path(outfile)
+        base = outfile.with_suffix('')
+        return {
+            fmt: base.with_name(base.name + SINK_PRESETS[fmt]['suffix'])
+            for fmt in self.formats
+        }
+
+    def setup(self, fig, outfile, dpi=None):
+        super().setup(fig, outfile, dpi)
+        # 以輸出 DPI 渲染, 使畫布緩衝區即為影格大小
+        self._orig_dpi = fig.dpi
+        fig.set_dpi(self.dpi)
+        # 某個編碼器啟動失敗 (例如缺少編碼器) 時, 中止已啟動的編碼器,
+        # 避免其 ffmpeg 子行程與餵資料的執行緒一直等待輸入
+        self.sinks = []
+        try:
+            for fmt, path in self.output_paths(outfile).items():
+                self.sinks.append(FFmpegSink(fmt, path, self.frame_size, self.fps, self.metadata))
+        except BaseException:
+            for sink in self.sinks:
+                sink.abort()
+            self.sinks = []
+            fig.set_dpi(self._orig_dpi)
+            raise
+
+    def grab_frame(self, **savefig_kwargs):
+        start = time.perf_counter()
+        self.fig.canvas.draw()
+        frame = bytes(self.fig.canvas.buffer_rgba())
+        self.metrics.busy += time.perf_counter() - start
+        self.metrics.items += 1
+        for sink in self.sinks:
+            sink.put(frame, self.metrics)
+
+    def finish(self):
+        self.fig.set_dpi(self._orig_dpi)
+        errors = []
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except RuntimeError as e:
+                errors.append(str(e))
+        if errors:
+            raise RuntimeError('\n'.join(errors))
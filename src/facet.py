@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+小倍數 (small multiples) 事故地圖
+依行政區或月份分面, 每個面板與 create_accident_map() 相同的底圖與點位樣式
+
+- 資料只讀取一次, 以排序索引 (argsort + 區段位移) 分組, 不重複做布林篩選
+- 村里界只繪製一次並點陣化, 每個面板以 imshow 貼上同一張底圖
+- 個別面板以行程池平行輸出 PNG; 亦可合併成單一格狀大圖
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import cartopy.crs as ccrs
+from matplotlib.font_manager import FontProperties
+from src.config import FIGURES_DIR, FACETS_DIR, PROCESSED_DATA_FILE
+from src.crs import load_boundary_wgs84
+from src.store import read_processed_data
+
+# 配置中文字型
+font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
+font_prop = FontProperties(fname=font_path)
+
+# 可分面的欄位
+FACET_KEYS = ('district', 'month')
+
+# 底圖點陣的邊長 (像素), 與面板輸出解析度相當即可
+BASEMAP_SIZE_PX = 1200
+
+# 面板中的點位樣式 (與 viz_map.create_accident_map 相同, 點略小)
+PANEL_STYLES = {
+    'A1': dict(c='red', s=12, alpha=0.7, zorder=3, edgecolors='darkred', linewidths=0.3),
+    'A2': dict(c='orange', s=3, alpha=0.4, zorder=2),
+}
+
+# 由 _init_worker() 設定的行程內共用底圖
+_BASEMAP = None
+_EXTENT = None
+
+
+def square_extent(bounds) -> tuple:
+    """
+    依邊界範圍計算含 5% 邊距的正方形地圖範圍
+
+    Args:
+        bounds (array-like): (min_lon, min_lat, max_lon, max_lat)
+
+    Returns:
+        tuple: (min_lon, max_lon, min_lat, max_lat)
+    """
+    lon_center = (bounds[0] + bounds[2]) / 2
+    lat_center = (bounds[1] + bounds[3]) / 2
+    max_range = max(bounds[2] - bounds[0], bounds[3] - bounds[1])
+    square_size = max_range * 1.1
+    return (
+        lon_center - square_size / 2,
+        lon_center + square_size / 2,
+        lat_center - square_size / 2,
+        lat_center + square_size / 2,
+    )
+
+
+def rasterize_boundary(gdf_boundary, extent, size_px: int = BASEMAP_SIZE_PX,
+                       edgecolor='gray') -> np.ndarray:
+    """
+    將村里界繪製一次並轉為 RGBA 點陣 (透明背景)
+
+    PlateCarree 下經緯度即平面座標, 直接以一般座標軸繪製即可與面板對齊。
+
+    Args:
+        gdf_boundary (GeoDataFrame): WGS84 村里界
+        extent (tuple): (min_lon, max_lon, min_lat, max_lat)
+        size_px (int): 點陣邊長 (像素)
+        edgecolor: 村里界線顏色; 'none' 時只有填色
+
+    Returns:
+        np.ndarray: (size_px, size_px, 4) uint8 影像
+    """
+    dpi = 100
+    fig = plt.figure(figsize=(size_px / dpi, size_px / dpi), dpi=dpi)
+    fig.patch.set_alpha(0)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    gdf_boundary.plot(
+        ax=ax,
+        facecolor='pink',
+        edgecolor=edgecolor,
+        linewidth=0.3,
+        alpha=0.3,
+        # 經緯度資料預設會設定 1/cos(緯度) 的長寬比而縮小座標軸, 點陣便無法對齊 extent
+        aspect=None
+    )
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    fig.canvas.draw()
+    image = np.asarray(fig.canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    return image
+
+
+def group_offsets(keys: pd.Series):
+    """
+    以排序索引分組: 同組的列在 order 中連續排列
+
+    Args:
+        keys (pd.Series): 分組鍵
+
+    Returns:
+        tuple: (組別標籤, 排序索引 order, 區段位移 offsets);
+            第 i 組的列為 order[offsets[i]:offsets[i+1]]
+    """
+    codes, labels = pd.factorize(keys, sort=True)
+    order = np.argsort(codes, kind='stable')
+    # 鍵缺值 (code = -1) 排在最前面, 不屬於任何組
+    offsets = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+    return labels, order, offsets
+
+
+def load_facet_data(by: str) -> pd.DataFrame:
+    """
+    讀取分面所需的欄位並加上分組鍵 facet
+
+    Args:
+        by (str): 'district' 或 'month'
+
+    Returns:
+        pd.DataFrame: longitude, latitude, case_type, facet
+    """
+    if by not in FACET_KEYS:
+        raise ValueError(f"Unknown facet key: {by!r} (expected one of {FACET_KEYS})")
+
+    columns = ['longitude', 'latitude', 'case_type']
+    columns.append('district' if by == 'district' else 'acc_dt')
+    df = read_processed_data(columns=columns)
+    if by == 'district':
+        df['facet'] = df['district']
+    else:
+        df['facet'] = df['acc_dt'].dt.month
+    return df[['longitude', 'latitude', 'case_type', 'facet']]
+
+
+def facet_title(by: str, label) -> str:
+    """面板標題"""
+    return f"{label}月" if by == 'month' else str(label)
+
+
+def _draw_panel(ax, basemap, extent, title, lon, lat, case_type, title_size=12):
+    """在一個 PlateCarree 座標軸上貼底圖並繪製點位"""
+    ax.set_aspect('equal')
+    ax.imshow(
+        basemap,
+        extent=extent,
+        origin='upper',
+        transform=ccrs.PlateCarree(),
+        interpolation='nearest',
+        zorder=1
+    )
+    counts = {}
+    for case, style in PANEL_STYLES.items():
+        mask = case_type == case
+        counts[case] = int(mask.sum())
+        ax.scatter(lon[mask], lat[mask], transform=ccrs.PlateCarree(), **style)
+    ax.set_extent(extent, crs=ccrs.PlateCarree())
+    ax.set_title(
+        f"{title} (A1 {counts['A1']} / A2 {counts['A2']})",
+        fontproperties=font_prop,
+        fontsize=title_size
+    )
+
+
+def _init_worker(basemap, extent):
+    """行程池初始化: 每個行程只接收一次底圖"""
+    global _BASEMAP, _EXTENT
+    _BASEMAP = basemap
+    _EXTENT = extent
+
+
+def _render_panel(task) -> str:
+    """在工作行程中輸出單一面板 PNG"""
+    title, lon, lat, case_type, output_path, dpi = task
+    fig = plt.figure(figsize=(6, 6))
+    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+    _draw_panel(ax, _BASEMAP, _EXTENT, title, lon, lat, case_type)
+    fig.savefig(output_path, dpi=dpi)
+    plt.close(fig)
+    return str(output_path)
+
+
+def create_facet_maps(by: str = 'district', grid: bool = True, panels: bool = True,
+                      workers: int = None, dpi: int = 200):
+    """
+    建立依行政區或月份分面的事故地圖
+
+    Args:
+        by (str): 分面欄位, 'district' 或 'month'
+        grid (bool): 是否輸出合併的格狀大圖
+        panels (bool): 是否平行輸出各面板的 PNG
+        workers (int): 行程數, None 時使用 CPU 數
+        dpi (int): 輸出解析度
+    """
+    print("\n" + "="*60)
+    print(f"建立分面事故地圖 (依 {by})")
+    print("="*60 + "\n")
+
+    try:
+        gdf_boundary = load_boundary_wgs84()
+        df = load_facet_data(by)
+    except FileNotFoundError as e:
+        print(f"✗ 讀取資料失敗: {e}")
+        print(f"  請確認 {PROCESSED_DATA_FILE} 存在 (例如先執行: python main.py)")
+        return
+
+    extent = square_extent(gdf_boundary.total_bounds)
+    basemap = rasterize_boundary(gdf_boundary, extent)
+    print(f"✓ 底圖點陣化完成 ({basemap.shape[1]}x{basemap.shape[0]} 像素)")
+
+    labels, order, offsets = group_offsets(df['facet'])
+    lon = df['longitude'].to_numpy()[order]
+    lat = df['latitude'].to_numpy()[order]
+    case_type = df['case_type'].to_numpy(dtype=object)[order]
+    print(f"✓ 分組完成: {len(labels)} 組, 共 {offsets[-1] - offsets[0]} 筆事故")
+
+    groups = [
+        (facet_title(by, label), slice(offsets[i], offsets[i + 1]))
+        for i, label in enumerate(labels)
+    ]
+
+    if panels:
+        panel_dir = FACETS_DIR / by
+        panel_dir.mkdir(parents=True, exist_ok=True)
+        tasks = [
+            (title, lon[rows], lat[rows], case_type[rows],
+             panel_dir / f"{by}_{label}.png", dpi)
+            for (title, rows), label in zip(groups, labels)
+        ]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(basemap, extent)) as pool:
+            for path in pool.map(_render_panel, tasks):
+                print(f"  ✓ {Path(path).name}")
+        print(f"✓ 已輸出 {len(tasks)} 張面板至: {panel_dir}")
+
+    if grid:
+        ncols = int(np.ceil(np.sqrt(len(groups))))
+        nrows = int(np.ceil(len(groups) / ncols))
+        fig = plt.figure(figsize=(4.5 * ncols, 4.8 * nrows))
+        for i, (title, rows) in enumerate(groups):
+            ax = fig.add_subplot(nrows, ncols, i + 1, projection=ccrs.PlateCarree())
+            _draw_panel(ax, basemap, extent, title, lon[rows], lat[rows],
+                        case_type[rows], title_size=11)
+        fig.suptitle(
+            '113年台北市交通事故分布 (' + ('行政區' if by == 'district' else '月份') + ')',
+            fontproperties=font_prop,
+            fontsize=18
+        )
+        FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = FIGURES_DIR / f'taipei_facets_{by}.png'
+        fig.tight_layout()
+        fig.savefig(output_path, dpi=dpi)
+        plt.close(fig)
+        print(f"\n✓ 分面地圖已儲存至: {output_path}")
+        print(f"  - 面板數: {len(groups)} ({nrows}x{ncols})")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="台北市交通事故分面地圖")
+    parser.add_argument('--by', choices=FACET_KEYS, default='district', help="分面欄位")
+    parser.add_argument('--no-grid', action='store_true', help="不輸出合併大圖")
+    parser.add_argument('--no-panels', action='store_true', help="不輸出個別面板")
+    parser.add_argument('--workers', type=int, default=None, help="平行行程數")
+    args = parser.parse_args()
+
+    create_facet_maps(by=args.by, grid=not args.no_grid, panels=not args.no_panels,
+                      workers=args.workers)
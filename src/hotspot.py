@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+交通事故熱點偵測模組
+將經緯度投影至 TWD97 TM2 (公尺) 後建立 KD-tree,
+以半徑式 DBSCAN 找出 A1/A2 事故反覆發生的路口或路段
+"""
+
+import sys
+from itertools import chain
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+from src.crs import get_transformer
+from src.store import read_processed_data
+from src.config import (
+    PROCESSED_DATA_FILE, HOTSPOTS_FILE, WGS84_EPSG, TWD97_EPSG,
+    HOTSPOT_RADIUS_M, HOTSPOT_MIN_SAMPLES, HOTSPOT_CHUNK_SIZE
+)
+
+# 不屬於任何熱點的事故標記
+NOISE = -1
+
+
+def project_to_twd97(lon, lat) -> np.ndarray:
+    """
+    將 WGS84 經緯度投影為 TWD97 TM2 平面座標
+
+    Args:
+        lon (array-like): 經度
+        lat (array-like): 緯度
+
+    Returns:
+        np.ndarray: (n, 2) 的 x/y 座標 (公尺)
+    """
+    transformer = get_transformer(WGS84_EPSG, TWD97_EPSG)
+    x, y = transformer.transform(
+        np.asarray(lon, dtype=np.float64),
+        np.asarray(lat, dtype=np.float64)
+    )
+    return np.column_stack([x, y])
+
+
+def _count_neighbours(tree: cKDTree, xy: np.ndarray, radius: float,
+                      chunk_size: int) -> np.ndarray:
+    """分批計算每個點半徑內的點數 (含自身), 只保留計數不保留鄰居清單"""
+    counts = np.empty(len(xy), dtype=np.int64)
+    for start in range(0, len(xy), chunk_size):
+        stop = start + chunk_size
+        counts[start:stop] = tree.query_ball_point(
+            xy[start:stop], r=radius, return_length=True
+        )
+    return counts
+
+
+def _connect_core_points(tree: cKDTree, core_xy: np.ndarray, radius: float,
+                         chunk_size: int) -> np.ndarray:
+    """
+    將彼此在半徑內的核心點合併為同一群
+
+    每批只展開該批的鄰居邊, 以目前的群代表重新編號後交給
+    connected_components 合併, 記憶體上限與批次大小成正比。
+    """
+    n_core = len(core_xy)
+    labels = np.arange(n_core)
+
+    for start in range(0, n_core, chunk_size):
+        neighbours = tree.query_ball_point(core_xy[start:start + chunk_size], r=radius)
+        lengths = np.fromiter(map(len, neighbours), dtype=np.int64, count=len(neighbours))
+        rows = np.repeat(np.arange(start, start + len(neighbours)), lengths)
+        cols = np.fromiter(chain.from_iterable(neighbours), dtype=np.int64,
+                           count=int(lengths.sum()))
+
+        # 以群代表表示邊, 已在同一群的邊可略過
+        src, dst = labels[rows], labels[cols]
+        keep = src != dst
+        if not keep.any():
+            continue
+
+        graph = coo_matrix(
+            (np.ones(int(keep.sum()), dtype=np.int8), (src[keep], dst[keep])),
+            shape=(n_core, n_core)
+        )
+        _, components = connected_components(graph, directed=False)
+        labels = components[labels]
+
+    # 重新編號為 0..k-1
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+
+def label_hotspots(xy: np.ndarray,
+                   radius: float = HOTSPOT_RADIUS_M,
+                   min_samples: int = HOTSPOT_MIN_SAMPLES,
+                   chunk_size: int = HOTSPOT_CHUNK_SIZE) -> np.ndarray:
+    """
+    半徑式 DBSCAN 分群
+
+    處理步驟:
+    1. 建立 KD-tree, 分批計算鄰居數找出核心點
+    2. 分批合併彼此相鄰的核心點
+    3. 非核心點若在某核心點半徑內, 歸入最近核心點的群
+
+    Args:
+        xy (np.ndarray): (n, 2) 平面座標 (公尺)
+        radius (float): 鄰近半徑 (公尺)
+        min_samples (int): 核心點所需的最少點數 (含自身)
+        chunk_size (int): 每批查詢的點數
+
+    Returns:
+        np.ndarray: 每個點的群編號, 不屬於任何群者為 NOISE (-1)
+    """
+    labels = np.full(len(xy), NOISE, dtype=np.int64)
+    if len(xy) == 0:
+        return labels
+
+    tree = cKDTree(xy)
+    is_core = _count_neighbours(tree, xy, radius, chunk_size) >= min_samples
+    core_idx = np.flatnonzero(is_core)
+    if len(core_idx) == 0:
+        return labels
+
+    core_xy = xy[core_idx]
+    core_tree = cKDTree(core_xy)
+    core_labels = _connect_core_points(core_tree, core_xy, radius, chunk_size)
+    labels[core_idx] = core_labels
+
+    # 邊界點: 歸入半徑內最近的核心點
+    border_idx = np.flatnonzero(~is_core)
+    for start in range(0, len(border_idx), chunk_size):
+        idx = border_idx[start:start + chunk_size]
+        _, nearest = core_tree.query(xy[idx], k=1, distance_upper_bound=radius)
+        found = nearest < len(core_idx)
+        labels[idx[found]] = core_labels[nearest[found]]
+
+    return labels
+
+
+def summarize_hotspots(df: pd.DataFrame, xy: np.ndarray,
+                       labels: np.ndarray) -> pd.DataFrame:
+    """
+    彙總各熱點的事故數、A1/A2 分類數與中心位置, 並依事故數排名
+
+    Args:
+        df (pd.DataFrame): 事故資料 (需含 case_type)
+        xy (np.ndarray): (n, 2) 平面座標 (公尺)
+        labels (np.ndarray): label_hotspots() 的分群結果
+
+    Returns:
+        pd.DataFrame: 排名後的熱點表
+    """
+    columns = ['rank', 'n_accidents', 'A1', 'A2',
+               'longitude', 'latitude', 'x', 'y', 'spread_m']
+    clustered = labels != NOISE
+    if not clustered.any():
+        return pd.DataFrame(columns=columns)
+
+    lab = labels[clustered]
+    pts = xy[clustered]
+    case_type = df['case_type'].to_numpy()[clustered]
+    n_clusters = int(lab.max()) + 1
+
+    # 以 bincount 一次彙總所有群
+    n = np.bincount(lab, minlength=n_clusters)
+    cx = np.bincount(lab, weights=pts[:, 0], minlength=n_clusters) / n
+    cy = np.bincount(lab, weights=pts[:, 1], minlength=n_clusters) / n
+    sq = np.bincount(
+        lab,
+        weights=(pts[:, 0] - cx[lab]) ** 2 + (pts[:, 1] - cy[lab]) ** 2,
+        minlength=n_clusters
+    )
+    a1 = np.bincount(lab, weights=(case_type == 'A1'), minlength=n_clusters)
+    a2 = np.bincount(lab, weights=(case_type == 'A2'), minlength=n_clusters)
+
+    lon, lat = get_transformer(TWD97_EPSG, WGS84_EPSG).transform(cx, cy)
+
+    hotspots = pd.DataFrame({
+        'n_accidents': n,
+        'A1': a1.astype(np.int64),
+        'A2': a2.astype(np.int64),
+        'longitude': lon,
+        'latitude': lat,
+        'x': cx,
+        'y': cy,
+        'spread_m': np.sqrt(sq / n),  # 與中心的均方根距離
+    })
+    hotspots = hotspots.sort_values(
+        ['n_accidents', 'A1'], ascending=False, ignore_index=True
+    )
+    hotspots.insert(0, 'rank', np.arange(1, len(hotspots) + 1))
+    return hotspots[columns]
+
+
+def detect_hotspots(df: pd.DataFrame,
+                    radius: float = HOTSPOT_RADIUS_M,
+                    min_samples: int = HOTSPOT_MIN_SAMPLES,
+                    chunk_size: int = HOTSPOT_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    偵測事故熱點
+
+    Args:
+        df (pd.DataFrame): 處理後的事故資料 (longitude, latitude, case_type)
+        radius (float): 鄰近半徑 (公尺)
+        min_samples (int): 核心點所需的最少點數 (含自身)
+        chunk_size (int): 每批查詢的點數
+
+    Returns:
+        pd.DataFrame: 依事故數排名的熱點表
+    """
+    df = df.dropna(subset=['longitude', 'latitude'])
+    xy = project_to_twd97(df['longitude'].to_numpy(), df['latitude'].to_numpy())
+    labels = label_hotspots(xy, radius, min_samples, chunk_size)
+    return summarize_hotspots(df, xy, labels)
+
+
+def main():
+    """偵測熱點並輸出排名表"""
+    try:
+        df = read_processed_data(columns=['longitude', 'latitude', 'case_type'])
+    except FileNotFoundError:
+        print(f"錯誤：找不到處理後的資料檔案於 {PROCESSED_DATA_FILE}")
+        print("請先執行 ETL 流程 (例如: python main.py)")
+        return
+
+    print(f"開始偵測事故熱點 (半徑 {HOTSPOT_RADIUS_M:g} 公尺, 至少 {HOTSPOT_MIN_SAMPLES} 筆)...")
+
+    hotspots = detect_hotspots(df)
+    HOTSPOTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    hotspots.to_csv(HOTSPOTS_FILE, index=False)
+
+    print(f"✓ 找到 {len(hotspots)} 個熱點, 共 {hotspots['n_accidents'].sum()} 筆事故")
+    print(hotspots.head(10).to_string(index=False))
+    print(f"熱點排名已儲存至: {HOTSPOTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,23 @@
 Module for ingesting raw data.
 """
 import pandas as pd
+from pathlib import Path
 from src.config import RAW_DATA_FILE
 
-def load_raw_data() -> pd.DataFrame:
+def load_raw_data(path: Path = RAW_DATA_FILE) -> pd.DataFrame:
     """
     Load raw data from the CSV file.
     
+    Args:
+        path (Path): CSV file to load. Defaults to the full-year raw file;
+            append mode passes a delta CSV with the same columns.
+    
     Returns:
         pd.DataFrame: The raw data.
     """
-    if not RAW_DATA_FILE.exists():
-        raise FileNotFoundError(f"Raw data file not found at: {RAW_DATA_FILE}")
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Raw data file not found at: {path}")
     
     # 加上 encoding='utf-8' 來確保能正確讀取中文內容
-    return pd.read_csv(RAW_DATA_FILE, encoding='utf-8')
+    return pd.read_csv(path, encoding='utf-8')
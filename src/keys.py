@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+事故鍵模組
+以 splitmix64 對正規化後的欄位做向量化雜湊, 產生穩定的 64 位元鍵:
+
+- accident_key: 事故時間 (UTC, 取到分鐘) + 量化座標; 同一事故的各當事人共用
+- party_key: accident_key + 當事人序號; 用來判斷重複的原始紀錄
+
+雜湊只依賴整數運算, 不受 pandas 版本或浮點數尾差影響。
+鍵以排序陣列保存, 去重、附加與當事人 ↔ 事故的對應都以 searchsorted 完成。
+"""
+import numpy as np
+import pandas as pd
+from src.config import ACCIDENT_KEY_DECIMALS
+
+# splitmix64 常數
+_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def splitmix64(x: np.ndarray) -> np.ndarray:
+    """對 uint64 陣列套用 splitmix64 混合函數 (溢位即為 mod 2^64)"""
+    z = np.asarray(x, dtype=np.int64).view(np.uint64) + _GAMMA
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+def hash_components(*components: np.ndarray) -> np.ndarray:
+    """依序將多個 int64 欄位混入同一個 64 位元雜湊"""
+    h = np.zeros(len(components[0]), dtype=np.uint64)
+    for component in components:
+        h = splitmix64(h ^ np.asarray(component, dtype=np.int64).view(np.uint64))
+    return h
+
+
+def accident_keys(df: pd.DataFrame, decimals: int = ACCIDENT_KEY_DECIMALS) -> np.ndarray:
+    """
+    計算事故鍵
+
+    Args:
+        df (pd.DataFrame): 需含 acc_dt (有時區), longitude, latitude
+        decimals (int): 座標量化的小數位數
+
+    Returns:
+        np.ndarray: uint64 事故鍵
+    """
+    minute = (df['acc_dt'].dt.tz_convert('UTC').dt.tz_localize(None)
+                          .to_numpy().astype('datetime64[m]').view(np.int64))
+    scale = 10 ** decimals
+    lon = np.round(df['longitude'].to_numpy(dtype=np.float64) * scale).astype(np.int64)
+    lat = np.round(df['latitude'].to_numpy(dtype=np.float64) * scale).astype(np.int64)
+    return hash_components(minute, lon, lat)
+
+
+def party_keys(df: pd.DataFrame, keys: np.ndarray = None) -> np.ndarray:
+    """
+    計算當事人鍵 (事故鍵 + 當事人序號; 沒有序號欄位時視為 0)
+
+    Args:
+        df (pd.DataFrame): 事故資料
+        keys (np.ndarray, optional): 已算好的事故鍵
+
+    Returns:
+        np.ndarray: uint64 當事人鍵
+    """
+    if keys is None:
+        keys = accident_keys(df)
+    if 'party_seq' in df.columns:
+        seq = pd.to_numeric(df['party_seq'], errors='coerce').fillna(0).to_numpy(dtype=np.int64)
+    else:
+        seq = np.zeros(len(df), dtype=np.int64)
+    return hash_components(keys.view(np.int64), seq)
+
+
+def first_per_key(keys: np.ndarray) -> np.ndarray:
+    """每個鍵只保留第一次出現的列 (布林遮罩)"""
+    return ~pd.Index(keys).duplicated(keep='first')
+
+
+def lookup(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    在排序後的鍵中二分搜尋
+
+    Args:
+        sorted_keys (np.ndarray): 排序後的 uint64 鍵
+        keys (np.ndarray): 要查詢的鍵
+
+    Returns:
+        np.ndarray: 每個查詢鍵在 sorted_keys 中的位置, 找不到為 -1
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    if len(sorted_keys) == 0:
+        return np.full(len(keys), -1, dtype=np.int64)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos_clipped = np.minimum(pos, len(sorted_keys) - 1)
+    found = np.asarray(sorted_keys)[pos_clipped] == keys
+    return np.where(found, pos_clipped, -1).astype(np.int64)
+
+
+def join_accidents(parties: pd.DataFrame, accidents: pd.DataFrame,
+                   columns: list = None) -> pd.DataFrame:
+    """
+    將事故層級的欄位對應到當事人層級的資料 (以 accident_key 排序後二分搜尋)
+
+    Args:
+        parties (pd.DataFrame): 當事人資料 (需含 accident_key)
+        accidents (pd.DataFrame): 事故資料 (需含 accident_key, 每個鍵一列)
+        columns (list, optional): 要帶入的事故欄位, 預設為 accident_key 以外的所有欄位
+
+    Returns:
+        pd.DataFrame: 加上事故欄位的當事人資料; 找不到對應事故者為缺值
+    """
+    if columns is None:
+        columns = [col for col in accidents.columns if col != 'accident_key']
+    acc_keys = accidents['accident_key'].to_numpy(dtype=np.uint64)
+    order = np.argsort(acc_keys, kind='stable')
+    pos = lookup(acc_keys[order], parties['accident_key'].to_numpy(dtype=np.uint64))
+    found = pos >= 0
+
+    result = parties.copy()
+    if len(accidents) == 0:
+        for col in columns:
+            result[col] = np.nan
+        return result
+    matched = accidents[columns].iloc[order[np.where(found, pos, 0)]]
+    matched = matched.set_axis(parties.index).mask(pd.Series(~found, index=parties.index), axis=0)
+    for col in columns:
+        result[col] = matched[col]
+    return result
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+動畫管線模組
+將縮時動畫拆成三個以有上限佇列串接的階段:
+
+    prepare (生產者執行緒) → draw (主執行緒) → sink-* (編碼器執行緒)
+
+- prepare: 預先計算後續影格的座標陣列與標題字串
+- draw: 只負責更新圖層與 canvas.draw()
+- sink-*: 將影格寫入 ffmpeg (見 export.FFmpegSink)
+
+每個階段以 StageMetrics 記錄忙碌時間、等待上游 (starved)、
+等待下游 (blocked) 與輸入佇列深度, 用來判斷瓶頸所在。
+"""
+import queue
+import threading
+import time
+
+# 生產者預先準備的影格數上限
+PREFETCH_SIZE = 16
+
+
+class StageMetrics:
+    """
+    單一管線階段的計時與佇列深度統計
+
+    Args:
+        name (str): 階段名稱
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        """清除統計"""
+        self.items = 0
+        self.busy = 0.0      # 實際工作時間 (秒)
+        self.starved = 0.0   # 等待上游輸入的時間 (秒)
+        self.blocked = 0.0   # 等待下游佇列空位的時間 (秒)
+        self._depth_sum = 0
+        self.depth_max = 0
+
+    def sample_depth(self, q: queue.Queue):
+        """記錄取出前的輸入佇列深度"""
+        depth = q.qsize()
+        self._depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    @property
+    def depth_mean(self) -> float:
+        """平均輸入佇列深度"""
+        return self._depth_sum / self.items if self.items else 0.0
+
+    def get(self, q: queue.Queue):
+        """從輸入佇列取出一項並記錄等待時間與深度"""
+        self.sample_depth(q)
+        start = time.perf_counter()
+        item = q.get()
+        self.starved += time.perf_counter() - start
+        return item
+
+    def put(self, q: queue.Queue, item):
+        """放入輸出佇列並記錄因佇列已滿而等待的時間"""
+        start = time.perf_counter()
+        q.put(item)
+        self.blocked += time.perf_counter() - start
+
+    def as_dict(self) -> dict:
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'busy_s': round(self.busy, 3),
+            'starved_s': round(self.starved, 3),
+            'blocked_s': round(self.blocked, 3),
+            'depth_mean': round(self.depth_mean, 2),
+            'depth_max': self.depth_max,
+        }
+
+
+class _ProducerError:
+    """包裝生產者執行緒中的例外, 交由消費端重新拋出"""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_DONE = object()
+
+
+class FramePrefetcher:
+    """
+    在背景執行緒依序呼叫 prepare(frame), 以有上限的佇列交給主執行緒
+
+    可直接作為 FuncAnimation 的 frames (需搭配 repeat=False 與
+    cache_frame_data=False): 每次迭代都會啟動新的生產者執行緒
+    (Animation.save() 會重新取得影格序列), 迭代提前結束時生產者也會停止,
+    已繪製的影格不會被保留。repeat=True 時 matplotlib 以 itertools.tee
+    包裝 frames, 只會迭代一次, 且所有影格會留在記憶體中。
+
+    Args:
+        prepare (callable): prepare(frame) → 該幀的資料; 依 0..n_frames-1 順序呼叫
+        n_frames (int): 總幀數
+        maxsize (int): 預先準備的影格數上限
+        consumer_metrics (StageMetrics, optional): 主執行緒 (消費端) 的統計
+    """
+
+    def __init__(self, prepare, n_frames: int, maxsize: int = PREFETCH_SIZE,
+                 consumer_metrics: StageMetrics = None):
+        self.prepare = prepare
+        self.n_frames = n_frames
+        self.maxsize = maxsize
+        self.metrics = StageMetrics('prepare')
+        self.consumer_metrics = consumer_metrics or StageMetrics('draw')
+
+    def __len__(self):
+        return self.n_frames
+
+    def _produce(self, q: queue.Queue, stop: threading.Event):
+        metrics = self.metrics
+        try:
+            for frame in range(self.n_frames):
+                start = time.perf_counter()
+                item = self.prepare(frame)
+                metrics.busy += time.perf_counter() - start
+                metrics.items += 1
+                # 佇列已滿時分段等待, 以便消費端結束時能停止
+                start = time.perf_counter()
+                while not stop.is_set():
+                    try:
+                        q.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                metrics.blocked += time.perf_counter() - start
+                if stop.is_set():
+                    return
+            q.put(_DONE)
+        except BaseException as e:
+            q.put(_ProducerError(e))
+
+    def __iter__(self):
+        # 生成器: 第一次取值時才啟動執行緒
+        q = queue.Queue(maxsize=self.maxsize)
+        stop = threading.Event()
+        self.metrics.reset()
+        self.consumer_metrics.reset()
+        thread = threading.Thread(target=self._produce, args=(q, stop),
+                                  name='frame-prefetch', daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = self.consumer_metrics.get(q)
+                if item is _DONE:
+                    return
+                if isinstance(item, _ProducerError):
+                    raise item.exc
+                yield item
+        finally:
+            stop.set()
+            # 清空佇列讓生產者不會卡在 put()
+            while thread.is_alive():
+                try:
+                    q.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+
+def print_stage_metrics(stages, wall_time: float = None):
+    """
+    列印各階段統計並指出瓶頸 (忙碌時間最長的階段)
+
+    Args:
+        stages (iterable): StageMetrics 物件
+        wall_time (float, optional): 整體耗時 (秒)
+    """
+    stages = list(stages)
+    if not stages:
+        return
+    print("\n  管線各階段統計:")
+    print(f"  {'階段':<14}{'幀數':>6}{'忙碌(s)':>10}{'等上游(s)':>11}"
+          f"{'等下游(s)':>11}{'佇列平均':>9}{'佇列最大':>9}")
+    for m in stages:
+        print(f"  {m.name:<14}{m.items:>6}{m.busy:>10.2f}{m.starved:>11.2f}"
+              f"{m.blocked:>11.2f}{m.depth_mean:>9.1f}{m.depth_max:>9}")
+    bottleneck = max(stages, key=lambda m: m.busy)
+    print(f"  瓶頸階段: {bottleneck.name} (忙碌 {bottleneck.busy:.2f} 秒)")
+    if wall_time is not None:
+        print(f"  總耗時: {wall_time:.2f} 秒")
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+"""
+輸出回歸測試模組
+以固定亂數種子產生合成原始資料, 在獨立的工作目錄中執行完整管線:
+
+    main.py (ETL) → src.viz_map (事故分布地圖) → src.animate (縮時動畫)
+
+再與先前以 --update 產生的 golden 比對:
+
+- 處理後的 Parquet: 欄位/型別一致, 且逐列雜湊 (浮點數先取到固定小數位) 的集合相同
+- 地圖 PNG 與抽樣的動畫影格: 逐像素比對, 不同像素的比例需在容許範圍內
+
+每個階段以子行程執行, 記錄耗時與最大常駐記憶體, 並與 golden 產生時的數據並列,
+效能改動可同時證明「更快」與「輸出相同」。golden 與工作目錄位於
+outputs/regression/, 不納入版本控制。
+
+用法:
+    python -m src.regression --update   # 以目前的程式碼產生 golden
+    python -m src.regression            # 與 golden 比對 (不一致時結束代碼為 1)
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import matplotlib.image as mpimg
+from src.config import (
+    BASE_DIR, RAW_DATA_FILE, PROCESSED_DATA_FILE, COORD_STORE_DIR, FIGURES_DIR, VIDEOS_DIR,
+    BOUNDARY_SHAPEFILE, REGRESSION_DIR, REGRESSION_ROWS, REGRESSION_DAYS, REGRESSION_SEED,
+    REGRESSION_FLOAT_DECIMALS, REGRESSION_PIXEL_THRESHOLD, REGRESSION_PIXEL_TOLERANCE,
+    REGRESSION_VIDEO_FRAMES, DISTRICT_MAP
+)
+
+GOLDEN_DIR = REGRESSION_DIR / "golden"
+WORKSPACE_DIR = REGRESSION_DIR / "workspace"
+RESULTS_FILE = REGRESSION_DIR / "results.json"
+HISTORY_FILE = REGRESSION_DIR / "history.jsonl"
+
+# 各階段的指令 (於工作目錄中執行) 與要比對的圖片
+STAGES = {
+    'etl': ['main.py'],
+    'map': ['-m', 'src.viz_map'],
+    'video': ['-m', 'src.animate'],
+}
+MAP_FILE = FIGURES_DIR / 'taipei_accident_map.png'
+VIDEO_FILE = VIDEOS_DIR / 'taipei_timelapse.mp4'
+
+# 合成資料的車種與天候代碼 (與原始資料相同的編碼)
+VEHICLE_TYPES = ['B01', 'B03', 'C03', 'C01', 'A01', 'F01', 'H01']
+VEHICLE_WEIGHTS = [0.25, 0.1, 0.45, 0.05, 0.05, 0.05, 0.05]
+WEATHER_CODES = [8, 7, 6, 1]
+WEATHER_WEIGHTS = [0.55, 0.25, 0.17, 0.03]
+
+
+def _workspace_path(path: Path, workspace: Path) -> Path:
+    """將專案內的路徑 (config) 對應到工作目錄中的相同位置"""
+    return workspace / Path(path).relative_to(BASE_DIR)
+
+
+def make_synthetic_raw(n_rows: int = REGRESSION_ROWS, n_days: int = REGRESSION_DAYS,
+                       seed: int = REGRESSION_SEED) -> pd.DataFrame:
+    """
+    產生與原始 CSV 相同欄位的合成事故資料
+
+    座標在村里界內以 TWD97 TM2 (公尺) 均勻抽樣, 行政區依所在村里決定;
+    另外加入多當事人事故與少量應被驗證剔除的資料 (缺座標、分鐘超出範圍、完全重複)。
+
+    Args:
+        n_rows (int): 事故數
+        n_days (int): 天數 (自 113 年 1 月 1 日起)
+        seed (int): 亂數種子
+
+    Returns:
+        pd.DataFrame: 依發生時間排序的原始資料
+    """
+    rng = np.random.default_rng(seed)
+    villages = gpd.read_file(BOUNDARY_SHAPEFILE)
+    min_x, min_y, max_x, max_y = villages.total_bounds
+
+    # 在外框內超額抽樣, 保留落在村里內的前 n_rows 點
+    n_draw = n_rows * 4
+    xy = np.column_stack([rng.uniform(min_x, max_x, n_draw), rng.uniform(min_y, max_y, n_draw)])
+    tree = shapely.STRtree(shapely.points(xy))
+    poly_idx, pt_idx = tree.query(villages.geometry.to_numpy(), predicate='contains')
+    village_of = np.full(n_draw, -1, dtype=np.int64)
+    village_of[pt_idx] = poly_idx
+    inside = np.flatnonzero(village_of >= 0)[:n_rows]
+    if len(inside) < n_rows:
+        raise ValueError(f"Only {len(inside)} of {n_draw} sampled points fell inside the boundary")
+
+    district_codes = {name: code for code, name in DISTRICT_MAP.items()}
+    day = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, n_days, n_rows), unit='D')
+    raw = pd.DataFrame({
+        '發生年度': day.year - 1911,
+        '發生月': day.month,
+        '發生日': day.day,
+        '發生時-Hours': rng.integers(0, 24, n_rows),
+        '發生分': rng.integers(0, 60, n_rows),
+        '處理別-編號': np.where(rng.random(n_rows) < 0.02, 1, 2),
+        '區序': villages['TNAME'].to_numpy()[village_of[inside]],
+        '當事人序號': 1,
+        '車種': rng.choice(VEHICLE_TYPES, n_rows, p=VEHICLE_WEIGHTS),
+        '天候': rng.choice(WEATHER_CODES, n_rows, p=WEATHER_WEIGHTS),
+        '道路照明設備': rng.choice([5, 6, 7], n_rows, p=[0.6, 0.35, 0.05]),
+        '座標-X': xy[inside, 0],
+        '座標-Y': xy[inside, 1],
+    })
+    raw['區序'] = raw['區序'].map(district_codes)
+
+    # 約兩成事故有第二位當事人 (同一事故鍵, 不同車種)
+    second = raw.sample(frac=0.2, random_state=seed).assign(**{'當事人序號': 2})
+    second['車種'] = rng.choice(VEHICLE_TYPES, len(second), p=VEHICLE_WEIGHTS)
+
+    # 應被剔除的資料
+    bad = raw.sample(30, random_state=seed + 1).copy()
+    bad.iloc[:10, bad.columns.get_loc('座標-X')] = np.nan
+    bad.iloc[10:20, bad.columns.get_loc('發生分')] = 75
+    duplicates = raw.sample(10, random_state=seed + 2)
+
+    raw = pd.concat([raw, second, bad, duplicates], ignore_index=True)
+    return raw.sort_values(['發生年度', '發生月', '發生日', '發生時-Hours', '發生分', '當事人序號'],
+                           kind='stable', ignore_index=True)
+
+
+def prepare_workspace(raw: pd.DataFrame, workspace: Path = WORKSPACE_DIR) -> Path:
+    """
+    建立乾淨的工作目錄 (程式碼、村里界與合成原始資料), 不影響專案本身的資料
+
+    Args:
+        raw (pd.DataFrame): 合成原始資料
+        workspace (Path): 工作目錄
+
+    Returns:
+        Path: 工作目錄
+    """
+    if workspace.exists():
+        shutil.rmtree(workspace)
+    workspace.mkdir(parents=True)
+    shutil.copytree(BASE_DIR / 'src', workspace / 'src',
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    shutil.copy2(BASE_DIR / 'main.py', workspace / 'main.py')
+    shutil.copytree(BOUNDARY_SHAPEFILE.parent, _workspace_path(BOUNDARY_SHAPEFILE.parent, workspace))
+
+    raw_file = _workspace_path(RAW_DATA_FILE, workspace)
+    raw_file.parent.mkdir(parents=True, exist_ok=True)
+    raw.to_csv(raw_file, index=False, encoding='utf-8')
+    return workspace
+
+
+def run_stage(name: str, workspace: Path = WORKSPACE_DIR) -> dict:
+    """
+    以子行程執行一個階段, 記錄耗時與最大常駐記憶體 (輸出寫入 logs/<name>.log)
+
+    Args:
+        name (str): STAGES 中的階段名稱
+        workspace (Path): 工作目錄
+
+    Returns:
+        dict: stage, returncode, seconds, peak_rss_mb, log
+    """
+    log_file = workspace / 'logs' / f'{name}.log'
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONHASHSEED='0')
+
+    start = time.perf_counter()
+    with open(log_file, 'w', encoding='utf-8') as log:
+        proc = subprocess.Popen([sys.executable, *STAGES[name]], cwd=workspace, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+        # wait4 取得該子行程自己的資源用量 (ru_maxrss 在 Linux 為 KB)
+        _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    return {
+        'stage': name,
+        'returncode': proc.returncode,
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'log': str(log_file),
+    }
+
+
+def row_hashes(df: pd.DataFrame, decimals: int = REGRESSION_FLOAT_DECIMALS) -> np.ndarray:
+    """
+    計算每一列的 64 位元雜湊 (排序後回傳, 與列順序無關)
+
+    浮點數欄位先四捨五入到 decimals 位, 向量化改寫造成的最後一位元差異不會誤判。
+
+    Args:
+        df (pd.DataFrame): 處理後的資料
+        decimals (int): 浮點數欄位的小數位數
+
+    Returns:
+        np.ndarray: 排序後的 uint64 雜湊
+    """
+    df = df.copy()
+    floats = df.select_dtypes(include='floating').columns
+    df[floats] = df[floats].round(decimals)
+    return np.sort(pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64))
+
+
+def table_summary(df: pd.DataFrame) -> dict:
+    """處理後資料的結構摘要 (欄位、型別、筆數)"""
+    return {
+        'rows': len(df),
+        'columns': list(df.columns),
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+    }
+
+
+def compare_table(summary: dict, hashes: np.ndarray, golden_summary: dict,
+                  golden_hashes: np.ndarray) -> dict:
+    """
+    比對處理後資料的結構與列雜湊
+
+    Returns:
+        dict: passed, rows, golden_rows, missing (golden 有而目前沒有), extra, schema
+    """
+    schema_ok = (summary['columns'] == golden_summary['columns']
+                 and summary['dtypes'] == golden_summary['dtypes'])
+    golden_keys, golden_counts = np.unique(golden_hashes, return_counts=True)
+    keys, counts = np.unique(hashes, return_counts=True)
+    all_keys = np.union1d(golden_keys, keys)
+    golden_n = np.zeros(len(all_keys), dtype=np.int64)
+    golden_n[np.searchsorted(all_keys, golden_keys)] = golden_counts
+    n = np.zeros(len(all_keys), dtype=np.int64)
+    n[np.searchsorted(all_keys, keys)] = counts
+    missing = int(np.maximum(golden_n - n, 0).sum())
+    extra = int(np.maximum(n - golden_n, 0).sum())
+    return {
+        'passed': bool(schema_ok and missing == 0 and extra == 0),
+        'rows': summary['rows'],
+        'golden_rows': golden_summary['rows'],
+        'missing': missing,
+        'extra': extra,
+        'schema': 'ok' if schema_ok else 'changed',
+    }
+
+
+def read_image(path: Path) -> np.ndarray:
+    """讀取 PNG 為 0-255 的 RGB 整數陣列"""
+    image = mpimg.imread(path)
+    if image.dtype != np.uint8:
+        image = np.round(image * 255)
+    return np.asarray(image[..., :3], dtype=np.int16)
+
+
+def image_diff(candidate: Path, golden: Path,
+               threshold: int = REGRESSION_PIXEL_THRESHOLD,
+               tolerance: float = REGRESSION_PIXEL_TOLERANCE,
+               diff_file: Path = None) -> dict:
+    """
+    逐像素比對兩張圖片
+
+    任一色版差異超過 threshold 的像素視為不同; 不同像素比例不超過 tolerance
+    且尺寸相同才算通過。未通過時可輸出不同像素的遮罩圖。
+
+    Args:
+        candidate (Path): 本次輸出的圖片
+        golden (Path): golden 圖片
+        threshold (int): 像素差異門檻 (0-255)
+        tolerance (float): 允許的不同像素比例
+        diff_file (Path, optional): 不同像素遮罩圖的輸出路徑
+
+    Returns:
+        dict: passed, shape, golden_shape, changed_frac, mean_abs, max_abs
+    """
+    if not Path(candidate).exists():
+        return {'passed': False, 'error': f'missing {candidate}'}
+    a, b = read_image(candidate), read_image(golden)
+    if a.shape != b.shape:
+        return {'passed': False, 'shape': list(a.shape), 'golden_shape': list(b.shape)}
+
+    diff = np.abs(a - b)
+    changed = diff.max(axis=2) > threshold
+    changed_frac = float(changed.mean())
+    passed = changed_frac <= tolerance
+    if not passed and diff_file is not None:
+        diff_file.parent.mkdir(parents=True, exist_ok=True)
+        mpimg.imsave(diff_file, changed, cmap='gray')
+    return {
+        'passed': bool(passed),
+        'shape': list(a.shape),
+        'changed_frac': round(changed_frac, 6),
+        'mean_abs': round(float(diff.mean()), 4),
+        'max_abs': int(diff.max()),
+    }
+
+
+def sample_frame_indices(n_frames: int, n_samples: int = REGRESSION_VIDEO_FRAMES) -> list:
+    """平均抽樣的幀號 (含第一幀與最後一幀)"""
+    return sorted(set(np.linspace(0, n_frames - 1, n_samples).round().astype(int).tolist()))
+
+
+def extract_frames(video: Path, frames: list, output_dir: Path) -> dict:
+    """
+    以 ffmpeg 解碼指定幀並存成 PNG
+
+    Args:
+        video (Path): 影片檔
+        frames (list): 幀號 (由 0 起算, 遞增)
+        output_dir (Path): 輸出目錄
+
+    Returns:
+        dict: 幀號 → PNG 路徑
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for old in output_dir.glob('frame_*.png'):
+        old.unlink()
+    select = '+'.join(f'eq(n\\,{i})' for i in frames)
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-y', '-i', str(video), '-vf', f"select='{select}'",
+         '-fps_mode', 'passthrough', str(output_dir / 'tmp_%04d.png')],
+        check=True
+    )
+    paths = {}
+    for k, frame in enumerate(frames):
+        path = output_dir / f'frame_{frame:04d}.png'
+        (output_dir / f'tmp_{k + 1:04d}.png').rename(path)
+        paths[frame] = path
+    return paths
+
+
+def collect_images(workspace: Path, stages: list) -> dict:
+    """
+    收集要比對的圖片 (地圖與抽樣影格)
+
+    Returns:
+        dict: 名稱 → 圖片路徑
+    """
+    images = {}
+    if 'map' in stages:
+        images['map'] = _workspace_path(MAP_FILE, workspace)
+    video = _workspace_path(VIDEO_FILE, workspace)
+    if 'video' in stages and video.exists():
+        n_frames = len(np.load(_workspace_path(COORD_STORE_DIR, workspace) / 'dates.npy'))
+        frames = extract_frames(video, sample_frame_indices(n_frames), workspace / 'frames')
+        images.update({f'video_frame_{i:04d}': path for i, path in frames.items()})
+    return images
+
+
+def _git_revision() -> str:
+    """目前的 git commit (無法取得時為空字串)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _print_timings(timings: list, golden_timings: dict):
+    print("\n  各階段耗時與記憶體:")
+    print(f"  {'階段':<8}{'耗時(s)':>10}{'golden(s)':>11}{'加速':>8}{'記憶體(MB)':>12}{'golden(MB)':>12}")
+    for t in timings:
+        g = golden_timings.get(t['stage'], {})
+        speedup = f"{g['seconds'] / t['seconds']:.2f}x" if g.get('seconds') else '-'
+        print(f"  {t['stage']:<8}{t['seconds']:>10.2f}{g.get('seconds', float('nan')):>11.2f}"
+              f"{speedup:>8}{t['peak_rss_mb']:>12.1f}{g.get('peak_rss_mb', float('nan')):>12.1f}")
+
+
+def run_regression(update: bool = False, stages=tuple(STAGES),
+                   n_rows: int = REGRESSION_ROWS) -> bool:
+    """
+    執行回歸測試 (或以 update=True 產生 golden)
+
+    Args:
+        update (bool): 以本次輸出取代 golden
+        stages (iterable): 要執行的階段 (依 STAGES 順序; 地圖與動畫需要 ETL 的輸出)
+        n_rows (int): 合成資料的事故數 (比對時需與 golden 相同)
+
+    Returns:
+        bool: 全部通過 (或 golden 已更新) 時為 True
+    """
+    stages = [name for name in STAGES if name in set(stages) | {'etl'}]
+    print("\n" + "="*60)
+    print(f"輸出回歸測試 ({'更新 golden' if update else '與 golden 比對'}): {', '.join(stages)}")
+    print("="*60 + "\n")
+
+    manifest_file = GOLDEN_DIR / 'manifest.json'
+    golden = None
+    if not update:
+        if not manifest_file.exists():
+            print(f"✗ 找不到 golden: {manifest_file}")
+            print("  請先以目前確認過的程式碼執行: python -m src.regression --update")
+            return False
+        golden = json.loads(manifest_file.read_text(encoding='utf-8'))
+        if golden['dataset']['rows'] != n_rows:
+            print(f"✗ golden 的合成資料為 {golden['dataset']['rows']} 筆, 本次為 {n_rows} 筆")
+            return False
+
+    raw = make_synthetic_raw(n_rows)
+    workspace = prepare_workspace(raw)
+    print(f"✓ 合成資料: {len(raw)} 列原始資料 ({n_rows} 起事故, {REGRESSION_DAYS} 天)")
+    print(f"✓ 工作目錄: {workspace}")
+
+    timings = []
+    for name in stages:
+        result = run_stage(name, workspace)
+        timings.append(result)
+        mark = '✓' if result['returncode'] == 0 else '✗'
+        print(f"{mark} {name}: {result['seconds']:.2f} 秒, 最大記憶體 {result['peak_rss_mb']:.1f} MB")
+        if result['returncode'] != 0:
+            print(f"  執行失敗, 請見: {result['log']}")
+            break
+    if timings[0]['returncode'] != 0:
+        print("✗ ETL 失敗, 無法比對")
+        return False
+
+    processed = pd.read_parquet(_workspace_path(PROCESSED_DATA_FILE, workspace))
+    summary, hashes = table_summary(processed), row_hashes(processed)
+    images = collect_images(workspace, stages)
+    missing_images = [name for name, path in images.items() if not path.exists()]
+    failed_stages = [t['stage'] for t in timings if t['returncode'] != 0]
+
+    if update:
+        if failed_stages or missing_images:
+            print(f"✗ 輸出不完整, 未更新 golden (失敗: {failed_stages + missing_images})")
+            return False
+        if GOLDEN_DIR.exists():
+            shutil.rmtree(GOLDEN_DIR)
+        (GOLDEN_DIR / 'images').mkdir(parents=True)
+        np.save(GOLDEN_DIR / 'row_hashes.npy', hashes)
+        for name, path in images.items():
+            shutil.copy2(path, GOLDEN_DIR / 'images' / f'{name}.png')
+        manifest = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'revision': _git_revision(),
+            'dataset': {'rows': n_rows, 'days': REGRESSION_DAYS, 'seed': REGRESSION_SEED},
+            'table': summary,
+            'images': sorted(images),
+            'timings': {t['stage']: t for t in timings},
+        }
+        manifest_file.write_text(json.dumps(manifest, ensure_ascii=False, indent=2),
+                                 encoding='utf-8')
+        _print_timings(timings, {})
+        print(f"\n✓ golden 已更新: {GOLDEN_DIR} ({summary['rows']} 列, {len(images)} 張圖)")
+        return True
+
+    checks = {'table': compare_table(summary, hashes, golden['table'],
+                                     np.load(GOLDEN_DIR / 'row_hashes.npy'))}
+    for name in golden['images']:
+        if name not in images and not any(name.startswith(s) for s in stages):
+            continue  # 本次未執行的階段
+        checks[name] = image_diff(
+            images.get(name, workspace / 'missing.png'),
+            GOLDEN_DIR / 'images' / f'{name}.png',
+            diff_file=workspace / 'diffs' / f'{name}.png'
+        )
+    for name in stages:
+        if name in failed_stages:
+            checks[f'stage_{name}'] = {'passed': False, 'error': 'stage failed'}
+
+    passed = all(check['passed'] for check in checks.values())
+    table = checks['table']
+    print(f"\n{'✓' if table['passed'] else '✗'} 處理後資料: {table['rows']} 列 "
+          f"(golden {table['golden_rows']}), 缺少 {table['missing']} 列, 多出 {table['extra']} 列, "
+          f"欄位 {table['schema']}")
+    for name, check in checks.items():
+        if name == 'table' or name.startswith('stage_'):
+            continue
+        mark = '✓' if check['passed'] else '✗'
+        if 'changed_frac' in check:
+            print(f"{mark} {name}: 不同像素 {check['changed_frac']:.4%}, "
+                  f"平均差異 {check['mean_abs']:.3f}, 最大差異 {check['max_abs']}")
+        else:
+            print(f"{mark} {name}: {check.get('error') or '尺寸不同'} "
+                  f"{check.get('shape', '')} {check.get('golden_shape', '')}")
+    _print_timings(timings, golden['timings'])
+
+    results = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'golden_revision': golden.get('revision', ''),
+        'passed': passed,
+        'checks': checks,
+        'timings': timings,
+    }
+    RESULTS_FILE.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+    with open(HISTORY_FILE, 'a', encoding='utf-8') as history:
+        history.write(json.dumps({key: results[key] for key in
+                                  ('time', 'revision', 'golden_revision', 'passed', 'timings')},
+                                 ensure_ascii=False) + '\n')
+
+    print(f"\n{'✓ 全部通過' if passed else '✗ 輸出與 golden 不一致'}; 結果已儲存至: {RESULTS_FILE}")
+    return passed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="以合成資料比對管線輸出與 golden")
+    parser.add_argument('--update', action='store_true', help="以本次輸出產生 (取代) golden")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help="要執行的階段 (ETL 一定會執行)")
+    parser.add_argument('--rows', type=int, default=REGRESSION_ROWS, help="合成資料的事故數")
+    args = parser.parse_args()
+
+    ok = run_regression(update=args.update, stages=args.stages, n_rows=args.rows)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+無頭 (headless) 靜態地圖渲染模組
+圖面直接建立在 Agg 畫布上, 不經過 pyplot, 與目前啟用的 matplotlib 後端無關
+
+MapRenderContext 只建立一次 Cartopy 座標軸、地圖範圍、網格線與底圖;
+每張地圖只替換資料圖層 (散點、文字) 再存檔, 適合批次輸出大量篩選後的地圖
+(例如每週、每種車種一張)。
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import cartopy.crs as ccrs
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from src.config import BATCH_MAPS_DIR, BATCH_MAP_DPI, PROCESSED_DATA_FILE
+from src.crs import load_boundary_wgs84
+from src.store import read_processed_data
+from src.etl import classify_vehicle_groups
+from src.facet import group_offsets, square_extent
+
+# 配置中文字型
+font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
+font_prop = FontProperties(fname=font_path)
+
+# 底圖樣式 (與 viz_map.py 相同)
+BASEMAP_STYLE = dict(facecolor='pink', edgecolor='gray', linewidth=0.5, alpha=0.3)
+
+# 事故點位樣式 (與 viz_map.py 相同)
+CASE_STYLES = {
+    'A1': dict(c='red', s=30, alpha=0.7, zorder=3, edgecolors='darkred', linewidths=0.5),
+    'A2': dict(c='orange', s=8, alpha=0.4, zorder=2),
+}
+
+# 可批次輸出的分組方式
+BATCH_KEYS = ('week', 'vehicle_group')
+
+
+class MapRenderContext:
+    """
+    可重複使用的台北市地圖圖面
+
+    用法:
+        with MapRenderContext(gdf_boundary) as ctx:
+            ctx.scatter(lon, lat, label='A1', **CASE_STYLES['A1'])
+            ctx.save(path, title='...')
+
+    Args:
+        gdf_boundary (GeoDataFrame): WGS84 村里界
+        figsize (tuple): 畫布大小 (英吋)
+        dpi (int): 輸出解析度
+        basemap_style (dict): 底圖的 facecolor/edgecolor/linewidth/alpha
+    """
+
+    def __init__(self, gdf_boundary, figsize=(14, 14), dpi: int = 300,
+                 basemap_style: dict = None):
+        self.dpi = dpi
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
+        self.ax.set_aspect('equal')
+
+        gdf_boundary.plot(
+            ax=self.ax,
+            transform=ccrs.PlateCarree(),
+            **(basemap_style or BASEMAP_STYLE)
+        )
+        self.extent = square_extent(gdf_boundary.total_bounds)
+        self.ax.set_extent(self.extent, crs=ccrs.PlateCarree())
+
+        gl = self.ax.gridlines(
+            draw_labels=True,
+            linewidth=0.3,
+            alpha=0.3,
+            linestyle='--',
+            color='gray'
+        )
+        gl.top_labels = False
+        gl.right_labels = False
+
+        self.title = self.ax.set_title('', fontproperties=font_prop, fontsize=16, pad=20)
+        self._artists = []
+        self._laid_out = False
+        self.n_maps = 0
+        self.render_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def scatter(self, lon, lat, **kwargs):
+        """加入一個資料散點圖層 (下一次 save() 後移除)"""
+        artist = self.ax.scatter(lon, lat, transform=ccrs.PlateCarree(), **kwargs)
+        self._artists.append(artist)
+        return artist
+
+    def text(self, lon, lat, s, **kwargs):
+        """加入一個資料文字標記 (下一次 save() 後移除)"""
+        artist = self.ax.text(lon, lat, s, transform=ccrs.PlateCarree(), **kwargs)
+        self._artists.append(artist)
+        return artist
+
+    def clear(self):
+        """移除所有資料圖層與圖例, 保留底圖"""
+        for artist in self._artists:
+            artist.remove()
+        self._artists = []
+        legend = self.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+
+    def save(self, output_path, title: str = '', legend: bool = True):
+        """
+        設定標題與圖例後存檔, 再清除資料圖層
+
+        版面 (tight_layout) 只在第一張圖計算一次, 之後沿用。
+
+        Args:
+            output_path (Path): 輸出路徑
+            title (str): 標題
+            legend (bool): 是否顯示資料圖層的圖例
+        """
+        start = time.perf_counter()
+        self.title.set_text(title)
+        if legend and any(not a.get_label().startswith('_') for a in self._artists):
+            self.ax.legend(loc='upper right', prop=font_prop, framealpha=0.9, fontsize=11)
+        if not self._laid_out:
+            self.fig.tight_layout()
+            self._laid_out = True
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        self.fig.savefig(output_path, dpi=self.dpi)
+        self.clear()
+        self.n_maps += 1
+        self.render_time += time.perf_counter() - start
+
+    @property
+    def maps_per_second(self) -> float:
+        """已輸出地圖的平均速率"""
+        return self.n_maps / self.render_time if self.render_time > 0 else 0.0
+
+    def close(self):
+        """釋放圖面"""
+        self.clear()
+        self.fig.clear()
+
+
+def load_batch_data(by: str) -> pd.DataFrame:
+    """
+    讀取批次地圖所需的欄位並加上分組鍵 batch_key
+
+    Args:
+        by (str): 'week' (週一起算) 或 'vehicle_group'
+
+    Returns:
+        pd.DataFrame: longitude, latitude, case_type, batch_key
+    """
+    if by not in BATCH_KEYS:
+        raise ValueError(f"Unknown batch key: {by!r} (expected one of {BATCH_KEYS})")
+
+    columns = ['longitude', 'latitude', 'case_type']
+    columns.append('acc_dt' if by == 'week' else 'vehicle_type')
+    df = read_processed_data(columns=columns)
+    if by == 'week':
+        day = df['acc_dt'].dt.tz_localize(None).to_numpy().astype('datetime64[D]')
+        # 1970-01-01 為星期四, 減去星期幾後得到該週的星期一
+        weekday = (day.astype(np.int64) + 3) % 7
+        df['batch_key'] = (day - weekday.astype('timedelta64[D]')).astype(str)
+    else:
+        # 由車種代碼推得分類, 舊版處理後資料沒有 vehicle_group 欄位也能使用
+        df['batch_key'] = classify_vehicle_groups(df['vehicle_type'])
+    return df[['longitude', 'latitude', 'case_type', 'batch_key']]
+
+
+def render_batch_maps(by: str = 'week', dpi: int = BATCH_MAP_DPI):
+    """
+    以同一個圖面批次輸出每組一張事故地圖, 並回報每秒輸出的地圖數
+
+    Args:
+        by (str): 分組方式, 'week' 或 'vehicle_group'
+        dpi (int): 輸出解析度
+    """
+    print("\n" + "="*60)
+    print(f"批次輸出事故地圖 (依 {by})")
+    print("="*60 + "\n")
+
+    try:
+        gdf_boundary = load_boundary_wgs84()
+        df = load_batch_data(by)
+    except FileNotFoundError as e:
+        print(f"✗ 讀取資料失敗: {e}")
+        print(f"  請確認 {PROCESSED_DATA_FILE} 存在 (例如先執行: python main.py)")
+        return
+
+    labels, order, offsets = group_offsets(df['batch_key'])
+    lon = df['longitude'].to_numpy()[order]
+    lat = df['latitude'].to_numpy()[order]
+    case_type = df['case_type'].to_numpy(dtype=object)[order]
+    print(f"✓ 分組完成: {len(labels)} 組")
+
+    output_dir = BATCH_MAPS_DIR / by
+    setup_start = time.perf_counter()
+    with MapRenderContext(gdf_boundary, dpi=dpi) as ctx:
+        setup_time = time.perf_counter() - setup_start
+        for i, label in enumerate(labels):
+            rows = slice(offsets[i], offsets[i + 1])
+            counts = {}
+            for case, style in CASE_STYLES.items():
+                mask = case_type[rows] == case
+                counts[case] = int(mask.sum())
+                ctx.scatter(lon[rows][mask], lat[rows][mask],
+                            label=f'{case}類事故 ({counts[case]}件)', **style)
+            period = f'{label} 當週' if by == 'week' else str(label)
+            ctx.save(
+                output_dir / f'{by}_{label}.png',
+                title=f'113年台北市交通事故分布圖 - {period}'
+            )
+
+        print(f"✓ 已輸出 {ctx.n_maps} 張地圖至: {output_dir}")
+        print(f"  - 圖面建立: {setup_time:.2f} 秒 (只執行一次)")
+        print(f"  - 輸出速率: {ctx.maps_per_second:.2f} 張/秒 ({dpi} DPI)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="批次輸出台北市交通事故地圖")
+    parser.add_argument('--by', choices=BATCH_KEYS, default='week', help="分組方式")
+    parser.add_argument('--dpi', type=int, default=BATCH_MAP_DPI, help="輸出解析度")
+    args = parser.parse_args()
+
+    render_batch_maps(by=args.by, dpi=args.dpi)
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+事故曝險密度模組
+將事故點位對應到村里多邊形, 計算各村里與行政區的事故密度:
+
+- 每平方公里事故數 (面積)
+- 每公里邊界長度事故數 (專案沒有道路圖資, 以村里邊界長度作為道路長度的代理;
+  台北市村里界多沿街道劃分)
+
+面積與邊界長度在 Shapefile 原始的 TWD97 TM2 (EPSG:3826, 公尺) 計算一次後
+連同多邊形快取為 GeoParquet (行政區的邊界長度取所屬村里界線聯集的長度,
+相鄰村里共用的界線只算一次); 點位以 STRtree 一次完成空間查詢, 計數以 bincount 累加。
+信賴區間以多項分配一次抽出所有自助法 (bootstrap) 樣本, 不使用 Python 迴圈。
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import matplotlib.pyplot as plt
+from matplotlib.font_manager import FontProperties
+from src.hotspot import project_to_twd97
+from src.store import read_processed_data
+from src.config import (
+    CASE_CODES, FIGURES_DIR, PROCESSED_DATA_FILE, TWD97_EPSG,
+    BOUNDARY_SHAPEFILE, VILLAGE_METRICS_FILE, VILLAGE_RATES_FILE, DISTRICT_RATES_FILE,
+    RISK_BOOTSTRAP_SAMPLES, RISK_CI_LEVEL, RISK_SEED, RISK_TOP_N
+)
+
+# 配置中文字型
+font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
+font_prop = FontProperties(fname=font_path)
+plt.rcParams['axes.unicode_minus'] = False
+
+# 不在任何村里內的事故
+UNASSIGNED = -1
+
+# 曝險量欄位 → 密度欄位前綴
+EXPOSURES = {
+    'area_km2': 'per_km2',
+    'boundary_km': 'per_km',
+}
+
+
+def load_villages() -> gpd.GeoDataFrame:
+    """
+    載入 TWD97 TM2 的村里多邊形與面積、邊界長度
+
+    第一次由 Shapefile 計算並存成 GeoParquet; 之後直接讀取快取,
+    Shapefile 更新 (修改時間較新) 或快取缺少欄位時才重新產生。
+
+    Returns:
+        GeoDataFrame: village_id, district, village, area_km2, boundary_km,
+            district_boundary_km (所屬行政區的邊界長度), geometry
+            (EPSG:3826, 列順序與 Shapefile 相同)
+    """
+    if (VILLAGE_METRICS_FILE.exists()
+            and VILLAGE_METRICS_FILE.stat().st_mtime >= BOUNDARY_SHAPEFILE.stat().st_mtime):
+        villages = gpd.read_parquet(VILLAGE_METRICS_FILE)
+        if 'district_boundary_km' in villages.columns:
+            return villages
+
+    gdf = gpd.read_file(BOUNDARY_SHAPEFILE)
+    if gdf.crs is None or gdf.crs.to_epsg() != TWD97_EPSG:
+        gdf = gdf.to_crs(epsg=TWD97_EPSG)
+    villages = gpd.GeoDataFrame({
+        'village_id': gdf['CPTVID'].astype(str),
+        'district': gdf['TNAME'],
+        'village': gdf['VNAME'],
+        'area_km2': gdf.geometry.area.to_numpy() / 1e6,
+        'boundary_km': gdf.geometry.length.to_numpy() / 1e3,
+    }, geometry=gdf.geometry.to_numpy(), crs=gdf.crs)
+    # 村里周長相加會把同區相鄰村里的共用界線算兩次; 取界線聯集的長度
+    district_km = {
+        district: shapely.union_all(group.geometry.boundary.to_numpy()).length / 1e3
+        for district, group in villages.groupby('district')
+    }
+    villages.insert(5, 'district_boundary_km', villages['district'].map(district_km).to_numpy())
+
+    VILLAGE_METRICS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    villages.to_parquet(VILLAGE_METRICS_FILE, index=False)
+    return villages
+
+
+def assign_villages(villages: gpd.GeoDataFrame, lon, lat) -> np.ndarray:
+    """
+    找出每個事故點位所在的村里 (落在共同邊界上的點歸給第一個村里)
+
+    Args:
+        villages (GeoDataFrame): load_villages() 的結果
+        lon (array-like): 經度
+        lat (array-like): 緯度
+
+    Returns:
+        np.ndarray: 每個點位的村里列索引; 不在任何村里內或座標缺值為 UNASSIGNED
+    """
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    result = np.full(len(lon), UNASSIGNED, dtype=np.int64)
+    valid = np.flatnonzero(np.isfinite(lon) & np.isfinite(lat))
+    if len(valid) == 0:
+        return result
+
+    # 點位遠多於村里: 對點位建索引, 以村里多邊形查詢 (每個多邊形只需 prepare 一次)
+    points = shapely.points(project_to_twd97(lon[valid], lat[valid]))
+    tree = shapely.STRtree(points)
+    poly_idx, pt_idx = tree.query(villages.geometry.to_numpy(), predicate='intersects')
+
+    # 結果依村里排序; 穩定排序成依點位後, 每個點位取第一筆
+    order = np.argsort(pt_idx, kind='stable')
+    pt_idx, poly_idx = pt_idx[order], poly_idx[order]
+    first = np.flatnonzero(np.r_[True, pt_idx[1:] != pt_idx[:-1]]) if len(pt_idx) else pt_idx
+    result[valid[pt_idx[first]]] = poly_idx[first]
+    return result
+
+
+def count_by_village(village_idx: np.ndarray, case_type, n_villages: int) -> np.ndarray:
+    """
+    計算各村里各事故類別的事故數
+
+    Args:
+        village_idx (np.ndarray): assign_villages() 的結果
+        case_type (array-like): 事故類別
+        n_villages (int): 村里數
+
+    Returns:
+        np.ndarray: (村里, 事故類別) 的計數, 類別順序同 CASE_CODES
+    """
+    cases = tuple(CASE_CODES)
+    case = pd.Categorical(np.asarray(case_type), categories=cases).codes.astype(np.int64)
+    ok = (village_idx >= 0) & (case >= 0)
+    index = village_idx[ok] * len(cases) + case[ok]
+    return np.bincount(index, minlength=n_villages * len(cases)).reshape(n_villages, len(cases))
+
+
+def bootstrap_counts(counts: np.ndarray, n_samples: int = RISK_BOOTSTRAP_SAMPLES,
+                     seed: int = RISK_SEED) -> np.ndarray:
+    """
+    以自助法重抽全市事故, 得到各村里事故數的抽樣分配
+
+    從全部 N 筆事故中重抽 N 筆等同於以各村里占比為機率的多項分配,
+    因此所有樣本由一次 rng.multinomial 產生。
+
+    Args:
+        counts (np.ndarray): 各村里事故數
+        n_samples (int): 重抽次數
+        seed (int): 亂數種子
+
+    Returns:
+        np.ndarray: (n_samples, 村里) 的事故數
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    rng = np.random.default_rng(seed)
+    if total == 0:
+        return np.zeros((n_samples, len(counts)), dtype=np.int64)
+    return rng.multinomial(total, counts / total, size=n_samples)
+
+
+def _rate_columns(counts: np.ndarray, samples: np.ndarray, exposure: pd.DataFrame,
+                  level: float) -> dict:
+    """計算各曝險量的密度與信賴區間欄位"""
+    alpha = (1.0 - level) / 2.0
+    columns = {}
+    for exposure_col, prefix in EXPOSURES.items():
+        denom = exposure[exposure_col].to_numpy(dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = counts / denom
+            lo, hi = np.quantile(samples / denom, [alpha, 1.0 - alpha], axis=0)
+        columns[prefix] = np.round(rate, 3)
+        columns[f'{prefix}_lo'] = np.round(lo, 3)
+        columns[f'{prefix}_hi'] = np.round(hi, 3)
+    return columns
+
+
+def compute_rates(villages: gpd.GeoDataFrame, village_idx: np.ndarray, case_type,
+                  n_samples: int = RISK_BOOTSTRAP_SAMPLES, level: float = RISK_CI_LEVEL,
+                  seed: int = RISK_SEED):
+    """
+    計算各村里與行政區的事故密度及自助法信賴區間
+
+    行政區的樣本由同一批村里樣本加總而得, 兩張表的區間彼此一致。
+    行政區的邊界長度為所屬村里界線聯集的長度 (共用界線只算一次)。
+
+    Args:
+        villages (GeoDataFrame): load_villages() 的結果
+        village_idx (np.ndarray): assign_villages() 的結果
+        case_type (array-like): 事故類別
+        n_samples (int): 重抽次數
+        level (float): 信賴區間水準
+        seed (int): 亂數種子
+
+    Returns:
+        tuple: (village_rates, district_rates), 皆依每平方公里事故數由高至低排序
+    """
+    cases = tuple(CASE_CODES)
+    by_case = count_by_village(village_idx, case_type, len(villages))
+    counts = by_case.sum(axis=1)
+    samples = bootstrap_counts(counts, n_samples, seed)
+
+    info = pd.DataFrame(villages.drop(columns=['geometry', 'district_boundary_km']))
+    village_rates = info.assign(
+        n_accidents=counts,
+        **{case: by_case[:, i] for i, case in enumerate(cases)},
+        **_rate_columns(counts, samples, info, level)
+    )
+
+    district, districts = pd.factorize(info['district'], sort=True)
+    membership = np.zeros((len(info), len(districts)), dtype=np.int64)
+    membership[np.arange(len(info)), district] = 1
+    district_info = pd.DataFrame({
+        'district': np.asarray(districts),
+        'n_villages': membership.sum(axis=0),
+        'area_km2': info['area_km2'].to_numpy() @ membership,
+        'boundary_km': (villages.groupby('district')['district_boundary_km'].first()
+                        .reindex(districts).to_numpy()),
+    })
+    district_counts = counts @ membership
+    district_rates = district_info.assign(
+        n_accidents=district_counts,
+        **{case: by_case[:, i] @ membership for i, case in enumerate(cases)},
+        **_rate_columns(district_counts, samples @ membership, district_info, level)
+    )
+
+    return tuple(
+        table.sort_values(['per_km2', 'n_accidents'], ascending=False, ignore_index=True)
+             .assign(area_km2=lambda t: t['area_km2'].round(4),
+                     boundary_km=lambda t: t['boundary_km'].round(3))
+        for table in (village_rates, district_rates)
+    )
+
+
+def _plot_ranked(ax, table: pd.DataFrame, labels, title: str):
+    """繪製含信賴區間誤差線的水平排名長條圖 (最高者在上)"""
+    table = table.iloc[::-1]
+    y = np.arange(len(table))
+    rate = table['per_km2'].to_numpy()
+    err = np.vstack([rate - table['per_km2_lo'].to_numpy(),
+                     table['per_km2_hi'].to_numpy() - rate])
+    ax.barh(y, rate, color='#d62728', alpha=0.7)
+    ax.errorbar(rate, y, xerr=np.maximum(err, 0), fmt='none', ecolor='black',
+                elinewidth=1, capsize=3)
+    ax.set_yticks(y)
+    ax.set_yticklabels(list(labels)[::-1], fontproperties=font_prop, fontsize=10)
+    ax.set_xlabel("每平方公里事故數", fontproperties=font_prop, fontsize=12)
+    ax.set_title(title, fontproperties=font_prop, fontsize=14)
+    ax.grid(axis='x', linestyle='--', alpha=0.6)
+
+
+def plot_rates(village_rates: pd.DataFrame, district_rates: pd.DataFrame,
+               top_n: int = RISK_TOP_N, level: float = RISK_CI_LEVEL) -> Path:
+    """
+    繪製行政區與前 top_n 名村里的每平方公里事故數排名圖
+
+    Args:
+        village_rates (pd.DataFrame): compute_rates() 的村里表
+        district_rates (pd.DataFrame): compute_rates() 的行政區表
+        top_n (int): 顯示的村里數
+        level (float): 信賴區間水準 (僅用於標題)
+
+    Returns:
+        Path: 圖檔路徑
+    """
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    top = village_rates.head(top_n)
+
+    fig, (ax_d, ax_v) = plt.subplots(1, 2, figsize=(16, 9))
+    _plot_ranked(ax_d, district_rates, district_rates['district'], "各行政區")
+    _plot_ranked(ax_v, top, top['district'] + top['village'], f"前 {len(top)} 名村里")
+    fig.suptitle(f"113年 台北市交通事故密度排名 ({level:.0%} 信賴區間)",
+                 fontproperties=font_prop, fontsize=16)
+    fig.tight_layout()
+
+    output_path = FIGURES_DIR / "exposure_rates.png"
+    fig.savefig(output_path, dpi=200)
+    plt.close(fig)
+    return output_path
+
+
+def main(n_samples: int = RISK_BOOTSTRAP_SAMPLES, top_n: int = RISK_TOP_N):
+    """計算各村里與行政區的事故密度並輸出排名表與圖"""
+    try:
+        df = read_processed_data(columns=['longitude', 'latitude', 'case_type'])
+    except FileNotFoundError:
+        print(f"錯誤：找不到處理後的資料檔案於 {PROCESSED_DATA_FILE}")
+        print("請先執行 ETL 流程 (例如: python main.py)")
+        return
+
+    start = time.perf_counter()
+    villages = load_villages()
+    print(f"✓ 村里界: {len(villages)} 個村里, 總面積 {villages['area_km2'].sum():.1f} 平方公里")
+
+    village_idx = assign_villages(villages, df['longitude'], df['latitude'])
+    n_unassigned = int((village_idx == UNASSIGNED).sum())
+    print(f"✓ 空間對應: {len(df) - n_unassigned} 筆事故落在村里內"
+          + (f", {n_unassigned} 筆不在台北市村里界內" if n_unassigned else ""))
+
+    village_rates, district_rates = compute_rates(
+        villages, village_idx, df['case_type'], n_samples=n_samples
+    )
+    print(f"✓ 密度與信賴區間計算完成 ({n_samples} 次重抽, "
+          f"耗時 {time.perf_counter() - start:.2f} 秒)")
+
+    VILLAGE_RATES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    village_rates.to_csv(VILLAGE_RATES_FILE, index=False)
+    district_rates.to_csv(DISTRICT_RATES_FILE, index=False)
+    print(district_rates[['district', 'n_accidents', 'per_km2', 'per_km2_lo', 'per_km2_hi',
+                          'per_km']].to_string(index=False))
+    print(f"村里密度表已儲存至: {VILLAGE_RATES_FILE}")
+    print(f"行政區密度表已儲存至: {DISTRICT_RATES_FILE}")
+
+    output_path = plot_rates(village_rates, district_rates, top_n)
+    print(f"✓ 排名圖已儲存至: {output_path}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="計算台北市各村里與行政區的事故密度")
+    parser.add_argument('--samples', type=int, default=RISK_BOOTSTRAP_SAMPLES,
+                        help="自助法重抽次數")
+    parser.add_argument('--top', type=int, default=RISK_TOP_N, help="排名圖顯示的村里數")
+    args = parser.parse_args()
+
+    main(n_samples=args.samples, top_n=args.top)
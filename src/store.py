@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+處理後資料存放區 (processed store) 模組
+- 基礎 Parquet (完整重建產生) + 增量附加的 Parquet 片段
+- 當事人 (車輛) 層級資料, 同樣為基礎檔 + 增量片段, 以 accident_key 與事故對應
+- 排序後的事故鍵索引, 附加時不必重新載入歷史資料即可去重;
+  新鍵另存為排序片段, 片段過多時才合併回基礎索引 (compact_key_index)
+- 每日彙總計數, 附加時只需合併新資料的計數
+"""
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from src.config import (
+    PROCESSED_DATA_FILE, PROCESSED_FRAGMENTS_DIR, PARTIES_DATA_FILE, PARTY_FRAGMENTS_DIR,
+    KEY_INDEX_FILE, KEY_INDEX_RUNS_DIR, DAILY_COUNTS_FILE
+)
+from src.keys import accident_keys, lookup
+
+# 每日彙總計數的分組欄位
+DAILY_COUNT_KEYS = ['date', 'hour', 'district', 'case_type', 'light_bin']
+
+
+def save_array(path: Path, array: np.ndarray) -> None:
+    """
+    以「寫入暫存檔再取代」的方式儲存 .npy
+
+    仍以 memory-map 開啟舊檔的讀取端不會讀到被截斷的檔案。
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.ascontiguousarray(array))
+    os.replace(tmp_path, path)
+
+
+def fragment_files(fragments_dir: Path = PROCESSED_FRAGMENTS_DIR) -> list:
+    """依寫入順序列出增量片段"""
+    return sorted(fragments_dir.glob('part-*.parquet'))
+
+
+def read_processed_data(columns: Optional[list] = None,
+                        base_file: Path = PROCESSED_DATA_FILE,
+                        fragments_dir: Path = PROCESSED_FRAGMENTS_DIR) -> pd.DataFrame:
+    """
+    讀取完整的處理後資料 (基礎檔 + 所有增量片段)
+
+    Args:
+        columns (list, optional): 只讀取指定欄位
+        base_file (Path): 基礎檔
+        fragments_dir (Path): 增量片段目錄
+
+    Returns:
+        pd.DataFrame: 處理後的資料
+    """
+    paths = ([base_file] if base_file.exists() else []) + fragment_files(fragments_dir)
+    if not paths:
+        raise FileNotFoundError(f"Processed data file not found at: {base_file}")
+    frames = [pd.read_parquet(path, columns=columns) for path in paths]
+    if len(frames) == 1:
+        return frames[0]
+
+    df = pd.concat(frames, ignore_index=True)
+    # 類別不同的分類欄位 (例如車種代碼) 合併後會變成 object, 轉回 category
+    for col in frames[0].columns:
+        if (isinstance(frames[0][col].dtype, pd.CategoricalDtype)
+                and not isinstance(df[col].dtype, pd.CategoricalDtype)):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def read_party_data(columns: Optional[list] = None) -> pd.DataFrame:
+    """讀取完整的當事人 (車輛) 層級資料 (基礎檔 + 所有增量片段)"""
+    return read_processed_data(columns, PARTIES_DATA_FILE, PARTY_FRAGMENTS_DIR)
+
+
+def new_fragment_id() -> str:
+    """
+    產生增量片段的編號: 微秒時間戳 (排序即寫入順序) + 隨機字尾 (同時附加也不會重複)
+
+    同一次附加的資料、當事人與隔離片段共用同一個編號。
+    """
+    return f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+
+
+def write_fragment(df: pd.DataFrame, fragments_dir: Path = PROCESSED_FRAGMENTS_DIR,
+                   fragment_id: Optional[str] = None) -> Path:
+    """將一批新資料寫為增量片段 (未指定編號時產生新的編號)"""
+    fragments_dir.mkdir(parents=True, exist_ok=True)
+    path = fragments_dir / f'part-{fragment_id or new_fragment_id()}.parquet'
+    df.to_parquet(path, index=False)
+    return path
+
+
+def clear_fragments(fragments_dir: Path = PROCESSED_FRAGMENTS_DIR) -> int:
+    """完整重建時移除舊的增量片段, 回傳移除數量"""
+    paths = fragment_files(fragments_dir)
+    for path in paths:
+        path.unlink()
+    return len(paths)
+
+
+# ==================== 事故鍵索引 ====================
+
+def build_key_index(df: pd.DataFrame) -> np.ndarray:
+    """由處理後資料建立排序後的事故鍵索引 (沒有 accident_key 欄位時由時間與座標計算)"""
+    if 'accident_key' in df.columns:
+        keys = df['accident_key'].to_numpy(dtype=np.uint64)
+    else:
+        keys = accident_keys(df)
+    return np.unique(keys)
+
+
+def key_index_runs() -> list:
+    """依寫入順序列出附加時寫入的事故鍵片段"""
+    return sorted(KEY_INDEX_RUNS_DIR.glob('run-*.npy'))
+
+
+def load_key_index() -> list:
+    """
+    載入事故鍵索引 (基礎索引 + 附加時寫入的排序片段, 皆以 memory-map 開啟)
+
+    基礎索引尚未建立時由現有資料建立一次並儲存。
+
+    Returns:
+        list: 各自排序的 uint64 事故鍵陣列
+    """
+    if KEY_INDEX_FILE.exists():
+        base = np.load(KEY_INDEX_FILE, mmap_mode='r')
+    else:
+        base = build_key_index(
+            read_processed_data(columns=['acc_dt', 'longitude', 'latitude'])
+        )
+        save_array(KEY_INDEX_FILE, base)
+    return [base] + [np.load(path, mmap_mode='r') for path in key_index_runs()]
+
+
+def filter_new_records(df: pd.DataFrame, key_index):
+    """
+    以二分搜尋比對索引, 只保留尚未出現過的事故
+
+    已收錄事故的所有當事人列都會被略過 (以事故為單位附加)。
+
+    Args:
+        df (pd.DataFrame): 新一批 (已清洗、已去除批內重複) 的資料
+        key_index (np.ndarray | list): 排序後的既有事故鍵, 或 load_key_index() 的排序片段
+
+    Returns:
+        tuple: (新資料, 新事故的事故鍵 (排序、不重複))
+    """
+    if 'accident_key' in df.columns:
+        keys = df['accident_key'].to_numpy(dtype=np.uint64)
+    else:
+        keys = accident_keys(df)
+    runs = key_index if isinstance(key_index, list) else [key_index]
+    known = np.zeros(len(keys), dtype=bool)
+    for run in runs:
+        known |= lookup(run, keys) >= 0
+    return df[~known], np.unique(keys[~known])
+
+
+def write_key_run(new_keys: np.ndarray, run_id: str) -> Path:
+    """將新事故鍵寫為一個排序片段 (只排序新鍵, 不改寫基礎索引)"""
+    path = KEY_INDEX_RUNS_DIR / f'run-{run_id}.npy'
+    save_array(path, np.unique(np.asarray(new_keys, dtype=np.uint64)))
+    return path
+
+
+def clear_key_runs() -> int:
+    """移除所有事故鍵片段, 回傳移除數量"""
+    paths = key_index_runs()
+    for path in paths:
+        path.unlink()
+    return len(paths)
+
+
+def compact_key_index(max_runs: int = 0) -> int:
+    """
+    片段數超過 max_runs 時, 將所有片段合併回基礎索引
+
+    Args:
+        max_runs (int): 允許保留的片段數 (0 = 有片段就合併)
+
+    Returns:
+        int: 合併的片段數 (未合併為 0)
+    """
+    if len(key_index_runs()) <= max_runs:
+        return 0
+    merged = np.unique(np.concatenate([np.asarray(run) for run in load_key_index()]))
+    save_array(KEY_INDEX_FILE, merged)
+    return clear_key_runs()
+
+
+# ==================== 每日彙總計數 ====================
+
+def build_daily_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    彙總每日、每小時、行政區、事故類別與光線的事故數
+
+    Args:
+        df (pd.DataFrame): 處理後的資料
+
+    Returns:
+        pd.DataFrame: DAILY_COUNT_KEYS + count
+    """
+    return (df.groupby(DAILY_COUNT_KEYS, observed=True, dropna=False)
+              .size().rename('count').reset_index())
+
+
+def update_daily_counts(counts: pd.DataFrame, delta_df: pd.DataFrame) -> pd.DataFrame:
+    """將新資料的計數合併到既有的每日彙總 (只需對新資料分組)"""
+    merged = pd.concat([counts, build_daily_counts(delta_df)], ignore_index=True)
+    return (merged.groupby(DAILY_COUNT_KEYS, observed=True, dropna=False)['count']
+                  .sum().reset_index())
+
+
+def load_daily_counts() -> pd.DataFrame:
+    """載入每日彙總計數; 尚未建立時由現有資料建立"""
+    if DAILY_COUNTS_FILE.exists():
+        return pd.read_parquet(DAILY_COUNTS_FILE)
+    return build_daily_counts(read_processed_data(columns=DAILY_COUNT_KEYS))
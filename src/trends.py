@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+事故時間趨勢與異常日偵測模組
+由每日彙總計數 (store.load_daily_counts) 一次建立計數立方體:
+
+- daily: 行政區 × 日期 × 事故類別
+- light: 光線 (light_bin) × 日期 × 事故類別
+- dow_hour: 星期 × 小時 × 事故類別
+
+滾動視窗以累積和 (cumsum) 計算, 任一視窗的總和只需兩次查表;
+各行政區的異常日以「前 N 天基準期」的 z 分數判斷。
+"""
+
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+from src.store import load_daily_counts
+from src.config import (
+    CASE_CODES, PROCESSED_DATA_FILE, ANOMALIES_FILE,
+    ANOMALY_BASELINE_DAYS, ANOMALY_Z_THRESHOLD, ANOMALY_MIN_COUNT
+)
+
+# 星期標籤 (星期一 = 0)
+WEEKDAY_LABELS = ('一', '二', '三', '四', '五', '六', '日')
+
+
+class TrendCube(NamedTuple):
+    """事故計數立方體 (日期軸為連續日期, 沒有事故的日子計數為 0)"""
+    dates: np.ndarray       # datetime64[D]
+    districts: np.ndarray
+    light_bins: np.ndarray
+    cases: tuple
+    daily: np.ndarray       # (行政區, 日期, 事故類別)
+    light: np.ndarray       # (光線, 日期, 事故類別)
+    dow_hour: np.ndarray    # (7, 24, 事故類別)
+
+
+def _accumulate(index: np.ndarray, weights: np.ndarray, shape: tuple) -> np.ndarray:
+    """以 bincount 將攤平後的索引累加成指定形狀的計數陣列"""
+    size = int(np.prod(shape))
+    return np.bincount(index, weights=weights, minlength=size).astype(np.int64).reshape(shape)
+
+
+def build_trend_cube(counts: pd.DataFrame) -> TrendCube:
+    """
+    由每日彙總計數建立計數立方體 (每個維度只分解一次代碼)
+
+    行政區、光線或事故類別缺值的列不計入對應的立方體。
+
+    Args:
+        counts (pd.DataFrame): date, hour, district, case_type, light_bin, count
+
+    Returns:
+        TrendCube: 計數立方體
+    """
+    counts = counts.dropna(subset=['date'])
+    if len(counts) == 0:
+        raise ValueError("No daily counts to build the trend cube from")
+
+    day = pd.to_datetime(counts['date']).to_numpy().astype('datetime64[D]')
+    first, last = day.min(), day.max()
+    dates = np.arange(first, last + np.timedelta64(1, 'D'))
+    n_dates = len(dates)
+    t = (day - first).astype(np.int64)
+
+    cases = tuple(CASE_CODES)
+    case = pd.Categorical(counts['case_type'], categories=cases).codes.astype(np.int64)
+    district, districts = pd.factorize(counts['district'], sort=True)
+    light, light_bins = pd.factorize(counts['light_bin'], sort=True)
+    hour = counts['hour'].to_numpy(dtype=np.int64)
+    # 1970-01-01 為星期四, 位移 3 天後星期一 = 0
+    dow = (day.astype(np.int64) + 3) % 7
+    weight = counts['count'].to_numpy(dtype=np.float64)
+    n_cases = len(cases)
+
+    ok = case >= 0
+    has_district = ok & (district >= 0)
+    has_light = ok & (light >= 0)
+    has_hour = ok & (hour >= 0) & (hour <= 23)
+
+    daily = _accumulate(
+        (district[has_district] * n_dates + t[has_district]) * n_cases + case[has_district],
+        weight[has_district], (len(districts), n_dates, n_cases)
+    )
+    light_cube = _accumulate(
+        (light[has_light] * n_dates + t[has_light]) * n_cases + case[has_light],
+        weight[has_light], (len(light_bins), n_dates, n_cases)
+    )
+    dow_hour = _accumulate(
+        (dow[has_hour] * 24 + hour[has_hour]) * n_cases + case[has_hour],
+        weight[has_hour], (7, 24, n_cases)
+    )
+
+    return TrendCube(
+        dates=dates,
+        districts=np.asarray(districts),
+        light_bins=np.asarray(light_bins),
+        cases=cases,
+        daily=daily,
+        light=light_cube,
+        dow_hour=dow_hour,
+    )
+
+
+def prefix_sums(values: np.ndarray, axis: int = -1) -> np.ndarray:
+    """
+    沿 axis 的累積和, 前面補一個 0
+
+    [start, stop) 區間的總和 = P[stop] - P[start]
+    """
+    values = np.moveaxis(np.asarray(values, dtype=np.float64), axis, -1)
+    out = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=out[..., 1:])
+    return np.moveaxis(out, -1, axis)
+
+
+def rolling_sum(values: np.ndarray, window: int, axis: int = -1) -> np.ndarray:
+    """
+    以累積和計算尾端滾動視窗總和 (包含當日; 前 window-1 天為部分視窗)
+
+    Args:
+        values (np.ndarray): 計數陣列
+        window (int): 視窗長度
+        axis (int): 日期軸
+
+    Returns:
+        np.ndarray: 與 values 同形狀的滾動總和
+    """
+    prefix = prefix_sums(values, axis)
+    n = np.shape(values)[axis]
+    stop = np.arange(1, n + 1)
+    start = np.maximum(stop - window, 0)
+    return np.take(prefix, stop, axis=axis) - np.take(prefix, start, axis=axis)
+
+
+def rolling_mean(values: np.ndarray, window: int, axis: int = -1) -> np.ndarray:
+    """滾動平均 (部分視窗以實際天數平均)"""
+    n = np.shape(values)[axis]
+    days = np.minimum(np.arange(1, n + 1), window).astype(np.float64)
+    shape = [1] * np.ndim(values)
+    shape[axis] = n
+    return rolling_sum(values, window, axis) / days.reshape(shape)
+
+
+def detect_anomalies(cube: TrendCube,
+                     baseline_days: int = ANOMALY_BASELINE_DAYS,
+                     z_threshold: float = ANOMALY_Z_THRESHOLD,
+                     min_count: int = ANOMALY_MIN_COUNT) -> pd.DataFrame:
+    """
+    以前 baseline_days 天為基準期, 找出各行政區事故數異常偏高的日子
+
+    基準期的平均與標準差由計數及其平方的累積和求得; 標準差下限為 1 筆,
+    避免基準期幾乎固定時 z 分數失真。基準期不足的前幾天不判斷。
+
+    Args:
+        cube (TrendCube): 計數立方體
+        baseline_days (int): 基準期天數 (不含當日)
+        z_threshold (float): z 分數門檻
+        min_count (int): 當日最少事故數
+
+    Returns:
+        pd.DataFrame: district, date, count, A1, A2, baseline_mean, baseline_std, z
+            (依 z 分數由高至低排序)
+    """
+    by_case = cube.daily.astype(np.float64)
+    x = by_case.sum(axis=2)                        # (行政區, 日期)
+    n_dates = x.shape[1]
+
+    s1 = prefix_sums(x, axis=1)
+    s2 = prefix_sums(x ** 2, axis=1)
+    stop = np.arange(n_dates)                      # 基準期為 [t - baseline_days, t)
+    start = np.maximum(stop - baseline_days, 0)
+    n = (stop - start).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (s1[:, stop] - s1[:, start]) / n
+        var = (s2[:, stop] - s2[:, start]) / n - mean ** 2
+    std = np.maximum(np.sqrt(np.maximum(var, 0.0)), 1.0)
+    z = (x - mean) / std
+
+    full_baseline = stop >= baseline_days
+    flagged = full_baseline & (z >= z_threshold) & (x >= min_count)
+    d_idx, t_idx = np.nonzero(flagged)
+
+    anomalies = pd.DataFrame({
+        'district': cube.districts[d_idx],
+        'date': cube.dates[t_idx],
+        'count': x[d_idx, t_idx].astype(np.int64),
+        **{case: by_case[d_idx, t_idx, i].astype(np.int64)
+           for i, case in enumerate(cube.cases)},
+        'baseline_mean': np.round(mean[d_idx, t_idx], 2),
+        'baseline_std': np.round(std[d_idx, t_idx], 2),
+        'z': np.round(z[d_idx, t_idx], 2),
+    })
+    return anomalies.sort_values(['z', 'count'], ascending=False, ignore_index=True)
+
+
+def main():
+    """建立趨勢立方體並輸出各行政區的異常事故日"""
+    try:
+        counts = load_daily_counts()
+    except FileNotFoundError:
+        print(f"錯誤：找不到處理後的資料檔案於 {PROCESSED_DATA_FILE}")
+        print("請先執行 ETL 流程 (例如: python main.py)")
+        return
+
+    cube = build_trend_cube(counts)
+    print(f"✓ 計數立方體: {len(cube.districts)} 個行政區 × {len(cube.dates)} 天 "
+          f"({cube.dates[0]} ~ {cube.dates[-1]})")
+
+    anomalies = detect_anomalies(cube)
+    ANOMALIES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    anomalies.to_csv(ANOMALIES_FILE, index=False)
+
+    print(f"✓ 找到 {len(anomalies)} 個異常事故日 "
+          f"(基準期 {ANOMALY_BASELINE_DAYS} 天, z ≥ {ANOMALY_Z_THRESHOLD:g})")
+    if len(anomalies) > 0:
+        print(anomalies.head(10).to_string(index=False))
+    print(f"異常事故日已儲存至: {ANOMALIES_FILE}")
+
+
+if __name__ == "__main__":
+    main()
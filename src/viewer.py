@@ -0,0 +1,755 @@
+# -*- coding: utf-8 -*-
+"""
+互動式事故地圖檢視器
+在 Cartopy/matplotlib 圖面上平移、縮放並以時間滑桿瀏覽事故點位
+
+- GridIndex: 均勻格網空間索引, 點位依格子排序; 視窗內同一列格子在陣列中連續,
+  查詢只需每列一次切片
+- 每次平移/縮放只處理視窗內的格子: 事故數多時畫密度圖 (格子計數),
+  放大到事故數不超過 VIEWER_MAX_MARKERS 時改畫個別點位
+- 底圖同樣分級: 範圍大時貼上預先點陣化的村里界; 放大後改為點陣填色
+  加上視窗內村里的向量界線
+- 時間滑桿以座標陣列的每日偏移量 (offsets) 決定時間範圍, 格子計數只對
+  新增/移出的區段增量更新
+
+圖面可直接建立在 Agg 畫布上 (不需視窗), run_benchmark() 以腳本化的操作
+量測每次重繪的耗時。
+"""
+
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+# 確保可以找到 src 模組
+if __name__ == "__main__":
+    project_root = Path(__file__).parent.parent
+    sys.path.insert(0, str(project_root))
+
+import numpy as np
+import cartopy.crs as ccrs
+from matplotlib import colormaps, rcParams
+from matplotlib.artist import Artist
+from matplotlib.backends.backend_agg import FigureCanvasAgg, RendererAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.font_manager import FontProperties
+from matplotlib.widgets import Slider
+from src.config import (
+    CASE_CODES, PROCESSED_DATA_FILE,
+    VIEWER_GRID_SIZE, VIEWER_MAX_MARKERS, VIEWER_FRAME_BUDGET_MS
+)
+from src.coord_store import CoordStore, build_coord_store, load_coord_store
+from src.crs import load_boundary_wgs84
+from src.facet import rasterize_boundary, square_extent
+from src.store import read_processed_data
+
+# 配置中文字型
+font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
+font_prop = FontProperties(fname=font_path)
+
+# 點位樣式 (與 viz_map.py 相同配色, 點略小)
+MARKER_STYLES = {
+    'A1': dict(c='red', s=20, alpha=0.8, zorder=4, edgecolors='darkred', linewidths=0.4),
+    'A2': dict(c='orange', s=6, alpha=0.5, zorder=3, linewidths=0),
+}
+
+# 底圖點陣的邊長 (像素); 放大到點陣每像素超過 2 個螢幕像素時改畫向量界線
+BASEMAP_RASTER_PX = 2048
+
+# 密度圖色階與不透明度
+DENSITY_CMAP = 'inferno_r'
+DENSITY_ALPHA = 0.75
+
+# 滾輪每格的縮放倍率
+SCROLL_ZOOM = 1.25
+
+# add.at 與 bincount 的切換點: 區段較短時逐點累加比建立整張計數陣列快
+_ADD_AT_MAX = 1 << 16
+
+
+class GridIndex:
+    """
+    均勻格網空間索引
+
+    Args:
+        lon (np.ndarray): 經度 (依時間排序)
+        lat (np.ndarray): 緯度 (依時間排序)
+        extent (tuple): 格網範圍 (min_lon, max_lon, min_lat, max_lat); 範圍外的點歸入邊緣格
+        size (int): 每邊格數
+    """
+
+    def __init__(self, lon, lat, extent, size: int = VIEWER_GRID_SIZE):
+        self.extent = tuple(float(v) for v in extent)
+        self.size = int(size)
+        x0, x1, y0, y1 = self.extent
+        self.cell_w = (x1 - x0) / self.size
+        self.cell_h = (y1 - y0) / self.size
+
+        col = np.clip(((np.asarray(lon) - x0) / self.cell_w).astype(np.int64), 0, self.size - 1)
+        row = np.clip(((np.asarray(lat) - y0) / self.cell_h).astype(np.int64), 0, self.size - 1)
+        # 依時間順序的格子編號 (列優先), 用於時間區段的格子計數
+        self.cells = (row * self.size + col).astype(np.int32)
+        # 依格子排序 (stable: 同一格內維持時間順序)
+        self.order = np.argsort(self.cells, kind='stable')
+        self.starts = np.searchsorted(self.cells[self.order],
+                                      np.arange(self.size * self.size + 1))
+
+    def cell_range(self, view) -> tuple:
+        """
+        視窗所涵蓋的格子範圍
+
+        Args:
+            view (tuple): (min_lon, max_lon, min_lat, max_lat)
+
+        Returns:
+            tuple: (r0, r1, c0, c1), 列與行皆為 [起, 迄) 區間
+        """
+        x0, _, y0, _ = self.extent
+        c0 = int(np.floor((view[0] - x0) / self.cell_w))
+        c1 = int(np.floor((view[1] - x0) / self.cell_w)) + 1
+        r0 = int(np.floor((view[2] - y0) / self.cell_h))
+        r1 = int(np.floor((view[3] - y0) / self.cell_h)) + 1
+        clip = lambda v: min(max(v, 0), self.size)
+        return clip(r0), clip(r1), clip(c0), clip(c1)
+
+    def cell_bounds(self, r0: int, r1: int, c0: int, c1: int) -> tuple:
+        """格子範圍的經緯度邊界 (min_lon, max_lon, min_lat, max_lat)"""
+        x0, _, y0, _ = self.extent
+        return (x0 + c0 * self.cell_w, x0 + c1 * self.cell_w,
+                y0 + r0 * self.cell_h, y0 + r1 * self.cell_h)
+
+    def query(self, r0: int, r1: int, c0: int, c1: int) -> np.ndarray:
+        """
+        取得格子範圍內的點位
+
+        Returns:
+            np.ndarray: 依格子排序後的位置 (可直接索引 order 或以 order 重排的陣列)
+        """
+        if r1 <= r0 or c1 <= c0:
+            return np.empty(0, dtype=np.int64)
+        first = np.arange(r0, r1) * self.size
+        lo = self.starts[first + c0]
+        hi = self.starts[first + c1]
+        return np.concatenate([np.arange(a, b) for a, b in zip(lo, hi)])
+
+    def count(self, r0: int, r1: int, c0: int, c1: int) -> int:
+        """格子範圍內的點位數 (不分時間), 即 query() 回傳的長度"""
+        if r1 <= r0 or c1 <= c0:
+            return 0
+        first = np.arange(r0, r1) * self.size
+        return int((self.starts[first + c1] - self.starts[first + c0]).sum())
+
+    def accumulate(self, counts: np.ndarray, start: int, stop: int, sign: int = 1):
+        """將時間順序 [start, stop) 區段的點位加入 (sign=1) 或移出 (sign=-1) 格子計數"""
+        if stop <= start:
+            return
+        cells = self.cells[start:stop]
+        if len(cells) <= _ADD_AT_MAX:
+            np.add.at(counts, cells, sign)
+        else:
+            counts += sign * np.bincount(cells, minlength=len(counts))
+
+
+class RasterLayer(Artist):
+    """
+    直接以螢幕像素繪製的點陣圖層
+
+    每次繪製時依目前的視窗, 以最近鄰取樣將來源點陣對應到座標軸的每個像素,
+    再交給 renderer.draw_image(); 不經過 AxesImage 的浮點重取樣,
+    繪製成本只與螢幕像素數有關。
+
+    Args:
+        ax (Axes): 所屬座標軸 (資料座標需為經緯度, 例如 PlateCarree)
+        zorder (float): 圖層順序
+    """
+
+    def __init__(self, ax, zorder: float = 1):
+        super().__init__()
+        self.ax = ax
+        self.set_zorder(zorder)
+        self.rgba = None
+        self.bounds = None
+
+    def set_data(self, rgba: np.ndarray, bounds):
+        """
+        設定來源點陣
+
+        Args:
+            rgba (np.ndarray): (h, w, 4) uint8, 第 0 列為最南端
+            bounds (tuple): 點陣範圍 (min_lon, max_lon, min_lat, max_lat)
+        """
+        self.rgba = rgba
+        # 每個像素視為一個 uint32, 取樣時只需搬移一個元素
+        self._pixels = np.ascontiguousarray(rgba).view(np.uint32)[..., 0]
+        self.bounds = tuple(bounds)
+        self.stale = True
+
+    def draw(self, renderer):
+        if not self.get_visible() or self.rgba is None:
+            return
+        bbox = self.ax.bbox
+        width, height = int(round(bbox.width)), int(round(bbox.height))
+        if width <= 0 or height <= 0:
+            return
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        b0, b1, b2, b3 = self.bounds
+        src_h, src_w = self.rgba.shape[:2]
+
+        # 每個螢幕像素中心對應的來源行列 (與 draw_image 相同, 第 0 列為最下方)
+        xs = x0 + (np.arange(width) + 0.5) * (x1 - x0) / width
+        ys = y0 + (np.arange(height) + 0.5) * (y1 - y0) / height
+        cols = np.floor((xs - b0) / (b1 - b0) * src_w).astype(np.int64)
+        rows = np.floor((ys - b2) / (b3 - b2) * src_h).astype(np.int64)
+        col_ok = (cols >= 0) & (cols < src_w)
+        row_ok = (rows >= 0) & (rows < src_h)
+        if not col_ok.any() or not row_ok.any():
+            return
+
+        # 只取與來源重疊的矩形區域
+        c_idx = np.flatnonzero(col_ok)
+        r_idx = np.flatnonzero(row_ok)
+        pixels = self._pixels.take(rows[r_idx], axis=0).take(cols[c_idx], axis=1)
+        image = pixels.view(np.uint8).reshape(len(r_idx), len(c_idx), 4)
+        gc = renderer.new_gc()
+        gc.set_clip_rectangle(bbox)
+        renderer.draw_image(gc, bbox.x0 + c_idx[0], bbox.y0 + r_idx[0], image)
+        gc.restore()
+        self.stale = False
+
+
+@lru_cache(maxsize=256)
+def _text_tile(text: str, prop: FontProperties, color: str, dpi: float):
+    """
+    將一段文字點陣化為 RGBA 圖塊 (第 0 列為最下方)
+
+    Returns:
+        tuple: (圖塊, 基線以下的像素數)
+    """
+    width, height, descent = RendererAgg(1, 1, dpi).get_text_width_height_descent(
+        text, prop, ismath=False)
+    w, h = int(np.ceil(width)) + 2, int(np.ceil(height)) + 2
+    renderer = RendererAgg(w, h, dpi)
+    gc = renderer.new_gc()
+    gc.set_foreground(color)
+    renderer.draw_text(gc, 1, h - 1 - descent, text, prop, 0)
+    gc.restore()
+    tile = np.asarray(renderer.buffer_rgba())[::-1].copy()
+    return tile, descent + 1
+
+
+class TextLayer(Artist):
+    """
+    以快取圖塊繪製的單行文字 (標題、滑桿標籤)
+
+    文字分成數段, 每段第一次出現時點陣化後快取; 之後重繪只貼上圖塊。
+    中文字型的字形排版與缺字替代很慢, 固定的中文段落只需排版一次,
+    每次操作改變的日期、件數等 ASCII 段落排版成本很低。
+
+    Args:
+        ax (Axes): 定位所依據的座標軸
+        x, y (float): 錨點 (座標軸比例座標)
+        ha (str): 水平對齊 'left' / 'center' / 'right'
+        va (str): 垂直對齊 'bottom' / 'center'
+        pad (float): 與錨點的垂直距離 (點)
+        prop (FontProperties): 字型 (含字級)
+    """
+
+    def __init__(self, ax, x: float, y: float, ha: str = 'center', va: str = 'bottom',
+                 pad: float = 0, prop: FontProperties = None):
+        super().__init__()
+        self.ax = ax
+        self.anchor = (x, y)
+        self.ha, self.va, self.pad = ha, va, pad
+        self.prop = prop if prop is not None else FontProperties()
+        self.color = rcParams['text.color']
+        self.parts = ()
+
+    def set_parts(self, *parts: str):
+        """設定文字段落 (依序相接)"""
+        self.parts = tuple(part for part in parts if part)
+        self.stale = True
+
+    def get_text(self) -> str:
+        return ''.join(self.parts)
+
+    def draw(self, renderer):
+        if not self.get_visible() or not self.parts:
+            return
+        dpi = renderer.dpi
+        tiles = [_text_tile(part, self.prop, self.color, dpi) for part in self.parts]
+        width = sum(tile.shape[1] for tile, _ in tiles)
+        descent = max(d for _, d in tiles)
+        ascent = max(tile.shape[0] - d for tile, d in tiles)
+
+        x, y = self.ax.transAxes.transform(self.anchor)
+        x -= {'left': 0, 'center': width / 2, 'right': width}[self.ha]
+        if self.va == 'bottom':
+            baseline = y + self.pad * dpi / 72 + descent
+        else:
+            baseline = y + (descent - ascent) / 2
+        gc = renderer.new_gc()
+        for tile, d in tiles:
+            renderer.draw_image(gc, round(x), round(baseline - d), tile)
+            x += tile.shape[1]
+        gc.restore()
+        self.stale = False
+
+
+class BeforeDraw(Artist):
+    """
+    不繪製任何內容的圖層, 在圖面繪製開始時呼叫 callback
+
+    加入圖面 (zorder 最低) 後會先於座標軸與標題執行, 用來在每次繪製前
+    依最終的視窗範圍更新圖層; set_xlim() 與 set_ylim() 各自觸發的事件
+    只看到一半更新的範圍, 不適合做這件事。
+    """
+
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+        self.set_zorder(-np.inf)
+
+    def draw(self, renderer):
+        self.callback()
+        self.stale = False
+
+
+class AccidentViewer:
+    """
+    互動式事故地圖
+
+    Args:
+        store (CoordStore): 依時間排序的座標陣列
+        gdf_boundary (GeoDataFrame): WGS84 村里界
+        fig (Figure, optional): 圖面; 預設建立在 Agg 畫布上 (不需視窗)
+        window (int, optional): 顯示的天數; None 為從第一天累積到滑桿日期
+        grid_size (int): 空間索引每邊格數
+        max_markers (int): 視窗內事故數不超過此值時畫個別點位
+    """
+
+    def __init__(self, store: CoordStore, gdf_boundary, fig: Figure = None,
+                 window: int = None, grid_size: int = VIEWER_GRID_SIZE,
+                 max_markers: int = VIEWER_MAX_MARKERS):
+        self.store = store
+        self.window = window
+        self.max_markers = max_markers
+        self.extent = square_extent(gdf_boundary.total_bounds)
+
+        # 空間索引與依格子排序的點位屬性 (查詢結果是連續切片)
+        self.index = GridIndex(store.lon, store.lat, self.extent, grid_size)
+        order = self.index.order
+        self.lon = np.asarray(store.lon)[order]
+        self.lat = np.asarray(store.lat)[order]
+        self.case = np.asarray(store.case)[order]
+        day = np.repeat(np.arange(len(store.dates), dtype=np.int32), np.diff(store.offsets))
+        self.day = day[order]
+
+        if fig is None:
+            fig = Figure(figsize=(10, 10.8))
+            FigureCanvasAgg(fig)
+        self.fig = fig
+        self.ax = fig.add_axes([0.04, 0.1, 0.92, 0.85], projection=ccrs.PlateCarree())
+
+        # 底圖: 含界線的點陣 (範圍大時), 或只有填色的點陣 + 視窗內的向量界線 (放大後);
+        # 各村里填色相接, 放大後的填色點陣只在市界處呈鋸齒
+        self.basemap = RasterLayer(self.ax, zorder=1)
+        self.basemap.set_data(
+            rasterize_boundary(gdf_boundary, self.extent, BASEMAP_RASTER_PX)[::-1],
+            self.extent
+        )
+        self.ax.add_artist(self.basemap)
+        self.basemap_fill = RasterLayer(self.ax, zorder=1)
+        self.basemap_fill.set_data(
+            rasterize_boundary(gdf_boundary, self.extent, BASEMAP_RASTER_PX,
+                               edgecolor='none')[::-1],
+            self.extent
+        )
+        self.ax.add_artist(self.basemap_fill)
+        self._polygons = [
+            np.asarray(polygon.exterior.coords)
+            for geom in gdf_boundary.geometry
+            for polygon in getattr(geom, 'geoms', [geom])
+        ]
+        self._polygon_bounds = np.array([
+            (xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max())
+            for xy in self._polygons
+        ])
+        # PlateCarree 的資料座標即經緯度, 直接使用 transData
+        self.boundary = PolyCollection([], transform=self.ax.transData, zorder=1,
+                                       facecolor='none', edgecolor='gray',
+                                       linewidth=0.5, alpha=0.3)
+        self.ax.add_collection(self.boundary, autolim=False)
+
+        self.density = RasterLayer(self.ax, zorder=2)
+        self.ax.add_artist(self.density)
+        self._density_cmap = colormaps[DENSITY_CMAP]
+        self.markers = {
+            case: self.ax.scatter(np.empty(0), np.empty(0), transform=ccrs.PlateCarree(),
+                                  label=f'{case}類事故', **style)
+            for case, style in MARKER_STYLES.items()
+        }
+        # 標題與滑桿標籤含中文, 以快取圖塊繪製, 每次操作不必重新排版中文字
+        title_prop = font_prop.copy()
+        title_prop.set_size(13)
+        self.title = TextLayer(self.ax, 0.5, 1.0, ha='center', va='bottom',
+                               pad=rcParams['axes.titlepad'], prop=title_prop)
+        fig.add_artist(self.title)
+
+        slider_ax = fig.add_axes([0.15, 0.03, 0.7, 0.025])
+        self.slider = Slider(slider_ax, '', 0, max(len(store.dates) - 1, 1),
+                             valinit=len(store.dates) - 1, valstep=1)
+        label_prop = font_prop.copy()
+        label_prop.set_size(rcParams['font.size'])
+        self.slider_label = TextLayer(slider_ax, -0.02, 0.5, ha='right', va='center',
+                                      prop=label_prop)
+        self.slider_label.set_parts('日期')
+        fig.add_artist(self.slider_label)
+        # 由 on_changed 決定何時重繪, 避免 set_val() 在 Agg 畫布上同步重繪一次
+        self.slider.drawon = False
+        self.slider.on_changed(self._on_slider)
+
+        # 時間範圍 (依時間排序的 [start, stop)) 與其格子計數
+        self._span = (0, 0)
+        self._counts = np.zeros(self.index.size * self.index.size, dtype=np.int64)
+        self._last_view = None
+        self.mode = None
+        self.n_visible = 0
+        self.update_times = []
+
+        self.ax.set_extent(self.extent, crs=ccrs.PlateCarree())
+        # 之後由使用者操作決定範圍; 更新影像範圍時不要自動縮放
+        self.ax.set_autoscale_on(False)
+        # 視窗改變 (平移/縮放/工具列) 後, 在下一次繪製前更新一次圖層
+        fig.add_artist(BeforeDraw(self.refresh))
+        self.set_day(len(store.dates) - 1)
+
+    # ---------- 時間 ----------
+
+    def set_day(self, day: int):
+        """
+        將時間範圍設為第 day 天 (依 window 往前累積), 並更新格子計數
+
+        Args:
+            day (int): 日期索引 (store.dates 的位置)
+        """
+        offsets = self.store.offsets
+        day = min(max(int(day), 0), len(self.store.dates) - 1)
+        first = 0 if self.window is None else max(day - self.window + 1, 0)
+        self.day_range = (first, day)
+        start, stop = int(offsets[first]), int(offsets[day + 1])
+
+        old_start, old_stop = self._span
+        if stop <= old_start or start >= old_stop:
+            # 沒有重疊: 重新計數
+            self._counts[:] = 0
+            self.index.accumulate(self._counts, start, stop)
+        else:
+            # 只處理兩端新增或移出的區段
+            self.index.accumulate(self._counts, start, old_start, +1)
+            self.index.accumulate(self._counts, old_start, start, -1)
+            self.index.accumulate(self._counts, old_stop, stop, +1)
+            self.index.accumulate(self._counts, stop, old_stop, -1)
+        self._span = (start, stop)
+
+        if int(self.slider.val) != day:
+            self.slider.eventson = False
+            self.slider.set_val(day)
+            self.slider.eventson = True
+        self.slider.valtext.set_text(str(self.store.dates[day]))
+        self._last_view = None
+        self.refresh()
+
+    def _on_slider(self, value):
+        self.set_day(int(value))
+        self.fig.canvas.draw_idle()
+
+    # ---------- 視窗 ----------
+
+    def view(self) -> tuple:
+        """目前的視窗範圍 (min_lon, max_lon, min_lat, max_lat)"""
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        return x0, x1, y0, y1
+
+    def set_view(self, view):
+        """設定視窗範圍 (min_lon, max_lon, min_lat, max_lat); 圖層在下一次繪製前更新"""
+        self.ax.set_xlim(view[0], view[1])
+        self.ax.set_ylim(view[2], view[3])
+
+    def zoom(self, factor: float, center=None):
+        """
+        以 center 為中心縮放 (factor < 1 為放大)
+
+        Args:
+            factor (float): 視窗寬高的倍率
+            center (tuple, optional): (lon, lat), 預設為視窗中心
+        """
+        x0, x1, y0, y1 = self.view()
+        cx, cy = center if center is not None else ((x0 + x1) / 2, (y0 + y1) / 2)
+        self.set_view((cx - (cx - x0) * factor, cx + (x1 - cx) * factor,
+                       cy - (cy - y0) * factor, cy + (y1 - cy) * factor))
+
+    def pan(self, dx: float, dy: float):
+        """以視窗寬高的比例平移"""
+        x0, x1, y0, y1 = self.view()
+        w, h = x1 - x0, y1 - y0
+        self.set_view((x0 + dx * w, x1 + dx * w, y0 + dy * h, y1 + dy * h))
+
+    def refresh(self):
+        """依目前的視窗與時間範圍更新密度圖或點位圖層 (不重繪; 視窗未變時不做事)"""
+        view = self.view()
+        if view == self._last_view:
+            return
+        self._last_view = view
+        start = time.perf_counter()
+
+        self._show_basemap(view)
+        r0, r1, c0, c1 = self.index.cell_range(view)
+        size = self.index.size
+        visible = self._counts.reshape(size, size)[r0:r1, c0:c1]
+        self.n_visible = int(visible.sum())
+
+        if self.n_visible <= self.max_markers:
+            self._show_markers(view, r0, r1, c0, c1)
+        else:
+            self._show_density(visible, r0, r1, c0, c1)
+
+        first, last = self.day_range
+        period = (str(self.store.dates[last]) if first == last
+                  else f'{self.store.dates[first]} ~ {self.store.dates[last]}')
+        mode = '點位' if self.mode == 'markers' else '密度'
+        self.title.set_parts('台北市交通事故 ', period, ' (視窗內 ', f'{self.n_visible:,}',
+                             ' 件, ', mode, ')')
+        self.update_times.append(time.perf_counter() - start)
+
+    def _show_basemap(self, view):
+        full_width = self.extent[1] - self.extent[0]
+        raster_px = BASEMAP_RASTER_PX * (view[1] - view[0]) / full_width
+        zoomed = raster_px < self.ax.bbox.width / 2
+        self.basemap.set_visible(not zoomed)
+        self.basemap_fill.set_visible(zoomed)
+        if not zoomed:
+            self.boundary.set_verts([])
+            return
+        # 只畫外框與視窗相交的村里界線
+        b = self._polygon_bounds
+        hit = np.flatnonzero((b[:, 1] >= view[0]) & (b[:, 0] <= view[1])
+                             & (b[:, 3] >= view[2]) & (b[:, 2] <= view[3]))
+        self.boundary.set_verts([self._polygons[i] for i in hit])
+
+    def _show_markers(self, view, r0, r1, c0, c1):
+        start, stop = self._span
+        if stop - start < self.index.count(r0, r1, c0, c1):
+            # 時間範圍 (例如 window 天) 的點位比視窗內格子的點位少:
+            # 直接取依時間排序的切片, 只需以視窗裁切
+            lon = np.asarray(self.store.lon[start:stop])
+            lat = np.asarray(self.store.lat[start:stop])
+            case = np.asarray(self.store.case[start:stop])
+            keep = (lon >= view[0]) & (lon <= view[1]) & (lat >= view[2]) & (lat <= view[3])
+        else:
+            pos = self.index.query(r0, r1, c0, c1)
+            first, last = self.day_range
+            day = self.day[pos]
+            lon = self.lon[pos]
+            lat = self.lat[pos]
+            case = self.case[pos]
+            keep = ((day >= first) & (day <= last)
+                    & (lon >= view[0]) & (lon <= view[1]) & (lat >= view[2]) & (lat <= view[3]))
+        case = case[keep]
+        xy = np.column_stack([lon[keep], lat[keep]])
+        for case_type, artist in self.markers.items():
+            artist.set_offsets(xy[case == CASE_CODES[case_type]])
+        self.density.set_visible(False)
+        self.mode = 'markers'
+
+    def _show_density(self, visible, r0, r1, c0, c1):
+        # 格子數遠多於螢幕像素時先合併成較粗的格子
+        width_px = self.ax.bbox.width
+        factor = max(int(max(visible.shape) // max(width_px / 2, 1)), 1)
+        if factor > 1:
+            h, w = visible.shape
+            h, w = h // factor * factor, w // factor * factor
+            visible = visible[:h, :w].reshape(h // factor, factor, w // factor, factor).sum(axis=(1, 3))
+            r1, c1 = r0 + h, c0 + w
+        # 對數色階直接轉成 RGBA, 繪製時不必再經過 Normalize 與色階查表
+        level = np.log1p(visible) / np.log1p(max(int(visible.max()), 1))
+        rgba = self._density_cmap(level, bytes=True)
+        rgba[..., 3] = np.where(visible > 0, int(DENSITY_ALPHA * 255), 0)
+        self.density.set_data(rgba, self.index.cell_bounds(r0, r1, c0, c1))
+        self.density.set_visible(True)
+        for artist in self.markers.values():
+            artist.set_offsets(np.empty((0, 2)))
+        self.mode = 'density'
+
+    # ---------- 互動 ----------
+
+    def connect(self):
+        """連接滑鼠滾輪縮放 (平移與框選縮放使用 matplotlib 工具列)"""
+        def on_scroll(event):
+            if event.inaxes is not self.ax:
+                return
+            factor = 1 / SCROLL_ZOOM if event.button == 'up' else SCROLL_ZOOM
+            self.zoom(factor, center=(event.xdata, event.ydata))
+            self.fig.canvas.draw_idle()
+
+        self.fig.canvas.mpl_connect('scroll_event', on_scroll)
+
+    def draw(self) -> float:
+        """重繪畫布並回傳耗時 (秒)"""
+        start = time.perf_counter()
+        self.fig.canvas.draw()
+        return time.perf_counter() - start
+
+
+def load_viewer_store() -> CoordStore:
+    """讀取座標陣列; 尚未產生時由處理後資料建立 (只在記憶體中)"""
+    store = load_coord_store()
+    if store is None:
+        store = build_coord_store(
+            read_processed_data(columns=['acc_dt', 'case_type', 'longitude', 'latitude'])
+        )
+    return store
+
+
+def synthetic_store(store: CoordStore, n_points: int, seed: int = 0) -> CoordStore:
+    """
+    以實際點位重抽樣並加上約 50 公尺的抖動, 產生指定筆數的座標陣列 (效能測試用)
+
+    Args:
+        store (CoordStore): 實際的座標陣列
+        n_points (int): 筆數
+        seed (int): 亂數種子
+
+    Returns:
+        CoordStore: 依時間排序的合成座標陣列
+    """
+    rng = np.random.default_rng(seed)
+    idx = np.sort(rng.integers(0, store.size, n_points))
+    jitter = rng.normal(0, 0.0005, size=(2, n_points)).astype(np.float32)
+    day_of = np.repeat(np.arange(len(store.dates)), np.diff(store.offsets))[idx]
+    counts = np.bincount(day_of, minlength=len(store.dates))
+    return CoordStore(
+        lon=np.asarray(store.lon)[idx] + jitter[0],
+        lat=np.asarray(store.lat)[idx] + jitter[1],
+        case=np.asarray(store.case)[idx],
+        ts=np.asarray(store.ts)[idx],
+        dates=np.asarray(store.dates),
+        offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+    )
+
+
+def benchmark_script(viewer: AccidentViewer, center) -> list:
+    """
+    腳本化的操作序列: 逐步放大、平移、拖動時間滑桿, 再縮小回全圖
+
+    Args:
+        viewer (AccidentViewer): 檢視器
+        center (tuple): 放大的中心點 (lon, lat)
+
+    Returns:
+        list: (操作名稱, 無參數函式)
+    """
+    n_days = len(viewer.store.dates)
+    steps = [('zoom-in', lambda: viewer.zoom(0.7, center)) for _ in range(12)]
+    steps += [('pan', lambda: viewer.pan(0.1, 0.05)) for _ in range(10)]
+    steps += [('slider', lambda d=d: viewer.set_day(d))
+              for d in np.linspace(0, n_days - 1, 20).astype(int)]
+    steps += [('zoom-out', lambda: viewer.zoom(1 / 0.7)) for _ in range(12)]
+    steps += [('slider', lambda d=d: viewer.set_day(d))
+              for d in np.linspace(0, n_days - 1, 20).astype(int)]
+    return steps
+
+
+def run_benchmark(n_points: int = None, window: int = None,
+                  budget_ms: float = VIEWER_FRAME_BUDGET_MS):
+    """
+    在 Agg 畫布上執行腳本化操作, 量測每次操作 (更新圖層 + 重繪) 的耗時
+
+    Args:
+        n_points (int, optional): 以合成資料測試的筆數; None 使用實際資料
+        window (int, optional): 顯示的天數 (None 為累積)
+        budget_ms (float): 目標重繪時間 (毫秒)
+    """
+    print("\n" + "="*60)
+    print("互動檢視器效能測試 (Agg)")
+    print("="*60 + "\n")
+
+    try:
+        gdf_boundary = load_boundary_wgs84()
+        store = load_viewer_store()
+    except FileNotFoundError as e:
+        print(f"✗ 讀取資料失敗: {e}")
+        print(f"  請確認 {PROCESSED_DATA_FILE} 存在 (例如先執行: python main.py)")
+        return
+    if n_points:
+        store = synthetic_store(store, n_points)
+    print(f"✓ 資料: {store.size:,} 筆, {len(store.dates)} 天")
+
+    start = time.perf_counter()
+    viewer = AccidentViewer(store, gdf_boundary, window=window)
+    viewer.draw()
+    print(f"✓ 建立索引與第一次繪製: {time.perf_counter() - start:.2f} 秒")
+
+    center = (float(np.median(store.lon)), float(np.median(store.lat)))
+    results = {}
+    modes = {}
+    for name, action in benchmark_script(viewer, center):
+        t0 = time.perf_counter()
+        action()
+        viewer.fig.canvas.draw()
+        results.setdefault(name, []).append((time.perf_counter() - t0) * 1000)
+        modes.setdefault(name, set()).add(viewer.mode)
+
+    print(f"\n  {'操作':<10}{'次數':>6}{'平均(ms)':>10}{'p95(ms)':>10}{'最大(ms)':>10}  模式")
+    all_ms = []
+    for name, ms in results.items():
+        ms = np.asarray(ms)
+        all_ms.append(ms)
+        print(f"  {name:<10}{len(ms):>6}{ms.mean():>10.1f}{np.percentile(ms, 95):>10.1f}"
+              f"{ms.max():>10.1f}  {'/'.join(sorted(modes[name]))}")
+    all_ms = np.concatenate(all_ms)
+    update_ms = np.asarray(viewer.update_times) * 1000
+    print(f"\n  圖層更新 (不含繪製): 平均 {update_ms.mean():.1f} ms, 最大 {update_ms.max():.1f} ms")
+    within = np.mean(all_ms <= budget_ms) * 100
+    mark = '✓' if np.percentile(all_ms, 95) <= budget_ms else '✗'
+    print(f"{mark} p95 {np.percentile(all_ms, 95):.1f} ms "
+          f"(目標 {budget_ms:g} ms, {within:.0f}% 的操作在目標內)")
+
+
+def main(window: int = None):
+    """開啟互動視窗"""
+    import matplotlib.pyplot as plt
+
+    try:
+        gdf_boundary = load_boundary_wgs84()
+        store = load_viewer_store()
+    except FileNotFoundError as e:
+        print(f"✗ 讀取資料失敗: {e}")
+        print(f"  請確認 {PROCESSED_DATA_FILE} 存在 (例如先執行: python main.py)")
+        return
+
+    fig = plt.figure(figsize=(10, 10.8))
+    viewer = AccidentViewer(store, gdf_boundary, fig=fig, window=window)
+    viewer.connect()
+    print(f"✓ 已載入 {store.size:,} 筆事故; 以工具列平移/框選縮放, 滾輪縮放, 滑桿切換日期")
+    plt.show()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="台北市交通事故互動地圖")
+    parser.add_argument('--window', type=int, default=None,
+                        help="顯示的天數 (預設從第一天累積)")
+    parser.add_argument('--benchmark', action='store_true',
+                        help="在 Agg 畫布上執行腳本化操作並回報重繪時間")
+    parser.add_argument('--points', type=int, default=None,
+                        help="效能測試以合成資料擴增到的筆數 (例如 1000000)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(n_points=args.points, window=args.window)
+    else:
+        main(window=args.window)
@@ -12,32 +12,24 @@ if __name__ == "__main__":
     project_root = Path(__file__).parent.parent
     sys.path.insert(0, str(project_root))
 
-import pandas as pd
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-from matplotlib.font_manager import FontProperties
-from src.config import PROCESSED_DATA_DIR, FIGURES_DIR
-
-# 配置中文字型
-font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
-font_prop = FontProperties(fname=font_path)
+from src.config import FIGURES_DIR, HOTSPOT_TOP_N
+from src.crs import load_boundary_wgs84
+from src.store import read_processed_data
+from src.coord_store import load_coord_store
+from src.hotspot import detect_hotspots
+from src.render import MapRenderContext, CASE_STYLES
 
 
 def load_taipei_boundary():
     """
-    載入台北市行政區邊界 Shapefile 並轉換為 WGS84
+    載入台北市行政區邊界 (WGS84), 重新投影的結果已快取
     (與 viz_raw_map.py 共用的函數)
     
     Returns:
         GeoDataFrame: 台北市邊界資料 (WGS84 座標系統)
     """
-    shapefile_path = 'data/taipei/G97_A_CAVLGE_P.shp'
-    
     try:
-        gdf = gpd.read_file(shapefile_path)
-        gdf_wgs84 = gdf.to_crs(epsg=4326)
-        return gdf_wgs84
+        return load_boundary_wgs84()
     except Exception as e:
         print(f"✗ 讀取 Shapefile 失敗: {e}")
         return None
@@ -46,14 +38,19 @@ def load_taipei_boundary():
 def load_accident_data():
     """
     載入處理過的交通事故資料
+    優先使用 ETL 產生的座標陣列 (memory-map), 不存在時才讀取 Parquet (含增量片段)
     
     Returns:
         DataFrame: 包含事故經緯度的資料
     """
-    parquet_file = PROCESSED_DATA_DIR / 'taipei_113_clean.parquet'
+    store = load_coord_store()
+    if store is not None:
+        df = store.to_frame()
+        print(f"✓ 成功讀取 {len(df)} 筆事故座標 (座標陣列)")
+        return df
     
     try:
-        df = pd.read_parquet(parquet_file)
+        df = read_processed_data(columns=['longitude', 'latitude', 'case_type'])
         print(f"✓ 成功讀取 {len(df)} 筆事故資料")
         return df
     except Exception as e:
@@ -61,12 +58,17 @@ def load_accident_data():
         return None
 
 
-def create_accident_map():
+def create_accident_map(show_hotspots: bool = False, top_n: int = HOTSPOT_TOP_N):
     """
     創建台北市交通事故分布地圖
     - 基於 viz_raw_map.py 的粉紅色底圖
     - 加入 A1/A2 事故點位
+    - 可選: 疊加事故熱點圖層 (依事故數排名前 top_n 名)
     - 正方形畫布 (14x14)
+    
+    Args:
+        show_hotspots (bool): 是否疊加事故熱點圖層
+        top_n (int): 標示的熱點數量
     """
     print("\n" + "="*60)
     print("創建台北市交通事故分布地圖")
@@ -80,112 +82,50 @@ def create_accident_map():
         print("✗ 無法創建地圖")
         return
     
-    # 計算地圖範圍,確保 1:1 正方形
-    bounds = gdf_boundary.total_bounds
-    lon_range = bounds[2] - bounds[0]
-    lat_range = bounds[3] - bounds[1]
-    
-    lon_center = (bounds[0] + bounds[2]) / 2
-    lat_center = (bounds[1] + bounds[3]) / 2
-    
-    max_range = max(lon_range, lat_range)
-    margin = max_range * 0.05
-    square_size = max_range + margin * 2
-    
-    # 創建正方形畫布 (與 viz_raw_map.py 一致)
-    fig = plt.figure(figsize=(14, 14))
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-    
-    # 設定 1:1 aspect ratio
-    ax.set_aspect('equal')
-    
+    # 圖面 (正方形 14x14 畫布、範圍、網格線、粉紅色底圖) 由無頭渲染器建立
     print("繪製地圖...")
-    
-    # 1. 繪製基礎台北市邊界 (與 viz_raw_map.py 相同設定)
     print("  - 繪製台北市邊界 (粉紅色底圖)")
-    gdf_boundary.plot(
-        ax=ax,
-        facecolor='pink',
-        edgecolor='gray',  # 淺灰色邊框
-        linewidth=0.5,          # 更細的線條
-        alpha=0.3,              # 透明度
-        transform=ccrs.PlateCarree()
-    )
-    
-    # 2. 繪製交通事故點位
-    print("  - 繪製交通事故點位")
-    
-    # A1 類事故 (紅色,較大點)
-    df_a1 = df_accidents[df_accidents['case_type'] == 'A1']
-    ax.scatter(
-        df_a1['longitude'], 
-        df_a1['latitude'],
-        c='red',
-        s=30,               # 較大的點
-        alpha=0.7,
-        label=f'A1類事故 ({len(df_a1)}件)',
-        transform=ccrs.PlateCarree(),
-        zorder=3,
-        edgecolors='darkred',
-        linewidths=0.5
-    )
-    
-    # A2 類事故 (橘色,較小點)
-    df_a2 = df_accidents[df_accidents['case_type'] == 'A2']
-    ax.scatter(
-        df_a2['longitude'], 
-        df_a2['latitude'],
-        c='orange',
-        s=8,                # 較小的點
-        alpha=0.4,
-        label=f'A2類事故 ({len(df_a2)}件)',
-        transform=ccrs.PlateCarree(),
-        zorder=2
-    )
-    
-    # 3. 設定正方形地圖範圍 (與 viz_raw_map.py 一致)
-    ax.set_extent([
-        lon_center - square_size/2,
-        lon_center + square_size/2,
-        lat_center - square_size/2,
-        lat_center + square_size/2
-    ], crs=ccrs.PlateCarree())
-    
-    # 4. 加入淺色網格線 (與 viz_raw_map.py 一致)
-    gl = ax.gridlines(
-        draw_labels=True,
-        linewidth=0.3,
-        alpha=0.3,
-        linestyle='--',
-        color='gray'
-    )
-    gl.top_labels = False
-    gl.right_labels = False
-    
-    # 5. 設定標題
-    ax.set_title(
-        '113年台北市交通事故分布圖',
-        fontproperties=font_prop,
-        fontsize=16,
-        pad=20
-    )
-    
-    # 6. 圖例
-    ax.legend(
-        loc='upper right',
-        prop=font_prop,
-        framealpha=0.9,
-        fontsize=11
-    )
-    
-    # 7. 確保輸出目錄存在
-    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # 8. 儲存圖片
     output_path = FIGURES_DIR / 'taipei_accident_map.png'
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300)  # 移除 bbox_inches='tight' 保持正方形
-    plt.close()
+    
+    with MapRenderContext(gdf_boundary, dpi=300) as ctx:
+        # 繪製交通事故點位
+        print("  - 繪製交通事故點位")
+        
+        # A1 類事故 (紅色,較大點); A2 類事故 (橘色,較小點)
+        df_a1 = df_accidents[df_accidents['case_type'] == 'A1']
+        df_a2 = df_accidents[df_accidents['case_type'] == 'A2']
+        for case, df_case in (('A1', df_a1), ('A2', df_a2)):
+            ctx.scatter(
+                df_case['longitude'],
+                df_case['latitude'],
+                label=f'{case}類事故 ({len(df_case)}件)',
+                **CASE_STYLES[case]
+            )
+        
+        # 疊加事故熱點 (圓圈大小依事故數縮放)
+        if show_hotspots:
+            print("  - 繪製事故熱點")
+            hotspots = detect_hotspots(df_accidents).head(top_n)
+            if len(hotspots) > 0:
+                sizes = 80 + 720 * hotspots['n_accidents'] / hotspots['n_accidents'].max()
+                ctx.scatter(
+                    hotspots['longitude'],
+                    hotspots['latitude'],
+                    s=sizes,
+                    facecolors='none',
+                    edgecolors='purple',
+                    linewidths=1.5,
+                    label=f'事故熱點 (前{len(hotspots)}名)',
+                    zorder=4
+                )
+                for row in hotspots.itertuples():
+                    ctx.text(
+                        row.longitude, row.latitude, str(row.rank),
+                        fontsize=7, color='purple', ha='center', va='center', zorder=5
+                    )
+        
+        # 標題、圖例並儲存圖片 (300 DPI, 保持正方形)
+        ctx.save(output_path, title='113年台北市交通事故分布圖')
     
     print(f"\n✓ 事故分布地圖已儲存至: {output_path}")
     print(f"  - 畫布大小: 14x14 英吋 (正方形)")
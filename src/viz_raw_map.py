@@ -15,36 +15,26 @@ if __name__ == "__main__":
     project_root = Path(__file__).parent.parent
     sys.path.insert(0, str(project_root))
 
-import geopandas as gpd
-import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
-from matplotlib.font_manager import FontProperties
-from src.config import FIGURES_DIR
-
-# 配置中文字型
-font_path = '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc'
-font_prop = FontProperties(fname=font_path)
+from src.config import FIGURES_DIR, BOUNDARY_WGS84_FILE
+from src.crs import load_boundary_wgs84
+from src.render import MapRenderContext
 
 
 def load_taipei_boundary():
     """
-    載入台北市行政區邊界 Shapefile 並轉換為 WGS84
+    載入台北市行政區邊界 Shapefile 並轉換為 WGS84 (結果已快取)
     
     Returns:
         GeoDataFrame: 台北市邊界資料 (WGS84 座標系統)
     """
-    shapefile_path = 'data/taipei/G97_A_CAVLGE_P.shp'
-    
     try:
-        # 讀取 Shapefile (原始座標系統: EPSG:3826 TWD97 TM2)
-        gdf = gpd.read_file(shapefile_path)
-        
-        # 轉換座標系統到 WGS84 (EPSG:4326) - Cartopy PlateCarree 使用的座標系統
-        gdf_wgs84 = gdf.to_crs(epsg=4326)
+        # 原始 Shapefile 為 EPSG:3826 TWD97 TM2; 轉換到 WGS84 (EPSG:4326) 的結果
+        # 第一次產生後快取為 GeoParquet, 之後不必再重新投影
+        gdf_wgs84 = load_boundary_wgs84()
         
         print(f"✓ 成功讀取台北市邊界")
-        print(f"  - 原始座標系統: {gdf.crs}")
-        print(f"  - 轉換為: WGS84 (EPSG:4326)")
+        print(f"  - 原始座標系統: EPSG:3826 (TWD97 TM2)")
+        print(f"  - 轉換為: WGS84 (EPSG:4326), 快取於 {BOUNDARY_WGS84_FILE.name}")
         print(f"  - 包含行政里數: {len(gdf_wgs84)}")
         
         bounds = gdf_wgs84.total_bounds
@@ -79,78 +69,24 @@ def create_raw_map():
         print("✗ 無法創建地圖")
         return
     
-    # 計算地圖範圍,確保 1:1 正方形
-    bounds = gdf_boundary.total_bounds
-    lon_range = bounds[2] - bounds[0]  # 經度範圍
-    lat_range = bounds[3] - bounds[1]  # 緯度範圍
-    
-    # 計算中心點
-    lon_center = (bounds[0] + bounds[2]) / 2
-    lat_center = (bounds[1] + bounds[3]) / 2
-    
-    # 使用較大的範圍作為正方形邊長
-    max_range = max(lon_range, lat_range)
-    margin = max_range * 0.05  # 5% 邊距
-    square_size = max_range + margin * 2
-    
-    # 創建正方形畫布
-    fig = plt.figure(figsize=(14, 14))
-    ax = fig.add_subplot(1, 1, 1, projection=ccrs.PlateCarree())
-    
-    # 設定 1:1 aspect ratio
-    ax.set_aspect('equal')
-    
     print("\n繪製地圖...")
     
-    # 繪製台北市邊界
+    # 無頭渲染器建立正方形畫布、地圖範圍 (5% 邊距) 與淺色網格線,
+    # 並繪製台北市邊界:
     # - facecolor: 粉紅色填充
     # - edgecolor: 淺灰色邊框 (更淡)
     # - linewidth: 更細的線條
     # - alpha: 透明度
-    gdf_boundary.plot(
-        ax=ax,
+    output_path = FIGURES_DIR / 'taipei_raw_map.png'
+    basemap_style = dict(
         facecolor='pink',
         edgecolor='lightgray',  # 淺灰色邊框
         linewidth=0.3,          # 更細的線條
-        alpha=0.3,              # 透明度
-        transform=ccrs.PlateCarree()
+        alpha=0.3               # 透明度
     )
-    
-    # 設定正方形地圖範圍
-    ax.set_extent([
-        lon_center - square_size/2,  # min longitude
-        lon_center + square_size/2,  # max longitude
-        lat_center - square_size/2,  # min latitude
-        lat_center + square_size/2   # max latitude
-    ], crs=ccrs.PlateCarree())
-    
-    # 加入淺色網格線
-    gl = ax.gridlines(
-        draw_labels=True,
-        linewidth=0.3,
-        alpha=0.3,
-        linestyle='--',
-        color='gray'
-    )
-    gl.top_labels = False
-    gl.right_labels = False
-    
-    # 設定標題
-    ax.set_title(
-        '台北市行政區邊界圖',
-        fontproperties=font_prop,
-        fontsize=16,
-        pad=20
-    )
-    
-    # 確保輸出目錄存在
-    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
-    
-    # 儲存圖片
-    output_path = FIGURES_DIR / 'taipei_raw_map.png'
-    plt.tight_layout()
-    plt.savefig(output_path, dpi=300)  # 移除 bbox_inches='tight' 保持正方形
-    plt.close()
+    with MapRenderContext(gdf_boundary, dpi=300, basemap_style=basemap_style) as ctx:
+        # 設定標題並儲存圖片 (保持正方形)
+        ctx.save(output_path, title='台北市行政區邊界圖', legend=False)
     
     print(f"\n✓ 基礎地圖已儲存至: {output_path}")
     print(f"  - 畫布大小: 14x14 英吋 (正方形)")
@@ -2,10 +2,15 @@
 """
 Module for generating statistical visualizations.
 """
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.font_manager import FontProperties
-from src.config import PROCESSED_DATA_FILE, FIGURES_DIR
+from src.config import PROCESSED_DATA_FILE, FIGURES_DIR, ANOMALIES_FILE, TREND_WINDOWS
+from src.store import read_processed_data, load_daily_counts
+from src.trends import (
+    TrendCube, WEEKDAY_LABELS, build_trend_cube, rolling_mean, detect_anomalies
+)
 
 # --- 中文字型設定 ---
 # 透過絕對路徑直接載入字型檔案，這是最可靠的方法
@@ -19,7 +24,7 @@ def plot_by_district(df: pd.DataFrame):
     """
     FIGURES_DIR.mkdir(parents=True, exist_ok=True)
     
-    agg = (df.groupby(["district", "case_type"])
+    agg = (df.groupby(["district", "case_type"], observed=True)
              .size().unstack(fill_value=0))
     
     if 'A1' not in agg.columns: agg['A1'] = 0
@@ -57,7 +62,7 @@ def plot_by_hour(df: pd.DataFrame):
     """
     FIGURES_DIR.mkdir(parents=True, exist_ok=True)
     
-    agg = df.groupby(['hour', 'case_type']).size().unstack(fill_value=0)
+    agg = df.groupby(['hour', 'case_type'], observed=True).size().unstack(fill_value=0)
     
     if 'A1' not in agg.columns: agg['A1'] = 0
     if 'A2' not in agg.columns: agg['A2'] = 0
@@ -77,20 +82,144 @@ def plot_by_hour(df: pd.DataFrame):
     plt.close()
     print(f"圖表已儲存至: {output_path}")
 
+def plot_daily_trend(cube: TrendCube):
+    """
+    繪製全市每日 A1/A2 事故數與滾動平均 (TREND_WINDOWS 天)。
+    """
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    
+    city = cube.daily.sum(axis=0)  # (日期, 事故類別)
+    fig, axes = plt.subplots(len(cube.cases), 1, figsize=(14, 8), sharex=True)
+    colors = {'A1': '#d62728', 'A2': '#1f77b4'}
+    
+    for ax, (i, case) in zip(axes, enumerate(cube.cases)):
+        ax.plot(cube.dates, city[:, i], color=colors[case], alpha=0.3, linewidth=0.8,
+                label=f'{case} 每日')
+        for window in TREND_WINDOWS:
+            ax.plot(cube.dates, rolling_mean(city[:, i], window), linewidth=1.5,
+                    label=f'{case} {window}日平均')
+        ax.set_ylabel('事故數量', fontproperties=CHINESE_FONT, fontsize=12)
+        ax.legend(prop=CHINESE_FONT, loc='upper right')
+    
+    axes[0].set_title('113年 台北市每日交通事故數量與滾動平均', fontproperties=CHINESE_FONT, fontsize=16)
+    plt.tight_layout()
+    output_path = FIGURES_DIR / "daily_trend.png"
+    plt.savefig(output_path, dpi=200)
+    plt.close()
+    print(f"圖表已儲存至: {output_path}")
+
+def plot_weekday_hour_heatmap(cube: TrendCube):
+    """
+    繪製星期 × 小時的事故數熱圖 (A1 + A2)。
+    """
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    
+    grid = cube.dow_hour.sum(axis=2)
+    fig, ax = plt.subplots(figsize=(14, 5))
+    im = ax.imshow(grid, aspect='auto', cmap='YlOrRd')
+    
+    ax.set_xticks(range(24))
+    ax.set_yticks(range(7))
+    ax.set_yticklabels([f'星期{d}' for d in WEEKDAY_LABELS], fontproperties=CHINESE_FONT)
+    ax.set_xlabel('小時 (24小時制)', fontproperties=CHINESE_FONT, fontsize=12)
+    ax.set_title('113年 台北市交通事故 星期 × 時段 分布', fontproperties=CHINESE_FONT, fontsize=16)
+    cbar = fig.colorbar(im, ax=ax)
+    cbar.set_label('事故數量', fontproperties=CHINESE_FONT)
+    
+    plt.tight_layout()
+    output_path = FIGURES_DIR / "weekday_hour_heatmap.png"
+    plt.savefig(output_path, dpi=200)
+    plt.close()
+    print(f"圖表已儲存至: {output_path}")
+
+def plot_light_trend(cube: TrendCube):
+    """
+    繪製日間/夜間 (light_bin) 事故數的 7 日滾動平均。
+    """
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    
+    window = TREND_WINDOWS[0]
+    totals = cube.light.sum(axis=2)  # (光線, 日期)
+    fig, ax = plt.subplots(figsize=(14, 5))
+    labels = {'day': '日間', 'night': '夜間'}
+    for light_bin, series in zip(cube.light_bins, totals):
+        if light_bin not in labels:
+            continue
+        ax.plot(cube.dates, rolling_mean(series, window), linewidth=1.5,
+                label=f'{labels[light_bin]} ({window}日平均)')
+    
+    ax.set_title('113年 台北市日間/夜間交通事故趨勢', fontproperties=CHINESE_FONT, fontsize=16)
+    ax.set_ylabel('每日事故數量', fontproperties=CHINESE_FONT, fontsize=12)
+    ax.legend(prop=CHINESE_FONT)
+    
+    plt.tight_layout()
+    output_path = FIGURES_DIR / "light_trend.png"
+    plt.savefig(output_path, dpi=200)
+    plt.close()
+    print(f"圖表已儲存至: {output_path}")
+
+def plot_district_anomalies(cube: TrendCube, anomalies: pd.DataFrame):
+    """
+    繪製各行政區 7 日滾動事故數熱圖, 並標示異常事故日。
+    """
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
+    
+    window = TREND_WINDOWS[0]
+    rolling = rolling_mean(cube.daily.sum(axis=2), window, axis=1)
+    fig, ax = plt.subplots(figsize=(14, 6))
+    im = ax.imshow(rolling, aspect='auto', cmap='Blues', interpolation='nearest')
+    
+    if len(anomalies) > 0:
+        row = pd.Index(cube.districts).get_indexer(anomalies['district'])
+        col = ((anomalies['date'].to_numpy().astype('datetime64[D]') - cube.dates[0])
+               .astype(np.int64))
+        ax.scatter(col, row, s=25, facecolors='none', edgecolors='red', linewidths=1.2,
+                   label=f'異常事故日 ({len(anomalies)})')
+        ax.legend(prop=CHINESE_FONT, loc='upper right')
+    
+    months = np.flatnonzero(cube.dates.astype('datetime64[D]') ==
+                            cube.dates.astype('datetime64[M]').astype('datetime64[D]'))
+    ax.set_xticks(months)
+    ax.set_xticklabels([str(cube.dates[i])[:7] for i in months], rotation=0)
+    ax.set_yticks(range(len(cube.districts)))
+    ax.set_yticklabels(cube.districts, fontproperties=CHINESE_FONT)
+    ax.set_title(f'113年 台北市各行政區事故數 ({window}日平均) 與異常事故日',
+                 fontproperties=CHINESE_FONT, fontsize=16)
+    cbar = fig.colorbar(im, ax=ax)
+    cbar.set_label('每日事故數量', fontproperties=CHINESE_FONT)
+    
+    plt.tight_layout()
+    output_path = FIGURES_DIR / "district_anomalies.png"
+    plt.savefig(output_path, dpi=200)
+    plt.close()
+    print(f"圖表已儲存至: {output_path}")
+
 def main():
     """
     主函式，用於載入資料並執行所有繪圖函式。
     """
-    if not PROCESSED_DATA_FILE.exists():
+    try:
+        df = read_processed_data()
+    except FileNotFoundError:
         print(f"錯誤：找不到處理後的資料檔案於 {PROCESSED_DATA_FILE}")
         print("請先執行 ETL 流程 (例如: python main.py)")
         return
-        
-    df = pd.read_parquet(PROCESSED_DATA_FILE)
     
     print("開始繪製統計圖表...")
     plot_by_district(df)
     plot_by_hour(df)
+    
+    # 時間趨勢: 由每日彙總計數建立立方體, 一次算出所有滾動視窗與異常日
+    cube = build_trend_cube(load_daily_counts())
+    anomalies = detect_anomalies(cube)
+    ANOMALIES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    anomalies.to_csv(ANOMALIES_FILE, index=False)
+    print(f"異常事故日 ({len(anomalies)} 筆) 已儲存至: {ANOMALIES_FILE}")
+    
+    plot_daily_trend(cube)
+    plot_weekday_hour_heatmap(cube)
+    plot_light_trend(cube)
+    plot_district_anomalies(cube, anomalies)
     print("統計圖表繪製完成。")
 
 if __name__ == "__main__":